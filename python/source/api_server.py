@@ -0,0 +1,565 @@
+# ----------------------------- api_server.py -----------------------------
+"""
+HTTP/JSON API over the backend classes, for counter terminals and the
+e-commerce sync to share one database.
+
+Built on asyncio streams (no web framework needed). All writes go through a
+single writer connection on its own thread, so they are serialized in
+arrival order; reads are spread over a pool of read-only connections. Every
+SQLite call runs in a thread executor, so a slow export never stalls the
+event loop. Use the "server" profile (WAL) so readers never wait for the writer.
+
+    python api_server.py [--host 127.0.0.1] [--port 8765] [--readers 4] [--db nkenterprises.db]
+
+Endpoints (JSON in and out; amounts are strings):
+    GET  /products?q=&limit=         ranked search with q
+    GET  /products?cursor=&limit=&sort=&desc=&low_stock=    one page of products
+    GET  /products/{id}              product with its stock
+    POST /products                   {"sku", "name", "price", "cost", "reorder_level", "hsn", "gst_rate"}
+    GET  /stock/{id}                 {"product_id", "stock"}
+    POST /stock/{id}/adjust          {"change", "reason"}
+    GET  /stock/low                  low stock report
+    GET  /stock/reorder?days=&lead_time=&cover_days=   reorder suggestions
+    GET  /customers?cursor=&limit=&sort=&desc=&q=           one page of customers
+    GET  /customers/{id}
+    POST /customers                  {"name", "email", "phone", "address"}
+    POST /invoices                   {"items": [...], "customer_id", "tax_rate", "supply", "notes"}
+    GET  /invoices?cursor=&limit=&sort=&desc=&start=&end=&customer_id=   one page, newest first
+    GET  /invoices/{id}              invoice with its items
+    GET  /invoices/{id}.pdf          invoice PDF
+    GET  /sales/summary?start=&end=&customer_id=
+    GET  /exports/sales.csv?start=&end=
+    GET  /exports/{sales,items,stock}.xlsx?start=&end=
+
+Listings come a page at a time as {"items": [...], "next": CURSOR}; pass
+next back as ?cursor= (with the same sort and filters) until it is null.
+sort is a column name (see the SORTS of each class) and desc=1 reverses it.
+"""
+import os
+import re
+import io
+import json
+import base64
+import signal
+import sqlite3
+import asyncio
+import tempfile
+import threading
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from database import Database, DB_FILENAME, MONEY_COLUMNS, to_decimal
+from product import Product
+from customer import Customer
+from inventory import Inventory, InsufficientStock
+from invoices import InvoiceManager
+from sales import SalesManager
+
+MAX_BODY = 8 * 1024 * 1024
+STATUS_TEXT = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+               500: 'Internal Server Error'}
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _json_default(o):
+    if isinstance(o, Decimal):
+        return str(o)
+    if hasattr(o, 'keys'):   # sqlite3.Row
+        return dict(o)
+    raise TypeError(f'{type(o).__name__} is not JSON serializable')
+
+def _dump(obj):
+    return json.dumps(obj, default=_json_default).encode('utf-8')
+
+class Backend:
+    """The writer connection and the read-only pool, each with its executor"""
+    def __init__(self, filename=DB_FILENAME, profile=None, readers=4):
+        # the writer migrates the schema first, so the readers can open the file read-only
+        self.writer = Database(filename, profile=profile, check_same_thread=False)
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nke-writer')
+        # readers skip the product/customer caches: the writer cannot invalidate them
+        self.readers = [Database.open_readonly(filename, profile, cache_size=0, check_same_thread=False)
+                        for _ in range(readers)]
+        self.read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='nke-reader')
+        self.idle = None
+        self.pdf_lock = threading.Lock()
+
+    async def start(self):
+        self.idle = asyncio.Queue()
+        for db in self.readers:
+            self.idle.put_nowait(db)
+
+    async def read(self, fn, *args):
+        """Run fn(db, *args) on a pooled read-only connection"""
+        db = await self.idle.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.read_executor, fn, db, *args)
+        finally:
+            self.idle.put_nowait(db)
+
+    async def write(self, fn, *args):
+        """Run fn(db, *args) on the writer connection; writes run one at a time"""
+        return await asyncio.get_running_loop().run_in_executor(self.write_executor, fn, self.writer, *args)
+
+    def close(self):
+        self.write_executor.shutdown(wait=True)
+        self.read_executor.shutdown(wait=True)
+        self.writer.close()
+        for db in self.readers:
+            db.close()
+
+# ---------- handlers: plain functions run on an executor thread ----------
+def _row(row, table):
+    """Row -> dict with its money columns as Decimal, whatever the storage mode"""
+    d = dict(row)
+    for c in MONEY_COLUMNS.get(table, ()):
+        if d.get(c) is not None:
+            d[c] = to_decimal(d[c])
+    return d
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HttpError(400, f'{name} must be an integer')
+
+def _product(db, product_id):
+    p = Product(db).get_product(product_id)
+    if not p:
+        raise HttpError(404, 'Product not found')
+    p = _row(p, 'products')
+    p['stock'] = Inventory(db).get_stock(product_id)
+    return p
+
+def _cursor_out(cursor):
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode().rstrip('=')
+
+def _cursor_in(token):
+    if not token:
+        return None
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        raise HttpError(400, 'cursor is not valid')
+    if not isinstance(cursor, list) or len(cursor) != 2:
+        raise HttpError(400, 'cursor is not valid')
+    return cursor
+
+def _limit(query, default):
+    limit = _int(query.get('limit', default), 'limit')
+    if not 0 < limit <= 1000:
+        raise HttpError(400, 'limit must be between 1 and 1000')
+    return limit
+
+def _page(query, default_sort, default_desc=False):
+    """The cursor, limit, sort and direction of a listing request"""
+    limit = _limit(query, 50)
+    desc = query.get('desc')
+    desc = default_desc if desc is None else desc.lower() in ('1', 'true', 'yes')
+    return _cursor_in(query.get('cursor')), limit, query.get('sort') or default_sort, desc
+
+def _listing(rows, cursor, table):
+    return {'items': [_row(r, table) for r in rows], 'next': _cursor_out(cursor)}
+
+def _products(db, query):
+    product = Product(db)
+    if query.get('q'):
+        limit = _limit(query, 20)
+        return _listing(product.search_products(query['q'], limit=limit), None, 'products')
+    cursor, limit, sort, desc = _page(query, 'id')
+    low_stock = query.get('low_stock', '').lower() in ('1', 'true', 'yes')
+    try:
+        rows, cursor = product.page_products(cursor, limit, sort, desc, low_stock=low_stock)
+    except ValueError as e:
+        raise HttpError(400, str(e))
+    return _listing(rows, cursor, 'products')
+
+def _customers(db, query):
+    cursor, limit, sort, desc = _page(query, 'id')
+    try:
+        rows, cursor = Customer(db).page_customers(cursor, limit, sort, desc, query.get('q'))
+    except ValueError as e:
+        raise HttpError(400, str(e))
+    return _listing(rows, cursor, 'customers')
+
+def _required(body, name, label=None):
+    value = body.get(name)
+    if value is None or value == '':
+        raise HttpError(400, f'{label or name} is required')
+    return value
+
+def _text(body, name, label=None, required=False):
+    """A string field, or None when it is missing and not required"""
+    value = _required(body, name, label) if required else body.get(name)
+    if value is not None and not isinstance(value, str):
+        raise HttpError(400, f'{label or name} must be a string')
+    return value
+
+def _amount(value, name):
+    """A non-negative amount sent as a string or number"""
+    try:
+        amount = to_decimal(value)
+    except InvalidOperation:
+        amount = None
+    if isinstance(value, bool) or amount is None or not amount.is_finite() or amount < 0:
+        raise HttpError(400, f'{name} must be a non-negative amount')
+    return amount
+
+def _exists(db, table, row_id, what):
+    if not db.conn.execute(f'SELECT 1 FROM {table} WHERE id=?', (row_id,)).fetchone():
+        raise HttpError(404, f'{what} {row_id} not found')
+
+def _add_product(db, body):
+    sku, name = _text(body, 'sku', required=True), _text(body, 'name', required=True)
+    price = _amount(_required(body, 'price'), 'price')
+    cost = _amount(body['cost'], 'cost') if body.get('cost') not in (None, '') else None
+    gst_rate = _amount(body['gst_rate'], 'gst_rate') if body.get('gst_rate') not in (None, '') else None
+    reorder_level = _int(body.get('reorder_level') or 0, 'reorder_level')
+    pid = Product(db).add_product(sku, name, price, cost, reorder_level, _text(body, 'hsn'), gst_rate)
+    return {'id': pid}
+
+def _adjust(db, product_id, body):
+    _exists(db, 'products', product_id, 'Product')
+    inventory = Inventory(db)
+    movement_id = inventory.adjust_stock(product_id, _int(body.get('change'), 'change'),
+                                        _text(body, 'reason') or 'api')
+    return {'movement_id': movement_id, 'stock': inventory.get_stock(product_id)}
+
+def _customer(db, customer_id):
+    c = Customer(db).get_customer(customer_id)
+    if not c:
+        raise HttpError(404, 'Customer not found')
+    return dict(c)
+
+def _add_customer(db, body):
+    name = _text(body, 'name', required=True)
+    email, phone, address = (_text(body, f) for f in ('email', 'phone', 'address'))
+    return {'id': Customer(db).add_customer(name, email, phone, address)}
+
+def _invoice_items(db, items):
+    """Check the items of an invoice request; every product must exist"""
+    if not items or not isinstance(items, list):
+        raise HttpError(400, 'items must be a non-empty list')
+    checked = []
+    for i, it in enumerate(items):
+        if not isinstance(it, dict):
+            raise HttpError(400, f'items[{i}] must be an object')
+        label = f'items[{i}].'
+        for field in ('description', 'hsn'):
+            _text(it, field, label + field)
+        it = dict(it, qty=_int(_required(it, 'qty', label + 'qty'), label + 'qty'),
+                  unit_price=_amount(_required(it, 'unit_price', label + 'unit_price'), label + 'unit_price'))
+        if it.get('product_id') is not None:
+            it['product_id'] = _int(it['product_id'], label + 'product_id')
+            _exists(db, 'products', it['product_id'], 'Product')
+        if it.get('tax_rate') is not None:
+            it['tax_rate'] = _amount(it['tax_rate'], label + 'tax_rate')
+        checked.append(it)
+    return checked
+
+def _create_invoice(db, body):
+    items = _invoice_items(db, body.get('items'))
+    customer_id = body.get('customer_id')
+    if customer_id is not None:
+        customer_id = _int(customer_id, 'customer_id')
+        _exists(db, 'customers', customer_id, 'Customer')
+    tax_rate = body.get('tax_rate')
+    tax_rate = _amount(tax_rate, 'tax_rate') if tax_rate not in (None, '') else 0
+    notes, supply = _text(body, 'notes'), _text(body, 'supply')
+    invoices = InvoiceManager(db)
+    inv_id = invoices.create_invoice(items, customer_id=customer_id, tax_rate=tax_rate,
+                                     notes=notes, supply=supply)
+    inv, _ = invoices.get_invoice(inv_id)
+    return {'id': inv_id, 'invoice_no': inv['invoice_no'], 'total': to_decimal(inv['total'])}
+
+def _invoice(db, invoice_id):
+    found = InvoiceManager(db).get_invoice(invoice_id)
+    if not found:
+        raise HttpError(404, 'Invoice not found')
+    inv, items = found
+    return dict(_row(inv, 'invoices'), items=[_row(it, 'invoice_items') for it in items])
+
+def _invoices(db, query):
+    cursor, limit, sort, desc = _page(query, 'date', default_desc=True)
+    customer_id = query.get('customer_id')
+    customer_id = _int(customer_id, 'customer_id') if customer_id else None
+    try:
+        rows, cursor = InvoiceManager(db).page_invoices(cursor, limit, sort, desc, query.get('start'),
+                                                        query.get('end'), customer_id)
+    except ValueError as e:
+        raise HttpError(400, str(e))
+    return _listing(rows, cursor, 'invoices')
+
+def _invoice_pdf(db, invoice_id, lock):
+    from pdf_export import render_invoice_pdf
+    found = InvoiceManager(db).get_invoice(invoice_id)
+    if not found:
+        raise HttpError(404, 'Invoice not found')
+    inv, items = found
+    cust = Customer(db).get_customer(inv['customer_id'])
+    buf = io.BytesIO()
+    with lock:   # one reportlab render at a time
+        render_invoice_pdf(inv, items, dict(cust) if cust else None, buf)
+    return buf.getvalue()
+
+def _export_file(db, kind, start, end):
+    """Write an export to a temp file and return its path (the caller deletes it)"""
+    suffix = '.csv' if kind == 'sales.csv' else '.xlsx'
+    fd, path = tempfile.mkstemp(prefix='nke-export-', suffix=suffix)
+    os.close(fd)
+    try:
+        if kind == 'sales.csv':
+            InvoiceManager(db).export_sales_report_csv(path, start, end)
+        else:
+            import xlsx_export
+            name = kind[:-len('.xlsx')]
+            if name == 'stock':
+                xlsx_export.export_stock_xlsx(db, path)
+            else:
+                xlsx_export.EXPORTS[name](db, path, start, end)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+CONTENT_TYPES = {
+    '.csv': 'text/csv; charset=utf-8',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pdf': 'application/pdf',
+}
+
+# ---------- HTTP ----------
+class ApiServer:
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.routes = [
+            ('GET', r'/products', self.products),
+            ('POST', r'/products', self.add_product),
+            ('GET', r'/products/(\d+)', self.product),
+            ('GET', r'/stock/low', self.low_stock),
+            ('GET', r'/stock/reorder', self.reorder),
+            ('GET', r'/stock/(\d+)', self.stock),
+            ('POST', r'/stock/(\d+)/adjust', self.adjust),
+            ('GET', r'/customers', self.customers),
+            ('POST', r'/customers', self.add_customer),
+            ('GET', r'/customers/(\d+)', self.customer),
+            ('GET', r'/invoices', self.invoices),
+            ('POST', r'/invoices', self.create_invoice),
+            ('GET', r'/invoices/(\d+)\.pdf', self.invoice_pdf),
+            ('GET', r'/invoices/(\d+)', self.invoice),
+            ('GET', r'/sales/summary', self.sales_summary),
+            ('GET', r'/exports/(sales\.csv|sales\.xlsx|items\.xlsx|stock\.xlsx)', self.export),
+        ]
+        self.routes = [(m, re.compile(p + '$'), h) for m, p, h in self.routes]
+
+    # each handler returns (status, body dict/list) or (status, bytes, content type)
+    async def products(self, query, body):
+        return 200, await self.backend.read(_products, query)
+
+    async def add_product(self, query, body):
+        return 201, await self.backend.write(_add_product, body)
+
+    async def product(self, query, body, product_id):
+        return 200, await self.backend.read(_product, int(product_id))
+
+    async def stock(self, query, body, product_id):
+        stock = await self.backend.read(lambda db, pid: Inventory(db).get_stock(pid), int(product_id))
+        return 200, {'product_id': int(product_id), 'stock': stock}
+
+    async def adjust(self, query, body, product_id):
+        return 200, await self.backend.write(_adjust, int(product_id), body)
+
+    async def low_stock(self, query, body):
+        return 200, await self.backend.read(lambda db: [_row(r, 'products') for r in Inventory(db).low_stock_report()])
+
+    async def reorder(self, query, body):
+        args = [_int(query.get(k, d), k) for k, d in (('days', 30), ('lead_time', 7), ('cover_days', 30))]
+        return 200, await self.backend.read(lambda db: Inventory(db).reorder_suggestions(*args))
+
+    async def customers(self, query, body):
+        return 200, await self.backend.read(_customers, query)
+
+    async def add_customer(self, query, body):
+        return 201, await self.backend.write(_add_customer, body)
+
+    async def customer(self, query, body, customer_id):
+        return 200, await self.backend.read(_customer, int(customer_id))
+
+    async def invoices(self, query, body):
+        return 200, await self.backend.read(_invoices, query)
+
+    async def create_invoice(self, query, body):
+        return 201, await self.backend.write(_create_invoice, body)
+
+    async def invoice(self, query, body, invoice_id):
+        return 200, await self.backend.read(_invoice, int(invoice_id))
+
+    async def invoice_pdf(self, query, body, invoice_id):
+        pdf = await self.backend.read(_invoice_pdf, int(invoice_id), self.backend.pdf_lock)
+        return 200, pdf, CONTENT_TYPES['.pdf']
+
+    async def sales_summary(self, query, body):
+        customer_id = query.get('customer_id')
+        customer_id = _int(customer_id, 'customer_id') if customer_id else None
+        return 200, await self.backend.read(
+            lambda db: SalesManager(db).sales_summary(query.get('start'), query.get('end'), customer_id))
+
+    async def export(self, query, body, kind):
+        path = await self.backend.read(_export_file, kind, query.get('start'), query.get('end'))
+        return 200, path, CONTENT_TYPES[os.path.splitext(path)[1]]
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        allowed = False
+        for m, pattern, handler in self.routes:
+            match = pattern.match(url.path.rstrip('/') or '/')
+            if match:
+                if m == method:
+                    return await handler(query, body, *match.groups())
+                allowed = True
+        if allowed:
+            raise HttpError(405, f'{method} not allowed on {url.path}')
+        raise HttpError(404, f'No route for {url.path}')
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line or request_line in (b'\r\n', b'\n'):
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, _dump({'error': 'Malformed request line'}), keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, 400, _dump({'error': 'Invalid Content-Length'}), keep_alive=False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, _dump({'error': 'Request body too large'}), keep_alive=False)
+                    break
+                raw = await reader.readexactly(length) if length else b''
+                await self.serve(writer, method.upper(), target, raw, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, writer, method, target, raw, keep_alive):
+        content_type = 'application/json'
+        try:
+            body = json.loads(raw) if raw else {}
+            if not isinstance(body, dict):
+                raise HttpError(400, 'Request body must be a JSON object')
+            result = await self.dispatch(method, target, body)
+            status, payload = result[0], result[1]
+            if len(result) == 3:
+                content_type = result[2]
+            elif not isinstance(payload, bytes):
+                payload = _dump(payload)
+        except HttpError as e:
+            status, payload = e.status, _dump({'error': str(e)})
+        except json.JSONDecodeError:
+            status, payload = 400, _dump({'error': 'Request body is not valid JSON'})
+        except InsufficientStock as e:
+            status, payload = 409, _dump({'error': str(e)})
+        except sqlite3.IntegrityError as e:
+            # a reference to a missing row, or a duplicate (e.g. an existing SKU)
+            status = 404 if 'FOREIGN KEY' in str(e) else 409
+            payload = _dump({'error': str(e)})
+        except (ValueError, ArithmeticError) as e:
+            # other validation errors from the backend
+            status, payload = 400, _dump({'error': str(e)})
+        except Exception as e:
+            status, payload = 500, _dump({'error': f'{type(e).__name__}: {e}'})
+        if isinstance(payload, str):
+            # an export written to a temp file: send it in chunks, then delete it
+            try:
+                await self.respond_file(writer, status, payload, content_type, keep_alive)
+            finally:
+                os.unlink(payload)
+        else:
+            await self.respond(writer, status, payload, content_type, keep_alive)
+
+    async def respond(self, writer, status, payload, content_type='application/json', keep_alive=True):
+        writer.write(self._head(status, len(payload), content_type, keep_alive) + payload)
+        await writer.drain()
+
+    async def respond_file(self, writer, status, path, content_type, keep_alive):
+        writer.write(self._head(status, os.path.getsize(path), content_type, keep_alive))
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(256 * 1024)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+    def _head(self, status, length, content_type, keep_alive):
+        return (f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Length: {length}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n').encode('latin-1')
+
+async def serve(host='127.0.0.1', port=8765, filename=DB_FILENAME, profile=None, readers=4, ready=None):
+    backend = Backend(filename, profile, readers)
+    await backend.start()
+    app = ApiServer(backend)
+    server = await asyncio.start_server(app.handle, host, port)
+    # stop cleanly on SIGTERM too, so connections close and SQL stats are flushed
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass   # Windows: Ctrl+C still raises KeyboardInterrupt
+    if ready:
+        ready(server)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        backend.close()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='NKEnterprises HTTP/JSON API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--readers', type=int, default=4, help='Read-only connections in the pool')
+    parser.add_argument('--db', default=DB_FILENAME)
+    parser.add_argument('--profile', help='Database profile (default: NKE_DB_PROFILE / config, ideally "server")')
+    args = parser.parse_args()
+
+    def ready(server):
+        for sock in server.sockets:
+            print('Listening on http://%s:%s' % sock.getsockname()[:2], flush=True)
+    try:
+        asyncio.run(serve(args.host, args.port, args.db, args.profile, args.readers, ready))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
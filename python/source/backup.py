@@ -0,0 +1,229 @@
+# ----------------------------- backup.py -----------------------------
+import os
+import gzip
+import json
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+import hashlib
+from datetime import datetime
+from database import Database
+
+DELTA_MAGIC = b'NKEDELTA1'
+MANIFEST = 'manifest.json'
+HASHES = 'pages.idx'
+HASHES_MAGIC = b'NKEIDX1'
+DIGEST_SIZE = 8
+
+def _open_source(db: Database):
+    # a separate connection, so the backup never touches the caller's transaction
+    return sqlite3.connect(db.filename)
+
+class _Restarted(Exception):
+    """Another connection wrote to the source and SQLite restarted the copy"""
+
+def online_backup(db: Database, dest, pages=1024, throttle=0.0, progress=None, compress=False,
+                  max_restarts=3):
+    """Copy the live database to `dest` with SQLite's online backup API.
+
+    Copies `pages` pages per step and sleeps `throttle` seconds between steps,
+    so other connections keep reading and writing while it runs. `progress`
+    is called as progress(remaining, total) after every step. With
+    compress=True the copy is gzipped to `dest` (".gz" is appended if missing).
+
+    A write from another connection makes SQLite start the copy again from
+    page 1, so a slow, throttled copy of a busy database could go round for
+    ever. When `remaining` goes back up the copy is abandoned and retried
+    without the throttle; after `max_restarts` restarts the last try copies
+    every page in one step, which holds a read transaction for the whole copy
+    but always finishes.
+    """
+    if compress and not dest.endswith('.gz'):
+        dest += '.gz'
+    target_path = dest
+    if compress:
+        fd, target_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(dest)))
+        os.close(fd)
+
+    src = _open_source(db)
+    target = sqlite3.connect(target_path)
+    try:
+        for attempt in range(max_restarts + 1):
+            last = [None]
+            pause = throttle if attempt == 0 else 0.0
+
+            def step(status, remaining, total):
+                if last[0] is not None and remaining > last[0]:
+                    raise _Restarted()
+                last[0] = remaining
+                if progress:
+                    progress(remaining, total)
+                if pause and remaining:
+                    time.sleep(pause)
+
+            try:
+                src.backup(target, pages=pages if attempt < max_restarts else -1, progress=step)
+                break
+            except _Restarted:
+                continue
+    finally:
+        target.close()
+        src.close()
+
+    if compress:
+        try:
+            with open(target_path, 'rb') as fin, gzip.open(dest, 'wb') as fout:
+                shutil.copyfileobj(fin, fout, 1024 * 1024)
+        finally:
+            os.remove(target_path)
+    return dest
+
+def _page_digests(path, page_size):
+    with open(path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            yield page, hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+
+def _fsync(path):
+    with open(path, 'ab') as f:
+        os.fsync(f.fileno())
+
+def _write_replace(path, data):
+    # write beside the target and swap it in, so a crash leaves the old or the new file, never half of one
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _hashes_file(seq, name, digests):
+    # pages.idx names the chain file its digests describe: position in the manifest and file name
+    encoded = name.encode('utf-8')
+    return HASHES_MAGIC + struct.pack('>IH', seq, len(encoded)) + encoded + bytes(digests)
+
+def _read_hashes(path, files, header_only=False):
+    """Page digests from pages.idx, checked against the last file in the manifest"""
+    with open(path, 'rb') as h:
+        data = h.read(len(HASHES_MAGIC) + 6 + 65535) if header_only else h.read()
+    if not data.startswith(HASHES_MAGIC):
+        return data     # written before pages.idx carried a header
+    offset = len(HASHES_MAGIC)
+    seq, size = struct.unpack('>IH', data[offset:offset + 6])
+    name = data[offset + 6:offset + 6 + size].decode('utf-8')
+    if seq != len(files) - 1 or name != files[-1]:
+        raise ValueError(f"{HASHES} describes {name} (#{seq}) but {MANIFEST} ends with "
+                         f"{files[-1]} (#{len(files) - 1}); the chain is inconsistent, start a new chain directory")
+    return data[offset + 6 + size:]
+
+def incremental_backup(db: Database, dest_dir, pages=1024, throttle=0.0, progress=None, compress=False):
+    """Back up into a chain directory: a full base copy, then only changed pages.
+
+    The first run writes base-<timestamp>.db(.gz). Later runs take an online snapshot,
+    compare it page by page with the digests recorded last time and write a
+    delta-<timestamp>.bin(.gz) holding just the pages that changed.
+    Returns the path of the file written; restore_chain() rebuilds the database.
+
+    pages.idx and manifest.json are replaced whole, the manifest last, and
+    pages.idx records which chain file it belongs to: after a crash between
+    the two the next run raises ValueError instead of diffing against pages
+    that no listed file holds. A new base (first run, or a changed page
+    size) gets a new name, and the old chain's files are only removed once
+    the manifest no longer lists them.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    manifest_path = os.path.join(dest_dir, MANIFEST)
+    hashes_path = os.path.join(dest_dir, HASHES)
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    fd, snapshot = tempfile.mkstemp(suffix='.db', dir=dest_dir)
+    os.close(fd)
+    try:
+        online_backup(db, snapshot, pages=pages, throttle=throttle, progress=progress)
+        conn = sqlite3.connect(snapshot)
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        conn.close()
+
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        replaced = []
+        if manifest is None or manifest['page_size'] != page_size:
+            replaced = manifest['files'] if manifest else []
+            name = f'base-{stamp}.db' + ('.gz' if compress else '')
+            out = os.path.join(dest_dir, name)
+            if compress:
+                with open(snapshot, 'rb') as fin, gzip.open(out, 'wb') as fout:
+                    shutil.copyfileobj(fin, fout, 1024 * 1024)
+            else:
+                shutil.copyfile(snapshot, out)
+            manifest = {'page_size': page_size, 'files': [name]}
+            new_hashes = bytearray()
+            for _, digest in _page_digests(snapshot, page_size):
+                new_hashes += digest
+        else:
+            old = _read_hashes(hashes_path, manifest['files'])
+            name = f'delta-{stamp}.bin' + ('.gz' if compress else '')
+            out = os.path.join(dest_dir, name)
+            opener = gzip.open if compress else open
+            new_hashes = bytearray()
+            changed = 0
+            with opener(out, 'wb') as f:
+                page_count = os.path.getsize(snapshot) // page_size
+                f.write(DELTA_MAGIC + struct.pack('>II', page_size, page_count))
+                for pageno, (page, digest) in enumerate(_page_digests(snapshot, page_size)):
+                    new_hashes += digest
+                    if old[pageno * DIGEST_SIZE:(pageno + 1) * DIGEST_SIZE] != digest:
+                        f.write(struct.pack('>I', pageno))
+                        f.write(page)
+                        changed += 1
+            manifest['files'].append(name)
+            manifest['last_changed_pages'] = changed
+        manifest['updated_at'] = datetime.utcnow().isoformat()
+        _fsync(out)     # on disk before anything points at it
+        _write_replace(hashes_path, _hashes_file(len(manifest['files']) - 1, name, new_hashes))
+        _write_replace(manifest_path, json.dumps(manifest, indent=2).encode('utf-8'))
+        for old_name in replaced:
+            if old_name not in manifest['files'] and os.path.exists(os.path.join(dest_dir, old_name)):
+                os.remove(os.path.join(dest_dir, old_name))
+    finally:
+        os.remove(snapshot)
+    return out
+
+def restore_chain(dest_dir, out_path):
+    """Rebuild a database file from an incremental_backup() chain directory.
+    Raises ValueError when pages.idx does not belong to the last file the
+    manifest lists, i.e. a backup into the chain was interrupted."""
+    with open(os.path.join(dest_dir, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    files = manifest['files']
+    hashes_path = os.path.join(dest_dir, HASHES)
+    if os.path.exists(hashes_path):
+        _read_hashes(hashes_path, files, header_only=True)
+    base = os.path.join(dest_dir, files[0])
+    opener = gzip.open if base.endswith('.gz') else open
+    with opener(base, 'rb') as fin, open(out_path, 'wb') as fout:
+        shutil.copyfileobj(fin, fout, 1024 * 1024)
+    with open(out_path, 'r+b') as fout:
+        for name in files[1:]:
+            path = os.path.join(dest_dir, name)
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rb') as f:
+                header = f.read(len(DELTA_MAGIC) + 8)
+                if not header.startswith(DELTA_MAGIC):
+                    raise ValueError(f"{name} is not a delta backup file")
+                page_size, page_count = struct.unpack('>II', header[len(DELTA_MAGIC):])
+                while True:
+                    raw = f.read(4)
+                    if not raw:
+                        break
+                    (pageno,) = struct.unpack('>I', raw)
+                    fout.seek(pageno * page_size)
+                    fout.write(f.read(page_size))
+            fout.truncate(page_count * page_size)
+    return out_path
@@ -0,0 +1,363 @@
+# ----------------------------- bench.py -----------------------------
+"""
+Benchmark suite for the hot paths, on seeded synthetic data (datagen.py).
+
+Times invoice creation, stock and product lookups, listings, the low stock
+report, sales summaries, search and every export, and writes the results as
+JSON (with the commit, SQLite version and dataset) so two runs can be
+compared. Write cases run on a copy of the dataset, so a generated database
+can be reused across runs and commits.
+
+    python bench.py [--scale small] [--db DATASET.db] [--repeat 5] [--only list_products,search]
+                    [--output bench_results.json] [--compare baseline.json] [--threshold 0.25]
+
+With --compare, prints each case's change against the baseline and exits
+with status 1 if any median is slower by more than the threshold.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+from datetime import date, timedelta
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SOURCE_DIR)
+
+from database import Database, date_range
+from product import Product
+from customer import Customer
+from inventory import Inventory
+from invoices import InvoiceManager
+from sales import SalesManager
+import datagen
+
+CASES = []
+
+def case(name, ops=1, writes=False, needs=None):
+    """Register fn(ctx) as a benchmark; `ops` operations per call, `needs` an optional module"""
+    def register(fn):
+        CASES.append({'name': name, 'fn': fn, 'ops': ops, 'writes': writes, 'needs': needs})
+        return fn
+    return register
+
+class Context:
+    def __init__(self, db, stats, tmp, export_days):
+        self.db = db
+        self.stats = stats
+        self.tmp = tmp
+        self.rnd = random.Random(stats.get('seed', 0))
+        self.products = stats['products']
+        self.customers = stats['customers']
+        last = date.fromisoformat(stats['last_day'])
+        # inclusive days, as every report and export takes them (database.date_range)
+        self.window = ((last - timedelta(days=export_days - 1)).isoformat(), last.isoformat())
+        where, params = date_range('date', *self.window)
+        self.invoice_ids = [r[0] for r in db.conn.execute(
+            f"SELECT id FROM invoices WHERE {' AND '.join(where)} ORDER BY id", params)]
+
+    def pid(self):
+        return self.rnd.randint(1, self.products)
+
+    def out(self, name):
+        return os.path.join(self.tmp, name)
+
+# ---------- lookups ----------
+@case('stock_lookup', ops=1000)
+def _stock_lookup(ctx):
+    inventory = Inventory(ctx.db)
+    for _ in range(1000):
+        inventory.get_stock(ctx.pid())
+
+@case('product_lookup', ops=1000)
+def _product_lookup(ctx):
+    ctx.db.clear_caches()   # measure the queries, not a warm cache
+    product = Product(ctx.db)
+    for _ in range(1000):
+        product.get_product(ctx.pid())
+
+@case('search', ops=100)
+def _search(ctx):
+    product = Product(ctx.db)
+    for i in range(100):
+        kind = i % 4
+        if kind == 0:
+            term = ctx.rnd.choice(datagen.NOUNS)
+        elif kind == 1:
+            term = f'{ctx.rnd.choice(datagen.MATERIALS)} {ctx.rnd.choice(datagen.NOUNS)[:3]}'
+        elif kind == 2:
+            term = f'GEN-{ctx.pid():07d}'
+        else:
+            term = ctx.rnd.choice(datagen.ADJECTIVES)[:4]
+        product.search_products(term)
+
+# ---------- listings and reports ----------
+@case('list_products')
+def _list_products(ctx):
+    Product(ctx.db).list_products()
+
+@case('list_customers')
+def _list_customers(ctx):
+    Customer(ctx.db).list_customers()
+
+@case('list_products_page', ops=10)
+def _list_products_page(ctx):
+    # first screen of the paged listing, in each sort order
+    product = Product(ctx.db)
+    for sort in ('id', 'sku', 'name', 'price', 'stock'):
+        for descending in (False, True):
+            product.page_products(limit=20, sort=sort, descending=descending)
+
+@case('iter_customers')
+def _iter_customers(ctx):
+    for _ in Customer(ctx.db).iter_customers(sort='name'):
+        pass
+
+@case('low_stock_report')
+def _low_stock_report(ctx):
+    Inventory(ctx.db).low_stock_report()
+
+@case('sales_summary_all')
+def _sales_summary_all(ctx):
+    SalesManager(ctx.db).sales_summary()
+
+@case('sales_summary_window', ops=10)
+def _sales_summary_window(ctx):
+    sales = SalesManager(ctx.db)
+    for _ in range(5):
+        sales.sales_summary(*ctx.window)
+        sales.sales_summary(*ctx.window, customer_id=ctx.rnd.randint(1, ctx.customers))
+
+@case('sales_summary_scan')
+def _sales_summary_scan(ctx):
+    # timestamp bounds take the invoice scan instead of the daily rollups
+    start, end = ctx.window
+    SalesManager(ctx.db).sales_summary(start + 'T00:00:00', end + 'T23:59:59.999999')
+
+# ---------- writes (on a copy of the dataset) ----------
+def _invoice(ctx):
+    pids = {ctx.pid() for _ in range(3)}
+    return {'items': [{'product_id': pid, 'description': 'bench', 'qty': 1, 'unit_price': '10.00'} for pid in pids],
+            'customer_id': ctx.rnd.randint(1, ctx.customers), 'tax_rate': '18',
+            'supply': ctx.rnd.choice((None, 'intra', 'inter'))}
+
+@case('invoice_create', ops=100, writes=True)
+def _invoice_create(ctx):
+    invoices = InvoiceManager(ctx.db)
+    for _ in range(100):
+        try:
+            invoices.create_invoice(**_invoice(ctx))
+        except ValueError:
+            pass   # short stock rolls back, which is part of the cost
+
+@case('invoice_batch', ops=500, writes=True)
+def _invoice_batch(ctx):
+    batch = [_invoice(ctx) for _ in range(500)]
+    try:
+        InvoiceManager(ctx.db).create_invoices(batch)
+    except ValueError:
+        pass
+
+@case('stock_adjust', ops=200, writes=True)
+def _stock_adjust(ctx):
+    inventory = Inventory(ctx.db)
+    for _ in range(200):
+        inventory.adjust_stock(ctx.pid(), 5, 'bench')
+
+# ---------- exports (the last --export-days days) ----------
+@case('export_sales_csv')
+def _export_sales_csv(ctx):
+    InvoiceManager(ctx.db).export_sales_report_csv(ctx.out('sales.csv'), *ctx.window)
+
+@case('export_invoice_csv', ops=20)
+def _export_invoice_csv(ctx):
+    invoices = InvoiceManager(ctx.db)
+    for invoice_id in ctx.rnd.sample(ctx.invoice_ids, min(20, len(ctx.invoice_ids))):
+        invoices.export_single_invoice_csv(invoice_id, ctx.out('invoice.csv'))
+
+@case('export_invoice_pdf', ops=10, needs='reportlab')
+def _export_invoice_pdf(ctx):
+    invoices = InvoiceManager(ctx.db)
+    for invoice_id in ctx.rnd.sample(ctx.invoice_ids, min(10, len(ctx.invoice_ids))):
+        invoices.export_single_invoice_pdf(invoice_id, ctx.out('invoice.pdf'))
+
+@case('export_pdfs_bulk', ops=200, needs='reportlab')
+def _export_pdfs_bulk(ctx):
+    from bulk_export import bulk_export_pdfs
+    bulk_export_pdfs(ctx.db, ctx.invoice_ids[-200:], ctx.out('invoices.zip'))
+
+@case('export_sales_xlsx', needs='openpyxl')
+def _export_sales_xlsx(ctx):
+    from xlsx_export import export_sales_report_xlsx
+    export_sales_report_xlsx(ctx.db, ctx.out('sales.xlsx'), *ctx.window)
+
+@case('export_items_xlsx', needs='openpyxl')
+def _export_items_xlsx(ctx):
+    from xlsx_export import export_invoice_items_xlsx
+    export_invoice_items_xlsx(ctx.db, ctx.out('items.xlsx'), *ctx.window)
+
+@case('export_stock_xlsx', needs='openpyxl')
+def _export_stock_xlsx(ctx):
+    from xlsx_export import export_stock_xlsx
+    export_stock_xlsx(ctx.db, ctx.out('stock.xlsx'))
+
+# ---------- runner ----------
+def _available(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+def time_case(c, ctx, repeat):
+    c['fn'](ctx)   # warm-up: page cache, prepared statements, lazy imports
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        c['fn'](ctx)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        'ops': c['ops'],
+        'median_s': round(median, 6),
+        'min_s': round(samples[0], 6),
+        'max_s': round(samples[-1], 6),
+        'per_op_us': round(median / c['ops'] * 1e6, 2),
+        'samples': [round(s, 6) for s in samples],
+    }
+
+def git_commit():
+    try:
+        head = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SOURCE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=SOURCE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return head + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def dataset(args, tmp):
+    """Path of the dataset to benchmark and its datagen stats"""
+    path = args.db
+    if not path:
+        data_dir = args.data_dir or tmp
+        path = os.path.join(data_dir, f'bench-{args.scale}-{args.seed}.db')
+        if not os.path.exists(path):
+            print(f'Generating {args.scale} dataset in {path} ...', flush=True)
+            db = Database(path, profile=args.profile)
+            datagen.generate(db, seed=args.seed, progress=print, **datagen.SCALES[args.scale])
+            db.close()
+    db = Database(path, profile=args.profile)
+    row = db.conn.execute("SELECT value FROM settings WHERE key='datagen'").fetchone()
+    if row:
+        stats = json.loads(row['value'])
+    else:
+        # not made by datagen: describe it from its contents
+        q = lambda sql: db.conn.execute(sql).fetchone()[0]
+        last = q('SELECT substr(MAX(date),1,10) FROM invoices') or date.today().isoformat()
+        stats = {'products': q('SELECT MAX(id) FROM products') or 0, 'customers': q('SELECT MAX(id) FROM customers') or 0,
+                 'invoices': q('SELECT COUNT(*) FROM invoices'), 'last_day': last}
+    db.close()
+    return path, stats
+
+def compare(results, baseline, threshold):
+    """Print the change per case against a baseline run; returns the regressed case names"""
+    regressed = []
+    print(f"\n{'case':24s} {'baseline':>12s} {'now':>12s} {'change':>8s}")
+    for name, r in results['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old or 'median_s' not in old or 'median_s' not in r:
+            continue
+        change = r['median_s'] / old['median_s'] - 1 if old['median_s'] else 0.0
+        flag = '  REGRESSION' if change > threshold else ''
+        if flag:
+            regressed.append(name)
+        print(f"{name:24s} {old['median_s'] * 1000:10.2f}ms {r['median_s'] * 1000:10.2f}ms {change:+8.1%}{flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths on synthetic data')
+    parser.add_argument('--scale', choices=sorted(datagen.SCALES), default='small', help='Dataset preset to generate')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='Benchmark an existing dataset instead of generating one')
+    parser.add_argument('--data-dir', help='Keep generated datasets here for reuse (default: a temp dir)')
+    parser.add_argument('--profile', help='Database profile for the connection under test')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (after one warm-up)')
+    parser.add_argument('--only', help='Comma-separated case names')
+    parser.add_argument('--export-days', type=int, default=30, help='Date window for the export and summary cases')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='Results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Slowdown counted as a regression (0.25 = 25%%)')
+    parser.add_argument('--list', action='store_true', help='List the cases and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for c in CASES:
+            print(c['name'] + (f" (needs {c['needs']})" if c['needs'] else ''))
+        return
+    only = set(args.only.split(',')) if args.only else None
+    unknown = (only or set()) - {c['name'] for c in CASES}
+    if unknown:
+        raise SystemExit(f"Unknown case(s): {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix='nke-bench-') as tmp:
+        path, stats = dataset(args, tmp)
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'profile': args.profile,
+                'repeat': args.repeat,
+                'export_days': args.export_days,
+                'dataset': stats,
+            },
+            'results': {},
+        }
+        readonly = Database(path, profile=args.profile)
+        scratch = None
+        for c in CASES:
+            if only and c['name'] not in only:
+                continue
+            if c['needs'] and not _available(c['needs']):
+                results['results'][c['name']] = {'skipped': f"{c['needs']} not installed"}
+                print(f"{c['name']:24s} skipped ({c['needs']} not installed)")
+                continue
+            if c['writes']:
+                if scratch is None:
+                    copy = os.path.join(tmp, 'scratch.db')
+                    readonly.backup_db(copy)
+                    scratch = Database(copy, profile=args.profile)
+                db = scratch
+            else:
+                db = readonly
+            ctx = Context(db, stats, tmp, args.export_days)
+            r = time_case(c, ctx, args.repeat)
+            results['results'][c['name']] = r
+            print(f"{c['name']:24s} {r['median_s'] * 1000:10.2f} ms  ({r['per_op_us']:.1f} us/op)", flush=True)
+        readonly.close()
+        if scratch:
+            scratch.close()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} case(s) slower than the baseline by more than {args.threshold:.0%}")
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# ----------------------------- bench_startup.py -----------------------------
+"""
+Startup-time benchmark for the scripted CLI entry points.
+
+Runs each entry point in a fresh interpreter against a scratch database,
+reports the median wall time, and fails (exit status 1) if any median is over
+the budget or if importing main_backend drags in reportlab/openpyxl.
+
+    python bench_startup.py [--runs 10] [--budget 0.25]
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ('reportlab', 'openpyxl')
+ENTRY_POINTS = [
+    ['--help'],
+    ['--migrate'],
+    ['--verify-stock'],
+    ['--backup', 'bench_backup.db'],
+]
+
+def time_run(argv, cwd, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(argv, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def heavy_imports_loaded():
+    code = (
+        'import sys; sys.path.insert(0, %r); import main_backend; '
+        'print(",".join(m for m in %r if m in sys.modules))' % (SOURCE_DIR, HEAVY_MODULES)
+    )
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return [m for m in out.stdout.strip().split(',') if m]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CLI startup time')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=0.25, help='Max median seconds per entry point')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as cwd:
+        script = os.path.join(SOURCE_DIR, 'main_backend.py')
+        subprocess.run([sys.executable, script, '--init-sample'], cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+
+        bare = time_run([sys.executable, '-c', 'pass'], cwd, args.runs)
+        print(f'{"python -c pass":40s} {bare * 1000:8.1f} ms')
+        for extra in ENTRY_POINTS:
+            median = time_run([sys.executable, script] + extra, cwd, args.runs)
+            over = median > args.budget
+            failed = failed or over
+            print(f'{"main_backend.py " + " ".join(extra):40s} {median * 1000:8.1f} ms{"  OVER BUDGET" if over else ""}')
+
+        # what every invocation used to pay before export code was loaded lazily
+        try:
+            eager = time_run([sys.executable, '-c', 'import reportlab.platypus, reportlab.pdfbase.ttfonts, openpyxl'], cwd, args.runs)
+            print(f'{"(old eager reportlab+openpyxl)":40s} {(eager - bare) * 1000:8.1f} ms extra per start')
+        except subprocess.CalledProcessError:
+            print('(reportlab/openpyxl not installed; skipping eager-import comparison)')
+
+    loaded = heavy_imports_loaded()
+    if loaded:
+        failed = True
+        print('main_backend imports heavy modules at startup:', ', '.join(loaded))
+    print(f'budget {args.budget * 1000:.0f} ms:', 'FAIL' if failed else 'OK')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# ----------------------------- bench_xlsx.py -----------------------------
+"""
+Compare the streaming XLSX sales report with the CSV one: wall time and peak RSS.
+
+Builds a scratch database with N invoices, then runs each export in its own
+interpreter so peak memory is measured per export. Windows has no `resource`
+module: there the peak working set comes from psutil when it is installed,
+else the tracemalloc peak of the Python heap is shown (slower, and smaller
+than RSS).
+
+    python bench_xlsx.py [--invoices 200000]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r'''
+import sys, time, json
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+        import tracemalloc
+        tracemalloc.start()
+sys.path.insert(0, %(src)r)
+from database import Database
+db = Database(%(db)r)
+started = time.perf_counter()
+if %(kind)r == 'csv':
+    from invoices import InvoiceManager
+    InvoiceManager(db).export_sales_report_csv(%(out)r)
+else:
+    from xlsx_export import export_sales_report_xlsx
+    export_sales_report_xlsx(db, %(out)r)
+elapsed = time.perf_counter() - started
+measure = 'peak RSS'
+if resource is not None:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+elif psutil is not None:
+    info = psutil.Process().memory_info()
+    peak = getattr(info, 'peak_wset', info.rss) // 1024
+else:
+    peak = tracemalloc.get_traced_memory()[1] // 1024
+    measure = 'peak heap'
+print(json.dumps({'seconds': elapsed, 'peak_kb': peak, 'measure': measure}))
+'''
+
+def build_db(path, n):
+    sys.path.insert(0, SOURCE_DIR)
+    from database import Database
+    db = Database(path)
+    start = datetime(2024, 1, 1)
+    # a generator keeps this process small; children forked from it inherit its peak RSS
+    rows = ((f'INV-{i}', (i % 500) + 1, (start + timedelta(minutes=i)).isoformat(), '100.00', '18.00', '118.00')
+            for i in range(1, n + 1))
+    db.conn.executemany('INSERT INTO invoices (invoice_no, customer_id, date, subtotal, tax, total) VALUES (?,?,?,?,?,?)', rows)
+    db.conn.commit()
+    db.close()
+
+def run(kind, db_path, out):
+    code = CHILD % {'src': SOURCE_DIR, 'db': db_path, 'kind': kind, 'out': out}
+    res = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark XLSX vs CSV sales report export')
+    parser.add_argument('--invoices', type=int, default=200000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        build_db(db_path, args.invoices)
+        for kind, out in (('csv', 'report.csv'), ('xlsx', 'report.xlsx')):
+            try:
+                r = run(kind, db_path, os.path.join(tmp, out))
+            except subprocess.CalledProcessError as e:
+                print(f"{kind:5s} failed: {e.stderr.strip().splitlines()[-1]}")
+                continue
+            size = os.path.getsize(os.path.join(tmp, out))
+            print(f"{kind:5s} {r['seconds']:8.2f} s  {r['measure']:9s} {r['peak_kb'] / 1024:8.1f} MiB  "
+                  f"file {size / 1024 / 1024:8.1f} MiB")
+
+if __name__ == '__main__':
+    main()
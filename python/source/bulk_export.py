@@ -0,0 +1,109 @@
+# ----------------------------- bulk_export.py -----------------------------
+import os
+import io
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from database import Database, date_range
+from customer import Customer
+from invoices import InvoiceManager
+
+CHUNK_SIZE = 50
+
+def select_invoice_ids(db: Database, start_date=None, end_date=None, customer_id=None, ids=None):
+    """Invoice ids for a date range (inclusive days), a customer and/or an explicit id list"""
+    where, params = date_range('date', start_date, end_date)
+    sql = 'SELECT id FROM invoices WHERE 1=1' + ''.join(f' AND {w}' for w in where)
+    if customer_id is not None:
+        sql += ' AND customer_id = ?'
+        params.append(customer_id)
+    if not ids:
+        return [r['id'] for r in db.conn.execute(sql + ' ORDER BY id', params)]
+    # explicit ids go 500 at a time, under SQLite's bound-variable limit
+    ids = sorted(set(ids))
+    found = []
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        found += [r['id'] for r in db.conn.execute(
+            sql + f" AND id IN ({','.join('?' * len(chunk))}) ORDER BY id", params + chunk)]
+    return found
+
+# ---------- worker side: one read-only connection and one renderer per process ----------
+_worker = None
+
+def _init_worker(db_filename, profile):
+    global _worker
+    try:
+        from pdf_export import PdfRenderer
+        db = Database.open_readonly(db_filename, profile)
+        _worker = (db, InvoiceManager(db), Customer(db), PdfRenderer.shared())
+    except Exception as e:
+        # reported against every invoice this worker is given, instead of breaking the pool
+        _worker = e
+
+def _render_chunk(invoice_ids, out_dir):
+    """Render a chunk; returns (invoice_id, filename, pdf bytes or None, error or None) per invoice.
+    With out_dir the PDF is written there, otherwise its bytes are returned."""
+    if isinstance(_worker, Exception):
+        return [(i, None, None, f"{type(_worker).__name__}: {_worker}") for i in invoice_ids]
+    db, invoices, customers, renderer = _worker
+    results = []
+    for invoice_id in invoice_ids:
+        try:
+            found = invoices.get_invoice(invoice_id)
+            if not found:
+                raise ValueError("Invoice not found")
+            inv, items = found
+            cust = customers.get_customer(inv['customer_id'])
+            cust = dict(cust) if cust else None
+            name = f"{inv['invoice_no'] or 'invoice_' + str(invoice_id)}.pdf".replace('/', '_')
+            if out_dir:
+                renderer.render(inv, items, cust, os.path.join(out_dir, name))
+                results.append((invoice_id, name, None, None))
+            else:
+                buf = io.BytesIO()
+                renderer.render(inv, items, cust, buf)
+                results.append((invoice_id, name, buf.getvalue(), None))
+        except Exception as e:
+            results.append((invoice_id, None, None, f"{type(e).__name__}: {e}"))
+    return results
+
+def bulk_export_pdfs(db: Database, invoice_ids, out, workers=None, progress=None):
+    """Render many invoices to PDF across a process pool.
+
+    `out` is a directory, or a path ending in .zip for a single archive.
+    `progress` is called as progress(done, total). One failing invoice does not
+    stop the run; returns {'exported': [(invoice_id, name)], 'errors': [(invoice_id, message)]}.
+    """
+    to_zip = out.lower().endswith('.zip')
+    out_dir = None
+    if not to_zip:
+        os.makedirs(out, exist_ok=True)
+        out_dir = os.path.abspath(out)
+    chunks = [invoice_ids[i:i + CHUNK_SIZE] for i in range(0, len(invoice_ids), CHUNK_SIZE)]
+    exported, errors = [], []
+    done = 0
+    archive = zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) if to_zip else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(db.filename, db.profile)) as pool:
+            futures = {pool.submit(_render_chunk, chunk, out_dir): chunk for chunk in chunks}
+            for fut in as_completed(futures):
+                try:
+                    results = fut.result()
+                except Exception as e:
+                    # the worker process died; charge it to the whole chunk
+                    results = [(i, None, None, f"{type(e).__name__}: {e}") for i in futures[fut]]
+                for invoice_id, name, data, error in results:
+                    if error:
+                        errors.append((invoice_id, error))
+                    else:
+                        if archive:
+                            archive.writestr(name, data)
+                        exported.append((invoice_id, name))
+                    done += 1
+                if progress:
+                    progress(done, len(invoice_ids))
+    finally:
+        if archive:
+            archive.close()
+    return {'exported': sorted(exported), 'errors': sorted(errors)}
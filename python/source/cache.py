@@ -0,0 +1,91 @@
+# ----------------------------- cache.py -----------------------------
+import os
+import time
+from collections import OrderedDict
+
+# Defaults for every cache; override per deployment with the environment.
+# A size or a TTL of 0 turns caching off; NKE_CACHE_TTL=inf never expires entries.
+CACHE_SIZE = int(os.environ.get('NKE_CACHE_SIZE', '1024'))
+CACHE_TTL = float(os.environ.get('NKE_CACHE_TTL', '300'))
+
+def _copy(value):
+    # rows converted from paise storage are plain dicts: hand out copies, so a
+    # caller editing its row cannot change what everyone else reads
+    return dict(value) if isinstance(value, dict) else value
+
+class LRUCache:
+    """Least-recently-used cache with a per-entry time-to-live and hit/miss counters.
+    A maxsize or ttl of 0 disables it: every lookup goes to the loader."""
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader(key) on a miss.
+        None results are not cached, so rows created later are still found."""
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return _copy(value)
+            del self._data[key]
+        self.misses += 1
+        value = loader(key)
+        if value is not None and self.enabled:
+            self._data[key] = (_copy(value), time.monotonic() + self.ttl)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def get_many(self, keys, loader):
+        """Like get() for many keys at once: the misses are passed together to
+        loader(missing_keys), which returns a dict of the values it found"""
+        found = {}
+        missing = []
+        now = time.monotonic()
+        for key in keys:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                found[key] = _copy(entry[0])
+            else:
+                self._data.pop(key, None)
+                missing.append(key)
+        if missing:
+            self.misses += len(missing)
+            loaded = loader(missing)
+            found.update(loaded)
+            if self.enabled:
+                for key, value in loaded.items():
+                    if value is not None:
+                        self._data[key] = (_copy(value), now + self.ttl)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return found
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
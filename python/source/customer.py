@@ -1,15 +1,17 @@
 # ----------------------------- customer.py -----------------------------
-from database import Database, to_decimal
+from database import Database, to_decimal, keyset_page, like_pattern
 
 class Customer:
     def __init__(self, db: Database):
         self.db = db
+        self.cache = db.cache('customers')
     
     # Add a new customer
     def add_customer(self, name, email=None, phone=None, address=None):
         cur = self.db.conn.cursor()
         cur.execute('INSERT INTO customers (name,email,phone,address) VALUES (?,?,?,?)', (name,email,phone,address))
         self.db.conn.commit()
+        self.cache.invalidate(cur.lastrowid)
         return cur.lastrowid
     
     # Update an existing customer
@@ -25,16 +27,48 @@ class Customer:
             return False
         params.append(customer_id)
         sql = f"UPDATE customers SET {', '.join(updates)} WHERE id=?"
-        self.conn.execute(sql, params)
-        self.conn.commit()
+        self.db.conn.execute(sql, params)
+        self.db.conn.commit()
+        self.cache.invalidate(customer_id)
         return True
     
     # Get single customer details
     def get_customer(self, customer_id):
+        return self.cache.get(customer_id, self._load_customer)
+
+    def _load_customer(self, customer_id):
         cur = self.db.conn.execute('SELECT * FROM customers WHERE id=?', (customer_id,))
-        return cur.fetchone() 
+        return cur.fetchone()
     
     # List of customers
     def list_customers(self):
         cur = self.db.conn.execute('SELECT * FROM customers')
-        return cur.fetchall()
\ No newline at end of file
+        return cur.fetchall()
+
+    # Sort orders for page_customers: name -> (SQL expression, row column)
+    SORTS = {
+        'id': ('id', 'id'),
+        'name': ('name', 'name'),
+    }
+
+    def page_customers(self, cursor=None, limit=50, sort='id', descending=False, term=None):
+        """One page of customers ordered by `sort` (see SORTS); `term` keeps those
+        whose name, email or phone contains it. Returns (rows, next_cursor);
+        next_cursor is None on the last page."""
+        if sort not in self.SORTS:
+            raise ValueError(f"Unknown sort {sort!r}; use one of {', '.join(self.SORTS)}")
+        where, params = [], []
+        if term:
+            where.append("name LIKE ? ESCAPE '\\' OR email LIKE ? ESCAPE '\\' OR phone LIKE ? ESCAPE '\\'")
+            params += [like_pattern(term)] * 3
+        return keyset_page(self.db.conn, 'SELECT * FROM customers', where, params,
+                           (self.SORTS[sort], self.SORTS['id']), descending, cursor, limit)
+
+    def iter_customers(self, sort='id', descending=False, term=None, batch_size=500):
+        """Yield every matching customer, one keyset page of `batch_size` at a time"""
+        cursor = None
+        while True:
+            rows, cursor = self.page_customers(cursor, batch_size, sort, descending, term)
+            yield from rows
+            if cursor is None:
+                break
@@ -1,14 +1,38 @@
 # ----------------------------- database.py -----------------------------
+import os
+import re
 import sqlite3
+import configparser
+from contextlib import contextmanager
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime
+from datetime import datetime, date, timedelta
+import time
+import random
+from cache import LRUCache
 
 DB_FILENAME = 'nkenterprises.db'
 
 def to_decimal(x):
     return Decimal(str(x)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-def ensure_db(conn: sqlite3.Connection):
+def to_paise(amount):
+    return int(to_decimal(amount) * 100)
+
+def from_paise(p):
+    return (Decimal(int(p or 0)) / 100).quantize(Decimal('0.01'))
+
+def paise_str(p):
+    """Integer paise -> '123.45' (the same text str(to_decimal(...)) gives)"""
+    sign = '-' if p < 0 else ''
+    p = abs(p)
+    return f'{sign}{p // 100}.{p % 100:02d}'
+
+REBUILD_STOCK_LEVELS_SQL = '''
+    INSERT OR REPLACE INTO stock_levels (product_id, qty)
+    SELECT product_id, SUM(change) FROM inventory_movements GROUP BY product_id
+'''
+
+def ensure_db(conn: sqlite3.Connection, report=None):
     c = conn.cursor()
     # products: id, sku, name, price (per unit), cost, stock
     c.execute('''
@@ -70,22 +94,540 @@ def ensure_db(conn: sqlite3.Connection):
         )
     ''')
     conn.commit()
+    return migrate(conn, report)
+
+# ----------------------------- migrations -----------------------------
+# Each migration runs once, in version order, inside its own transaction and
+# bumps PRAGMA user_version when it commits. To change the schema, add a new
+# function with the next version number; never edit one that has shipped.
+MIGRATIONS = []
+
+def migration(version, name):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+def schema_version(conn: sqlite3.Connection):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn: sqlite3.Connection, report=None):
+    """Apply pending migrations; returns [(version, name, seconds), ...] for those applied"""
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        if version <= schema_version(conn):
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        started = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # another process may have applied it while we waited for the lock
+            if version <= schema_version(conn):
+                conn.rollback()
+                continue
+            fn(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        applied.append((version, name, elapsed))
+        if report:
+            report(version, name, elapsed)
+    return applied
+
+# stock_levels: materialized SUM(change) per product, kept in step with
+# inventory_movements so stock reads do not scan the whole ledger
+@migration(1, 'stock_levels table')
+def _m0001_stock_levels(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS stock_levels (
+            product_id INTEGER PRIMARY KEY,
+            qty INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+    ''')
+    c.execute('DELETE FROM stock_levels')
+    c.execute(REBUILD_STOCK_LEVELS_SQL)
+
+# invoice_sequences: last invoice number handed out per day (YYYY-MM-DD)
+@migration(2, 'invoice_sequences table')
+def _m0002_invoice_sequences(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_sequences (
+            day TEXT PRIMARY KEY,
+            last_no INTEGER NOT NULL
+        )
+    ''')
+    # carry on from the COUNT(*)-based numbers already issued
+    c.execute('''
+        INSERT OR IGNORE INTO invoice_sequences (day, last_no)
+        SELECT substr(date,1,10), COUNT(*) FROM invoices GROUP BY substr(date,1,10)
+    ''')
+
+# secondary indexes for the lookups every stock check, invoice view and report makes
+@migration(3, 'hot-path indexes')
+def _m0003_hot_path_indexes(c):
+    c.execute('CREATE INDEX IF NOT EXISTS idx_inventory_movements_product ON inventory_movements(product_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON invoice_items(invoice_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(date)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_invoices_customer ON invoices(customer_id)')
+
+# full-text index over product SKU and name, kept in sync by triggers; SQLite
+# builds without FTS5 skip it and product search falls back to LIKE
+@migration(4, 'products_fts search index')
+def _m0004_products_fts(c):
+    try:
+        c.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                sku, name, content='products', content_rowid='id', prefix='2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        if 'fts5' in str(e):
+            return
+        raise
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, sku, name) VALUES (new.id, new.sku, new.name);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF sku, name ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, sku, name) VALUES ('delete', old.id, old.sku, old.name);
+            INSERT INTO products_fts(rowid, sku, name) VALUES (new.id, new.sku, new.name);
+        END
+    ''')
+    c.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+# daily_sales / daily_customer_sales: per-day (and per-day-per-customer) invoice
+# rollups in integer paise, kept up to date by invoice creation
+def rebuild_daily_sales_sql(storage='decimal'):
+    subtotal, tax, total = (paise_sql(c, storage) for c in ('subtotal', 'IFNULL(tax,0)', 'total'))
+    return [f'''
+    INSERT INTO daily_sales (day, invoice_count, subtotal_paise, tax_paise, total_paise)
+    SELECT substr(date,1,10), COUNT(*), SUM({subtotal}), SUM({tax}), SUM({total})
+    FROM invoices GROUP BY substr(date,1,10)
+''', f'''
+    INSERT INTO daily_customer_sales (day, customer_id, invoice_count, subtotal_paise, tax_paise, total_paise)
+    SELECT substr(date,1,10), IFNULL(customer_id,0), COUNT(*), SUM({subtotal}), SUM({tax}), SUM({total})
+    FROM invoices GROUP BY substr(date,1,10), IFNULL(customer_id,0)
+''']
+
+@migration(5, 'daily sales rollups')
+def _m0005_daily_sales(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS daily_sales (
+            day TEXT PRIMARY KEY,
+            invoice_count INTEGER NOT NULL,
+            subtotal_paise INTEGER NOT NULL,
+            tax_paise INTEGER NOT NULL,
+            total_paise INTEGER NOT NULL
+        )
+    ''')
+    # customer_id 0 = invoices without a customer
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS daily_customer_sales (
+            day TEXT NOT NULL,
+            customer_id INTEGER NOT NULL,
+            invoice_count INTEGER NOT NULL,
+            subtotal_paise INTEGER NOT NULL,
+            tax_paise INTEGER NOT NULL,
+            total_paise INTEGER NOT NULL,
+            PRIMARY KEY (day, customer_id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_daily_customer_sales_customer ON daily_customer_sales(customer_id, day)')
+    c.execute('DELETE FROM daily_sales')
+    c.execute('DELETE FROM daily_customer_sales')
+    # money is always stored as decimal strings before migration 6
+    for sql in rebuild_daily_sales_sql('decimal'):
+        c.execute(sql)
+
+# settings: per-file key/value options, e.g. money_storage
+@migration(6, 'settings table')
+def _m0006_settings(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('money_storage', 'decimal')")
+
+# GST: an HSN rate table, per-product HSN code / rate override, and per-line
+# tax on invoice items so breakup reports read stored columns. Rates are in
+# hundredths of a percent (1800 = 18%). invoices.supply is 'intra' (CGST+SGST),
+# 'inter' (IGST) or NULL for the old single flat rate on the subtotal.
+@migration(7, 'GST tax rates and per-line tax')
+def _m0007_gst(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS tax_rates (
+            hsn TEXT PRIMARY KEY,
+            rate_bp INTEGER NOT NULL,
+            description TEXT
+        )
+    ''')
+    c.execute('ALTER TABLE products ADD COLUMN hsn TEXT')
+    c.execute('ALTER TABLE products ADD COLUMN gst_rate_bp INTEGER')
+    c.execute('ALTER TABLE invoices ADD COLUMN supply TEXT')
+    c.execute('ALTER TABLE invoice_items ADD COLUMN hsn TEXT')
+    c.execute('ALTER TABLE invoice_items ADD COLUMN tax_rate_bp INTEGER')
+    c.execute('ALTER TABLE invoice_items ADD COLUMN cgst NUMERIC')
+    c.execute('ALTER TABLE invoice_items ADD COLUMN sgst NUMERIC')
+    c.execute('ALTER TABLE invoice_items ADD COLUMN igst NUMERIC')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_invoice_items_tax ON invoice_items(tax_rate_bp, hsn)')
+
+# Recent demand for the reorder engine: outgoing movements by time, covering
+# the columns it sums, so a 30-day window reads only that window's rows
+@migration(8, 'outgoing movements by time')
+def _m0008_outgoing_movements(c):
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_inventory_movements_out
+        ON inventory_movements(created_at, product_id, change) WHERE change < 0
+    ''')
+
+# Sort orders for the keyset-paginated listings (Product/Customer/InvoiceManager
+# page_* methods); each index ends in the rowid, so (column, id) is walked in order
+@migration(9, 'listing sort indexes')
+def _m0009_listing_indexes(c):
+    c.execute('CREATE INDEX IF NOT EXISTS idx_products_name ON products(name)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_products_price ON products(price)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_customers_name ON customers(name)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_invoices_customer_date ON invoices(customer_id, date)')
+
+# Customer imports without ids match existing customers on email, then phone
+@migration(10, 'customer contact indexes')
+def _m0010_customer_contact_indexes(c):
+    c.execute('CREATE INDEX IF NOT EXISTS idx_customers_email ON customers(email)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_customers_phone ON customers(phone)')
+
+# sku may be NULL, so the SKU listing sorts on IFNULL(sku, '') (see Product.SORTS)
+@migration(11, 'sku sort index')
+def _m0011_sku_sort_index(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_products_sku_sort ON products(IFNULL(sku, ''))")
+
+# ----------------------------- money storage -----------------------------
+# Amounts in products, invoices and invoice_items are stored either as decimal
+# strings (which SQLite keeps as REAL) or, once converted with
+# Database.set_money_storage('paise'), as integer paise so sums are exact.
+# Code reads and writes them through Database.money_in/money_out/money_row and
+# only works with Decimal at the edges (screens, exports, PDFs).
+MONEY_STORAGE_MODES = ('decimal', 'paise')
+MONEY_COLUMNS = {
+    'products': ('price', 'cost'),
+    'invoices': ('subtotal', 'tax', 'total'),
+    'invoice_items': ('unit_price', 'line_total', 'cgst', 'sgst', 'igst'),
+}
+
+def paise_sql(expr, storage='decimal'):
+    """SQL expression for the money column/expression `expr` as integer paise"""
+    return expr if storage == 'paise' else f'CAST(ROUND({expr}*100) AS INTEGER)'
+
+# ----------------------------- keyset pagination -----------------------------
+def keyset_page(conn, sql, where, params, sort, descending=False, cursor=None, limit=50):
+    """One page of `sql` (a SELECT ... FROM ... without WHERE/ORDER BY).
+
+    `where` is a list of AND-ed conditions with `params` for them. `sort` is
+    ((sort_expr, row_column), (key_expr, row_column)) where the key is unique
+    (the id), so ties on the sort column are broken by it. A row-value
+    comparison with NULL never matches, so a nullable column is sorted as
+    IFNULL(column, fallback) with the fallback as a third item of its pair:
+    ("IFNULL(sku, '')", 'sku', ''). `cursor` is the
+    value the previous page returned; rows come strictly after it, so pages
+    stay consistent while rows are added and cost the same however deep.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    (sort_expr, sort_col, *null_as), (key_expr, key_col) = sort
+    where, params = list(where), list(params)
+    op, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+    if cursor is not None:
+        if sort_expr == key_expr:
+            where.append(f'{key_expr} {op} ?')
+            params.append(cursor[-1])
+        else:
+            # the plain bound lets SQLite seek an expression index; the row value breaks ties
+            where.append(f'{sort_expr} {op}= ?')
+            where.append(f'({sort_expr}, {key_expr}) {op} (?, ?)')
+            params += [cursor[0]] + list(cursor)
+    if where:
+        sql += ' WHERE ' + ' AND '.join(f'({w})' for w in where)
+    sql += f' ORDER BY {sort_expr} {direction}'
+    if sort_expr != key_expr:
+        sql += f', {key_expr} {direction}'
+    rows = conn.execute(sql + ' LIMIT ?', params + [int(limit) + 1]).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    value = rows[-1][sort_col]
+    if value is None and null_as:
+        value = null_as[0]
+    return rows, (value, rows[-1][key_col])
+
+def like_pattern(term):
+    """LIKE pattern (with ESCAPE '\\') matching `term` anywhere"""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+# ----------------------------- date ranges -----------------------------
+_DAY = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+def date_range(column, start=None, end=None):
+    """WHERE conditions and params for `column` from `start` to `end`.
+
+    Either bound may be left out and both are inclusive: a YYYY-MM-DD end
+    takes in the whole of that day, a full timestamp is an exact upper bound.
+    Every report, export and listing filters dates through this, so a start
+    and end date mean the same thing everywhere.
+    """
+    where, params = [], []
+    if start:
+        where.append(f'{column} >= ?')
+        params.append(start)
+    if end:
+        if _DAY.match(end):
+            where.append(f'{column} < ?')
+            params.append((date.fromisoformat(end) + timedelta(days=1)).isoformat())
+        else:
+            where.append(f'{column} <= ?')
+            params.append(end)
+    return where, params
+
+def money_storage(conn: sqlite3.Connection):
+    try:
+        r = conn.execute("SELECT value FROM settings WHERE key='money_storage'").fetchone()
+    except sqlite3.OperationalError:
+        # read-only connection to a file that predates the settings table
+        return 'decimal'
+    return r[0] if r else 'decimal'
+
+# ----------------------------- connection profiles -----------------------------
+# PRAGMAs applied to every connection. "default" leaves SQLite as it ships;
+# "server" suits several counter terminals sharing one file: WAL lets readers
+# carry on while an invoice is being written, and synchronous=NORMAL only
+# fsyncs at checkpoints. Pick one with NKE_DB_PROFILE or a [database] section
+# in the config file (NKE_CONFIG, default nkenterprises.ini); individual keys
+# there override the profile's values.
+PROFILES = {
+    'default': {},
+    'server': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,       # negative = KiB, i.e. 64 MiB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'foreign_keys': 1,
+    },
+}
+CONFIG_FILENAME = 'nkenterprises.ini'
+
+_PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+_PRAGMA_INTS = {'mmap_size', 'cache_size', 'busy_timeout', 'foreign_keys'}
+
+def load_profile(name=None, config_path=None):
+    """Resolve the PRAGMA settings for this deployment"""
+    config_path = config_path or os.environ.get('NKE_CONFIG', CONFIG_FILENAME)
+    section = {}
+    if os.path.exists(config_path):
+        cp = configparser.ConfigParser()
+        cp.read(config_path)
+        if cp.has_section('database'):
+            section = dict(cp.items('database'))
+    name = name or os.environ.get('NKE_DB_PROFILE') or section.pop('profile', None) or 'default'
+    section.pop('profile', None)
+    if name not in PROFILES:
+        raise ValueError(f"Unknown database profile {name!r}; choose from {', '.join(PROFILES)}")
+    settings = dict(PROFILES[name])
+    for k, v in section.items():
+        if k in _PRAGMA_CHOICES or k in _PRAGMA_INTS:
+            settings[k] = v
+    return name, settings
+
+def apply_profile(conn: sqlite3.Connection, settings):
+    for k, v in settings.items():
+        if k in _PRAGMA_INTS:
+            v = int(v)
+        elif k in _PRAGMA_CHOICES:
+            v = str(v).upper()
+            if v not in _PRAGMA_CHOICES[k]:
+                raise ValueError(f"Invalid value {v!r} for PRAGMA {k}")
+        else:
+            raise ValueError(f"Unsupported PRAGMA {k!r} in database profile")
+        conn.execute(f'PRAGMA {k} = {v}')
+
+# How often begin() retries a busy database, and the first pause between tries
+BUSY_RETRIES = int(os.environ.get('NKE_BUSY_RETRIES', '8'))
+BUSY_BACKOFF = 0.05
+
+# Per-statement timing and the slow-query log (see sqlstats.py); off by default
+SQL_STATS = os.environ.get('NKE_SQL_STATS', '') not in ('', '0')
+
+def _instrumented(conn, filename):
+    if not SQL_STATS:
+        return conn
+    from sqlstats import instrument
+    return instrument(conn, filename)
+
+def _is_busy(e):
+    code = getattr(e, 'sqlite_errorcode', None)
+    if code is not None:
+        # extended codes (e.g. SQLITE_BUSY_SNAPSHOT) keep the primary code in the low byte
+        return (code & 0xff) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'locked' in str(e) or 'busy' in str(e)
 
 class Database:
-    def __init__(self, filename=DB_FILENAME):
+    # cache_size: entries per named cache (None = NKE_CACHE_SIZE, 0 = off)
+    # check_same_thread=False lets a pool hand the connection to different
+    # threads, one at a time
+    def __init__(self, filename=DB_FILENAME, on_migration=None, profile=None, cache_size=None,
+                 check_same_thread=True):
         self.filename = filename
-        self.conn = sqlite3.connect(self.filename)
+        self.cache_size = cache_size
+        self.profile, self.settings = load_profile(profile)
+        self.conn = sqlite3.connect(self.filename, check_same_thread=check_same_thread)
         self.conn.row_factory = sqlite3.Row
-        ensure_db(self.conn)
+        apply_profile(self.conn, self.settings)
+        self.migrations_applied = ensure_db(self.conn, on_migration)
+        self.conn = _instrumented(self.conn, self.filename)
+        self.money_storage = money_storage(self.conn)
+
+    @classmethod
+    def open_readonly(cls, filename=DB_FILENAME, profile=None, cache_size=None, check_same_thread=True):
+        """Open a read-only connection for worker processes and report readers.
+        No schema setup runs; the file must already have been opened read-write once."""
+        db = cls.__new__(cls)
+        db.filename = filename
+        db.cache_size = cache_size
+        db.profile, db.settings = load_profile(profile)
+        db.conn = sqlite3.connect(f'file:{os.path.abspath(filename)}?mode=ro', uri=True,
+                                  check_same_thread=check_same_thread)
+        db.conn.row_factory = sqlite3.Row
+        # journal_mode is a property of the file, set by read-write connections
+        apply_profile(db.conn, {k: v for k, v in db.settings.items() if k != 'journal_mode'})
+        db.migrations_applied = []
+        db.conn = _instrumented(db.conn, filename)
+        db.money_storage = money_storage(db.conn)
+        return db
 
     def close(self):
         self.conn.close()
+
+    # Named read-through caches (e.g. 'products', 'customers') shared by every
+    # manager object on this connection, so invalidation is seen by all of them
+    def cache(self, name):
+        caches = self.__dict__.setdefault('_caches', {})
+        if name not in caches:
+            caches[name] = LRUCache(self.cache_size)
+        return caches[name]
+
+    def cache_stats(self):
+        return {name: c.stats() for name, c in self.__dict__.get('_caches', {}).items()}
+
+    def clear_caches(self):
+        for c in self.__dict__.get('_caches', {}).values():
+            c.clear()
+
+    def begin(self):
+        """BEGIN IMMEDIATE, retrying with jittered exponential backoff while
+        another connection holds the write lock past the busy timeout"""
+        if self.conn.in_transaction:
+            self.conn.commit()
+        delay = BUSY_BACKOFF
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                self.conn.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if attempt == BUSY_RETRIES or not _is_busy(e):
+                    raise
+            time.sleep(delay * (1 + random.random()))
+            delay *= 2
+
+    # Run a block as one write transaction: BEGIN IMMEDIATE takes the write
+    # lock up front, so checks made inside the block stay valid until commit
+    @contextmanager
+    def transaction(self):
+        self.begin()
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
     
-    def backup_db(self, backup_path):
-        self.conn.commit()
-        self.conn.close()
-        import shutil
-        shutil.copyfile(self.filename, backup_path)
-        self.conn = sqlite3.connect(self.filename)
-        self.conn.row_factory = sqlite3.Row
-        return backup_path
\ No newline at end of file
+    # ---- money: storage values <-> Decimal ----
+    def money_in(self, amount):
+        """Value to store for an amount (anything to_decimal accepts); None stays None"""
+        if amount is None:
+            return None
+        if self.money_storage == 'paise':
+            return to_paise(amount)
+        return str(to_decimal(amount))
+
+    def money_in_paise(self, p):
+        """Value to store for an amount already in integer paise"""
+        if p is None:
+            return None
+        return p if self.money_storage == 'paise' else paise_str(p)
+
+    def money_out(self, value):
+        """Decimal for a stored amount; None stays None"""
+        if value is None:
+            return None
+        if self.money_storage == 'paise':
+            return from_paise(value)
+        return to_decimal(value)
+
+    def money_row(self, row, *columns):
+        """A row with the given money columns as Decimal (as a dict) in paise
+        storage; in decimal storage the row is returned as it is"""
+        if row is None or self.money_storage != 'paise':
+            return row
+        d = dict(row)
+        for c in columns:
+            if c in d:
+                d[c] = self.money_out(d[c])
+        return d
+
+    def paise_sql(self, expr):
+        return paise_sql(expr, self.money_storage)
+
+    def set_money_storage(self, mode):
+        """Convert every stored amount to `mode` ('decimal' or 'paise') in one
+        transaction; returns the number of rows rewritten. Other terminals should
+        be closed first, as they keep the mode they opened the file with."""
+        if mode not in MONEY_STORAGE_MODES:
+            raise ValueError(f"Unknown money storage {mode!r}; choose from {', '.join(MONEY_STORAGE_MODES)}")
+        changed = 0
+        with self.transaction() as conn:
+            current = money_storage(conn)
+            if current == mode:
+                return 0
+            for table, columns in MONEY_COLUMNS.items():
+                if mode == 'paise':
+                    sets = ', '.join(f'{c} = CAST(ROUND({c}*100) AS INTEGER)' for c in columns)
+                else:
+                    sets = ', '.join(f'{c} = ROUND({c}/100.0, 2)' for c in columns)
+                changed += conn.execute(f'UPDATE {table} SET {sets}').rowcount
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('money_storage', ?)", (mode,))
+        self.money_storage = mode
+        self.clear_caches()
+        return changed
+
+    def backup_db(self, backup_path, **options):
+        """Online backup of the live database; see backup.online_backup for options"""
+        from backup import online_backup
+        return online_backup(self, backup_path, **options)
@@ -0,0 +1,279 @@
+# ----------------------------- datagen.py -----------------------------
+"""
+Seeded synthetic data for benchmarks and load tests.
+
+Builds a database with N products, M customers, days of invoices (priced with
+the same integer-paise rules and GST split as InvoiceManager) and the stock
+ledger that goes with them: opening stock, a sale movement per line, purchase
+receipts when a product drops to its reorder level, and optionally extra
+branch-transfer movements up to a target ledger size. The same seed always
+gives the same data. Rows are written with executemany in large
+transactions, then stock levels and daily rollups are rebuilt from them.
+
+    python datagen.py OUT.db [--scale small|medium|large] [--products N] [--customers M]
+                             [--days D] [--invoices-per-day K] [--movements TOTAL] [--seed 42]
+"""
+import os
+import json
+import time
+import random
+import argparse
+from datetime import date, datetime, timedelta
+from database import Database
+from inventory import Inventory
+from invoices import INVOICE_NO_FORMAT, check_number_format
+from pricing import tax_paise, gst_lines
+from sales import SalesManager
+
+# Preset sizes; any option given on the command line overrides its preset value
+SCALES = {
+    'small': dict(products=2000, customers=500, days=365, invoices_per_day=50, movements=0),
+    'medium': dict(products=50000, customers=20000, days=3 * 365, invoices_per_day=500, movements=5000000),
+    'large': dict(products=500000, customers=200000, days=5 * 365, invoices_per_day=2000, movements=20000000),
+}
+
+# HSN code -> GST rate (hundredths of a percent)
+HSN_RATES = {'0401': 0, '1006': 500, '3004': 1200, '8471': 1800, '8703': 2800, '9403': 1800}
+
+ADJECTIVES = ['Heavy', 'Compact', 'Premium', 'Standard', 'Deluxe', 'Mini', 'Industrial', 'Classic', 'Eco', 'Pro']
+MATERIALS = ['Steel', 'Brass', 'Copper', 'Plastic', 'Teak', 'Cotton', 'Glass', 'Rubber', 'Aluminium', 'Ceramic']
+NOUNS = ['Bolt', 'Hinge', 'Pipe', 'Valve', 'Cable', 'Bracket', 'Fan', 'Switch', 'Chair', 'Lamp',
+         'Hose', 'Drill', 'Socket', 'Panel', 'Filter', 'Pump', 'Washer', 'Clamp', 'Shelf', 'Kettle']
+FIRST_NAMES = ['Asha', 'Ravi', 'Priya', 'Arjun', 'Meera', 'Vikram', 'Neha', 'Karan', 'Divya', 'Sanjay',
+               'Anita', 'Rahul', 'Sunita', 'Manoj', 'Kavya', 'Amit']
+LAST_NAMES = ['Sharma', 'Patel', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Singh', 'Rao', 'Das', 'Mehta', 'Joshi', 'Khan']
+CITIES = ['Mumbai', 'Pune', 'Chennai', 'Bengaluru', 'Hyderabad', 'Kolkata', 'Delhi', 'Jaipur']
+
+CHUNK = 50000   # rows per executemany / commit
+
+def _chunks(rows, size=CHUNK):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _insert(db, sql, rows):
+    n = 0
+    for batch in _chunks(rows):
+        with db.transaction() as conn:
+            conn.executemany(sql, batch)
+        n += len(batch)
+    return n
+
+def generate(db: Database, products=2000, customers=500, days=365, invoices_per_day=50, movements=0,
+             seed=42, end=None, progress=None):
+    """Fill an empty database with seeded synthetic data; returns row counts and seconds.
+
+    `movements` is the total ledger size to reach with branch transfers on top
+    of the opening stock, sales and receipts (0 adds none). `end` is the last
+    invoice day (default today); invoices start `days` days earlier.
+    """
+    if db.conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]:
+        raise ValueError('datagen needs an empty database')
+    check_number_format(INVOICE_NO_FORMAT)
+    rnd = random.Random(seed)
+    say = progress or (lambda msg: None)
+    started = time.perf_counter()
+    money = db.money_in_paise
+    end = end or date.today()
+    first_day = end - timedelta(days=days - 1)
+    opening = datetime.combine(first_day, datetime.min.time()).isoformat()
+
+    db.conn.executemany('INSERT OR REPLACE INTO tax_rates (hsn, rate_bp, description) VALUES (?,?,?)',
+                        [(hsn, bp, 'generated') for hsn, bp in HSN_RATES.items()])
+    db.conn.commit()
+
+    # ---------- products ----------
+    say(f'{products} products')
+    prices = [0] * (products + 1)
+    reorder = [0] * (products + 1)
+    hsns = list(HSN_RATES)
+    product_hsn = [None] * (products + 1)
+
+    def product_rows():
+        for pid in range(1, products + 1):
+            price = rnd.choice((rnd.randint(1000, 50000), rnd.randint(50000, 500000)))
+            prices[pid] = price
+            reorder[pid] = rnd.choice((0, 5, 10, 20, 50))
+            product_hsn[pid] = rnd.choice(hsns)
+            name = f'{rnd.choice(ADJECTIVES)} {rnd.choice(MATERIALS)} {rnd.choice(NOUNS)} {rnd.randint(1, 99)}'
+            yield (pid, f'GEN-{pid:07d}', name, money(price), money(price * rnd.randint(55, 85) // 100),
+                   reorder[pid], product_hsn[pid])
+    _insert(db, 'INSERT INTO products (id, sku, name, price, cost, reorder_level, hsn) VALUES (?,?,?,?,?,?,?)',
+            product_rows())
+
+    # ---------- customers ----------
+    say(f'{customers} customers')
+
+    def customer_rows():
+        for cid in range(1, customers + 1):
+            first, last = rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES)
+            yield (cid, f'{first} {last}', f'{first}.{last}{cid}@example.com'.lower(),
+                   f'+91{rnd.randint(7000000000, 9999999999)}', f'{rnd.randint(1, 400)} Main Road, {rnd.choice(CITIES)}')
+    _insert(db, 'INSERT INTO customers (id, name, email, phone, address) VALUES (?,?,?,?,?)', customer_rows())
+
+    # ---------- opening stock ----------
+    stock = [0] * (products + 1)
+
+    def opening_rows():
+        for pid in range(1, products + 1):
+            stock[pid] = reorder[pid] + rnd.randint(20, 500)
+            yield (pid, stock[pid], 'opening stock', opening)
+    movement_sql = 'INSERT INTO inventory_movements (product_id, change, reason, created_at) VALUES (?,?,?,?)'
+    _insert(db, movement_sql, opening_rows())
+
+    # ---------- invoices, their lines and the ledger ----------
+    say(f'{days} days x ~{invoices_per_day} invoices')
+    inv_id = item_id = 0
+    invoice_rows, item_rows, movement_rows, sequences = [], [], [], []
+    counts = {'invoices': 0, 'invoice_items': 0}
+
+    def flush():
+        nonlocal invoice_rows, item_rows, movement_rows
+        with db.transaction() as conn:
+            conn.executemany('INSERT INTO invoices (id, invoice_no, customer_id, date, subtotal, tax, total, supply) '
+                             'VALUES (?,?,?,?,?,?,?,?)', invoice_rows)
+            conn.executemany('INSERT INTO invoice_items (id, invoice_id, product_id, description, qty, unit_price, '
+                             'line_total, hsn, tax_rate_bp, cgst, sgst, igst) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)',
+                             item_rows)
+            conn.executemany(movement_sql, movement_rows)
+        counts['invoices'] += len(invoice_rows)
+        counts['invoice_items'] += len(item_rows)
+        invoice_rows, item_rows, movement_rows = [], [], []
+
+    def receive(pid, now):
+        receipt = reorder[pid] * 2 + rnd.randint(20, 200)
+        stock[pid] += receipt
+        movement_rows.append((pid, receipt, 'purchase receipt', now))
+
+    for d in range(days):
+        day = first_day + timedelta(days=d)
+        midnight = datetime.combine(day, datetime.min.time())
+        n = max(0, int(rnd.gauss(invoices_per_day, invoices_per_day ** 0.5)))
+        for seq, second in enumerate(sorted(rnd.randrange(8 * 3600, 21 * 3600) for _ in range(n)), 1):
+            when = midnight + timedelta(seconds=second)
+            now = when.isoformat()
+            inv_id += 1
+            invoice_no = INVOICE_NO_FORMAT.format(date=when, seq=seq)
+            customer_id = rnd.randint(1, customers) if customers and rnd.random() < 0.8 else None
+            # a few products sell far more than the rest
+            pids = {1 + int(products * rnd.random() ** 3) for _ in range(rnd.choice((1, 1, 2, 3, 4, 6)))}
+            lines = []
+            for pid in pids:
+                qty = rnd.choice((1, 1, 1, 2, 3, 5, 10))
+                lines.append((pid, qty, prices[pid] * qty))
+            subtotal = sum(line for _, _, line in lines)
+            kind = rnd.random()
+            if kind < 0.5:
+                # flat-rate invoice: one rate on the subtotal, no per-line tax
+                supply, tax = None, tax_paise(subtotal, 18)
+                cgst = sgst = igst = line_rates = [None] * len(lines)
+            else:
+                supply = 'intra' if kind < 0.85 else 'inter'
+                line_rates = [HSN_RATES[product_hsn[pid]] for pid, _, _ in lines]
+                cgst, sgst, igst = gst_lines([line for _, _, line in lines], line_rates, supply == 'inter')
+                tax = sum(cgst) + sum(sgst) + sum(igst)
+            invoice_rows.append((inv_id, invoice_no, customer_id, now, money(subtotal), money(tax),
+                                 money(subtotal + tax), supply))
+            for (pid, qty, line), bp, c, s, g in zip(lines, line_rates, cgst, sgst, igst):
+                item_id += 1
+                item_rows.append((item_id, inv_id, pid, f'GEN-{pid:07d}', qty, money(prices[pid]), money(line),
+                                  product_hsn[pid] if supply else None, bp, money(c), money(s), money(g)))
+                if stock[pid] < qty:
+                    receive(pid, now)   # never sell stock that is not there
+                movement_rows.append((pid, -qty, f'sale invoice {invoice_no}', now))
+                stock[pid] -= qty
+                # most products are restocked at their reorder level; the rest wait
+                if stock[pid] <= reorder[pid] and rnd.random() < 0.5:
+                    receive(pid, now)
+        if n:
+            sequences.append((day.isoformat(), n))
+        if len(item_rows) >= CHUNK:
+            flush()
+        if d % 90 == 89:
+            say(f'  {d + 1}/{days} days, {inv_id} invoices')
+    flush()
+    with db.transaction() as conn:
+        conn.executemany('INSERT OR REPLACE INTO invoice_sequences (day, last_no) VALUES (?,?)', sequences)
+    movement_count = db.conn.execute('SELECT COUNT(*) FROM inventory_movements').fetchone()[0]
+
+    # ---------- branch transfers up to the ledger target ----------
+    transfers = max(0, movements - movement_count) // 2
+    if transfers:
+        say(f'{transfers * 2} transfer movements')
+        span = days * 86400
+
+        def transfer_rows():
+            for _ in range(transfers):
+                pid = rnd.randint(1, products)
+                qty = rnd.randint(1, 5)
+                out = datetime.combine(first_day, datetime.min.time()) + timedelta(seconds=rnd.randrange(span))
+                # out to another branch and back again, so stock levels are unchanged
+                yield (pid, -qty, 'transfer out', out.isoformat())
+                yield (pid, qty, 'transfer in', (out + timedelta(hours=rnd.randint(1, 72))).isoformat())
+        movement_count += _insert(db, movement_sql, transfer_rows())
+
+    # ---------- derived tables ----------
+    say('rebuilding stock levels and daily rollups')
+    Inventory(db).rebuild_stock_levels()
+    SalesManager(db).rebuild_daily_sales()
+    stats = {
+        'seed': seed,
+        'products': products,
+        'customers': customers,
+        'days': days,
+        'first_day': first_day.isoformat(),
+        'last_day': end.isoformat(),
+        'invoices': counts['invoices'],
+        'invoice_items': counts['invoice_items'],
+        'inventory_movements': movement_count,
+        'money_storage': db.money_storage,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    # kept with the data, so benchmark results can say what they ran against
+    db.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('datagen', ?)", (json.dumps(stats),))
+    db.conn.execute('ANALYZE')
+    db.conn.commit()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a seeded synthetic NKEnterprises database')
+    parser.add_argument('db', help='Database file to create')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Preset sizes (default: small)')
+    parser.add_argument('--products', type=int)
+    parser.add_argument('--customers', type=int)
+    parser.add_argument('--days', type=int, help='Days of invoices, ending today')
+    parser.add_argument('--invoices-per-day', type=int)
+    parser.add_argument('--movements', type=int, help='Total inventory movements to reach with transfers')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end', help='Last invoice day (YYYY-MM-DD, default today)')
+    parser.add_argument('--money-storage', choices=('decimal', 'paise'), default='decimal')
+    parser.add_argument('--profile', help='Database profile to open with')
+    parser.add_argument('--force', action='store_true', help='Replace the file if it exists')
+    args = parser.parse_args()
+
+    options = dict(SCALES[args.scale])
+    for key in options:
+        if getattr(args, key) is not None:
+            options[key] = getattr(args, key)
+    if os.path.exists(args.db):
+        if not args.force:
+            raise SystemExit(f'{args.db} exists; use --force to replace it')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    db = Database(args.db, profile=args.profile)
+    if args.money_storage != db.money_storage:
+        db.set_money_storage(args.money_storage)
+    end = date.fromisoformat(args.end) if args.end else None
+    stats = generate(db, seed=args.seed, end=end, progress=print, **options)
+    db.close()
+    for key, value in stats.items():
+        print(f'{key:20s} {value}')
+
+if __name__ == '__main__':
+    main()
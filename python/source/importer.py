@@ -0,0 +1,258 @@
+# ----------------------------- importer.py -----------------------------
+import csv
+import time
+from datetime import datetime
+from decimal import InvalidOperation
+from database import Database, to_decimal
+from inventory import Inventory
+from tax import rate_bp
+
+BATCH_SIZE = 10000
+
+PRODUCT_COLUMNS = ['sku', 'name', 'price', 'cost', 'reorder_level', 'opening_stock', 'hsn', 'gst_rate']
+CUSTOMER_COLUMNS = ['id', 'name', 'email', 'phone', 'address']
+
+def _normalize(header):
+    return [str(h or '').strip().lower().replace(' ', '_') for h in header]
+
+def read_rows(path):
+    """Stream (line_no, dict) pairs from a CSV or XLSX file; the first row is the header"""
+    if path.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = _normalize(next(rows, []))
+            for line_no, values in enumerate(rows, start=2):
+                if values and any(v not in (None, '') for v in values):
+                    yield line_no, dict(zip(header, values))
+        finally:
+            wb.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            header = _normalize(next(reader, []))
+            for line_no, values in enumerate(reader, start=2):
+                if any(v.strip() for v in values):
+                    yield line_no, dict(zip(header, values))
+
+def _text(v):
+    return str(v).strip() if v is not None and str(v).strip() != '' else None
+
+def _int(v, field, default=None):
+    v = _text(v)
+    if v is None:
+        return default
+    try:
+        number = float(v)
+    except ValueError:
+        number = None
+    if number is None or not number.is_integer():
+        raise ValueError(f"{field} must be a whole number")
+    return int(number)
+
+def _money(v, field, required=False):
+    v = _text(v)
+    if v is None:
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    try:
+        amount = to_decimal(v)
+    except InvalidOperation as e:
+        raise ValueError(f"{field} is not a number") from e
+    if not amount.is_finite():
+        raise ValueError(f"{field} is not a number")
+    if amount < 0:
+        raise ValueError(f"{field} cannot be negative")
+    return amount
+
+def _validate_product(row):
+    sku = _text(row.get('sku'))
+    name = _text(row.get('name'))
+    if not sku:
+        raise ValueError("sku is required")
+    if not name:
+        raise ValueError("name is required")
+    price = _money(row.get('price'), 'price', required=True)
+    cost = _money(row.get('cost'), 'cost')
+    gst_rate = _money(row.get('gst_rate'), 'gst_rate')
+    return (sku, name, price, cost,
+            _int(row.get('reorder_level'), 'reorder_level'),
+            _int(row.get('opening_stock'), 'opening_stock'),
+            _text(row.get('hsn')), rate_bp(gst_rate) if gst_rate is not None else None)
+
+def _validate_customer(row):
+    name = _text(row.get('name'))
+    if not name:
+        raise ValueError("name is required")
+    return (_int(row.get('id'), 'id'), name, _text(row.get('email')), _text(row.get('phone')), _text(row.get('address')))
+
+def _write_products(db: Database, batch):
+    with db.transaction() as conn:
+        cur = conn.cursor()
+        # optional columns left out or blank keep the product's current value
+        cur.executemany('''
+            INSERT INTO products (sku, name, price, cost, reorder_level, hsn, gst_rate_bp)
+            VALUES (:sku, :name, :price, :cost, IFNULL(:reorder_level, 0), :hsn, :gst_rate_bp)
+            ON CONFLICT(sku) DO UPDATE SET name=excluded.name, price=excluded.price,
+                cost=COALESCE(:cost, products.cost),
+                reorder_level=COALESCE(:reorder_level, products.reorder_level),
+                hsn=COALESCE(:hsn, products.hsn),
+                gst_rate_bp=COALESCE(:gst_rate_bp, products.gst_rate_bp)
+        ''', [{'sku': r[0], 'name': r[1], 'price': db.money_in(r[2]), 'cost': db.money_in(r[3]),
+               'reorder_level': r[4], 'hsn': r[6], 'gst_rate_bp': r[7]} for r in batch])
+        # opening_stock sets the level: only the difference from today's stock is booked
+        wanted = {r[0]: r[5] for r in batch if r[5] is not None}
+        if wanted:
+            now = datetime.utcnow().isoformat()
+            movements = []
+            skus = list(wanted)
+            for i in range(0, len(skus), 500):
+                chunk = skus[i:i + 500]
+                for r in cur.execute(f'''
+                    SELECT p.id, p.sku, IFNULL(sl.qty,0) as qty
+                    FROM products p LEFT JOIN stock_levels sl ON sl.product_id=p.id
+                    WHERE p.sku IN ({','.join('?' * len(chunk))})
+                ''', chunk).fetchall():
+                    change = wanted[r['sku']] - r['qty']
+                    if change:
+                        movements.append((r['id'], change, 'opening stock (import)', now))
+            Inventory(db)._record_movements(cur, movements)
+
+def _customer_order(key):
+    # customers already on file (int ids) before ones inserted by this batch (('new', n))
+    return (1, key[1]) if isinstance(key, tuple) else (0, key)
+
+def _write_customers(db: Database, batch):
+    with db.transaction() as conn:
+        cur = conn.cursor()
+        # rows naming an id go first, so a customer inserted below cannot be handed
+        # an id that a later row of the same batch then overwrites
+        cur.executemany('''
+            INSERT INTO customers (id, name, email, phone, address) VALUES (?,?,?,?,?)
+            ON CONFLICT(id) DO UPDATE SET name=excluded.name,
+                email=COALESCE(excluded.email, customers.email),
+                phone=COALESCE(excluded.phone, customers.phone),
+                address=COALESCE(excluded.address, customers.address)
+        ''', [r for r in batch if r[0] is not None])
+
+        # No id: the customer with the same email, else the same phone, is updated,
+        # as if the rows were applied one by one. Every customer holding an email or
+        # phone from the batch is fetched up front, 500 values per query; a row that
+        # matches a customer inserted earlier in the batch is folded into that insert.
+        rows = [r for r in batch if r[0] is None]
+        contacts = {}   # customer -> {'email': ..., 'phone': ...} as the batch leaves it
+        for column, pos in (('email', 2), ('phone', 3)):
+            values = list({r[pos] for r in rows if r[pos] is not None})
+            for i in range(0, len(values), 500):
+                chunk = values[i:i + 500]
+                for r in cur.execute(f'''
+                    SELECT id, email, phone FROM customers WHERE {column} IN ({','.join('?' * len(chunk))})
+                ''', chunk).fetchall():
+                    contacts[r['id']] = {'email': r['email'], 'phone': r['phone']}
+        holders = {'email': {}, 'phone': {}}
+        for key, contact in contacts.items():
+            for column, value in contact.items():
+                if value is not None:
+                    holders[column].setdefault(value, set()).add(key)
+
+        inserts, updates = [], []
+        for _, name, email, phone, address in rows:
+            key = None
+            for column, value in (('email', email), ('phone', phone)):
+                if holders[column].get(value):
+                    key = min(holders[column][value], key=_customer_order)
+                    break
+            if key is None:
+                key = ('new', len(inserts))
+                contacts[key] = {'email': None, 'phone': None}
+                inserts.append([name, email, phone, address])
+            elif isinstance(key, tuple):
+                row = inserts[key[1]]
+                row[:] = [name] + [new if new is not None else old
+                                   for new, old in zip((email, phone, address), row[1:])]
+            else:
+                updates.append((name, email, phone, address, key))
+            for column, value in (('email', email), ('phone', phone)):
+                old = contacts[key][column]
+                if value is not None and value != old:
+                    if old is not None:
+                        holders[column][old].discard(key)
+                    holders[column].setdefault(value, set()).add(key)
+                    contacts[key][column] = value
+
+        cur.executemany('INSERT INTO customers (name, email, phone, address) VALUES (?,?,?,?)', inserts)
+        cur.executemany('''
+            UPDATE customers SET name=?, email=COALESCE(?, email),
+                phone=COALESCE(?, phone), address=COALESCE(?, address)
+            WHERE id=?
+        ''', updates)
+
+IMPORTS = {
+    'products': (PRODUCT_COLUMNS, _validate_product, _write_products),
+    'customers': (CUSTOMER_COLUMNS, _validate_customer, _write_customers),
+}
+
+def bulk_import(db: Database, kind, path, dry_run=False, rejects=None, batch_size=BATCH_SIZE, progress=None):
+    """Stream a CSV/XLSX file of products (with optional opening_stock) or customers
+    into the database, validating each row and upserting in batches of `batch_size`
+    rows per transaction. Products are matched on sku; customers on their id, or
+    without one on email, then phone. Optional columns that are missing or blank
+    leave the existing value alone.
+
+    With dry_run nothing is written. Rejected rows are written to the `rejects`
+    CSV (original columns plus line and error). Returns a summary dict.
+    """
+    columns, validate, write = IMPORTS[kind]
+    started = time.perf_counter()
+    read = imported = rejected = 0
+    sample = []
+    reject_file = reject_writer = None
+    if rejects:
+        reject_file = open(rejects, 'w', newline='', encoding='utf-8')
+        reject_writer = csv.writer(reject_file)
+        reject_writer.writerow(['line', 'error'] + columns)
+    try:
+        batch = []
+        for line_no, row in read_rows(path):
+            read += 1
+            try:
+                batch.append(validate(row))
+            except (ValueError, ArithmeticError) as e:
+                rejected += 1
+                if len(sample) < 100:
+                    sample.append((line_no, str(e)))
+                if reject_writer:
+                    reject_writer.writerow([line_no, str(e)] + [row.get(c, '') for c in columns])
+                continue
+            if len(batch) >= batch_size:
+                if not dry_run:
+                    write(db, batch)
+                imported += len(batch)
+                batch = []
+                if progress:
+                    progress(read, imported, rejected)
+        if batch:
+            if not dry_run:
+                write(db, batch)
+            imported += len(batch)
+    finally:
+        if reject_file:
+            reject_file.close()
+        # also after a failed batch: the ones before it are already committed
+        if not dry_run:
+            db.cache(kind).clear()
+            if kind == 'products':
+                db.cache('tax_rates').clear()
+    elapsed = time.perf_counter() - started
+    return {
+        'kind': kind,
+        'dry_run': dry_run,
+        'read': read,
+        'imported': imported,
+        'rejected': rejected,
+        'rejected_rows': sample,
+        'seconds': elapsed,
+        'rows_per_second': read / elapsed if elapsed else 0.0,
+    }
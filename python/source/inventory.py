@@ -1,30 +1,180 @@
 # ----------------------------- inventory.py -----------------------------
-from database import Database
+from datetime import datetime, timedelta
+from database import Database, REBUILD_STOCK_LEVELS_SQL
+
+class InsufficientStock(ValueError):
+    """A sale needs more units of a product than are in stock"""
+    def __init__(self, product_id, have, need):
+        super().__init__(f"Insufficient stock for product_id {product_id}: have {have}, need {need}")
+        self.product_id, self.have, self.need = product_id, have, need
 
 class Inventory:
     def __init__(self, db: Database):
         self.db = db
-    
+
+    # Write one ledger row and move the materialized stock level with it.
+    # Does not commit, so callers can group several movements in one transaction.
+    def _record_movement(self, cur, product_id, change, reason, created_at):
+        cur.execute('INSERT INTO inventory_movements (product_id, change, reason, created_at) VALUES (?,?,?,?)',
+                    (product_id, int(change), reason, created_at))
+        movement_id = cur.lastrowid
+        cur.execute('''
+            INSERT INTO stock_levels (product_id, qty) VALUES (?,?)
+            ON CONFLICT(product_id) DO UPDATE SET qty = qty + excluded.qty
+        ''', (product_id, int(change)))
+        return movement_id
+
+    # Batch form of _record_movement; rows are (product_id, change, reason, created_at).
+    # update_levels=False when the levels were already moved by _reserve.
+    def _record_movements(self, cur, rows, update_levels=True):
+        rows = [(pid, int(change), reason, created_at) for pid, change, reason, created_at in rows]
+        cur.executemany('INSERT INTO inventory_movements (product_id, change, reason, created_at) VALUES (?,?,?,?)', rows)
+        if not update_levels:
+            return
+        totals = {}
+        for pid, change, _, _ in rows:
+            totals[pid] = totals.get(pid, 0) + change
+        cur.executemany('''
+            INSERT INTO stock_levels (product_id, qty) VALUES (?,?)
+            ON CONFLICT(product_id) DO UPDATE SET qty = qty + excluded.qty
+        ''', totals.items())
+
+    # Take qty units off a product's stock level only if that many are there.
+    # A single conditional UPDATE, so two sellers can never both get the last
+    # units; returns False (and changes nothing) when stock is short.
+    # Does not commit or write the ledger row: see reserve_stock.
+    def _reserve(self, cur, product_id, qty):
+        if int(qty) <= 0:
+            # nothing taken (e.g. a return line): just move the level
+            cur.execute('''
+                INSERT INTO stock_levels (product_id, qty) VALUES (?,?)
+                ON CONFLICT(product_id) DO UPDATE SET qty = qty + excluded.qty
+            ''', (product_id, -int(qty)))
+            return True
+        cur.execute('UPDATE stock_levels SET qty = qty - ? WHERE product_id = ? AND qty >= ?',
+                    (int(qty), product_id, int(qty)))
+        return cur.rowcount == 1
+
+    # Atomic reserve-and-decrement with its ledger row, in one write transaction
+    def reserve_stock(self, product_id, qty, reason='reservation'):
+        with self.db.transaction() as conn:
+            cur = conn.cursor()
+            if not self._reserve(cur, product_id, qty):
+                return False
+            self._record_movements(cur, [(product_id, -int(qty), reason, datetime.utcnow().isoformat())],
+                                   update_levels=False)
+        return True
+
     # Inventory movements (stock adjust)
     def adjust_stock(self, product_id, change, reason='adjustment'):
-        from datetime import datetime
         now = datetime.utcnow().isoformat()
         cur = self.db.conn.cursor()
-        cur.execute('INSERT INTO inventory_movements (product_id, change, reason, created_at) VALUES (?,?,?,?)',
-                    (product_id, int(change), reason, now))
+        movement_id = self._record_movement(cur, product_id, change, reason, now)
         self.db.conn.commit()
-        return cur.lastrowid
-    
+        return movement_id
+
     # Fetch available stoocks
     def get_stock(self, product_id):
-        cur = self.db.conn.execute('SELECT IFNULL(SUM(change),0) as stock FROM inventory_movements WHERE product_id=?', (product_id,))
+        cur = self.db.conn.execute('SELECT qty FROM stock_levels WHERE product_id=?', (product_id,))
         r = cur.fetchone()
-        return int(r['stock']) if r else 0
-    
+        return int(r['qty']) if r else 0
+
     # List of low stocks
     def low_stock_report(self):
         cur = self.db.conn.execute('''
-            SELECT p.*, IFNULL((SELECT SUM(change) FROM inventory_movements im WHERE im.product_id=p.id),0) as stock
-            FROM products p WHERE IFNULL((SELECT SUM(change) FROM inventory_movements im WHERE im.product_id=p.id),0) <= p.reorder_level
+            SELECT p.*, IFNULL(sl.qty,0) as stock
+            FROM products p LEFT JOIN stock_levels sl ON sl.product_id=p.id
+            WHERE IFNULL(sl.qty,0) <= p.reorder_level
+        ''')
+        return [self.db.money_row(r, 'price', 'cost') for r in cur]
+
+    def reorder_suggestions(self, days=30, lead_time_days=7, cover_days=30, only_needed=True):
+        """Reorder suggestions from recent demand; see iter_reorder_suggestions"""
+        return list(self.iter_reorder_suggestions(days, lead_time_days, cover_days, only_needed))
+
+    def iter_reorder_suggestions(self, days=30, lead_time_days=7, cover_days=30, only_needed=True,
+                                 batch_size=1000):
+        """Per product: units sold (all outgoing movements) in the last `days`
+        days, daily velocity, days of cover at that rate, the reorder point
+        (reorder_level as safety stock plus demand over the lead time) and a
+        suggested order quantity that covers the lead time plus `cover_days`.
+
+        One grouped pass over the recent ledger joined to stock_levels; with
+        only_needed, just the products at or below their reorder point that
+        have something to order, the ones running out soonest first.
+        Quantities are rounded up.
+        """
+        days, lead, horizon = int(days), int(lead_time_days), int(lead_time_days) + int(cover_days)
+        if days <= 0:
+            raise ValueError('days must be positive')
+        params = {
+            'since': (datetime.utcnow() - timedelta(days=days)).isoformat(),
+            'days': days,
+            'lead': lead,
+            'horizon': horizon,
+        }
+        sql = '''
+            WITH demand AS (
+                -- "+product_id" keeps the planner from walking the whole ledger in
+                -- product order; the window comes off idx_inventory_movements_out
+                SELECT product_id, -SUM(change) as sold
+                FROM inventory_movements
+                WHERE change < 0 AND created_at >= :since
+                GROUP BY +product_id
+            ), levels AS (
+                SELECT p.id, p.sku, p.name, p.cost, p.reorder_level,
+                       IFNULL(sl.qty, 0) as stock, IFNULL(d.sold, 0) as sold
+                FROM products p
+                LEFT JOIN stock_levels sl ON sl.product_id = p.id
+                LEFT JOIN demand d ON d.product_id = p.id
+            )
+            SELECT *,
+                   CASE WHEN sold > 0 THEN stock * 1.0 * :days / sold END as days_of_cover,
+                   IFNULL(reorder_level, 0) + (sold * :lead + :days - 1) / :days as reorder_point,
+                   MAX(0, IFNULL(reorder_level, 0) + (sold * :horizon + :days - 1) / :days - stock) as suggested_qty
+            FROM levels
+        '''
+        if only_needed:
+            # at or below the reorder point, with something to order (suggested_qty > 0)
+            sql += (' WHERE stock <= IFNULL(reorder_level, 0) + (sold * :lead + :days - 1) / :days'
+                    ' AND stock < IFNULL(reorder_level, 0) + (sold * :horizon + :days - 1) / :days')
+        sql += ' ORDER BY days_of_cover IS NULL, days_of_cover, sku'
+        cur = self.db.conn.execute(sql, params)
+        money_out = self.db.money_out
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for r in rows:
+                yield {
+                    'id': r['id'],
+                    'sku': r['sku'],
+                    'name': r['name'],
+                    'stock': r['stock'],
+                    'reorder_level': r['reorder_level'],
+                    'sold': r['sold'],
+                    'per_day': round(r['sold'] / days, 2),
+                    'days_of_cover': round(r['days_of_cover'], 1) if r['days_of_cover'] is not None else None,
+                    'reorder_point': r['reorder_point'],
+                    'suggested_qty': r['suggested_qty'],
+                    'cost': money_out(r['cost']),
+                }
+
+    # Re-derive stock_levels from the inventory_movements ledger
+    def rebuild_stock_levels(self):
+        conn = self.db.conn
+        conn.execute('DELETE FROM stock_levels')
+        conn.execute(REBUILD_STOCK_LEVELS_SQL)
+        conn.commit()
+        return conn.execute('SELECT COUNT(*) as c FROM stock_levels').fetchone()['c']
+
+    # Compare stock_levels with the ledger; returns (product_id, stored, ledger) for every drift
+    def verify_stock_levels(self):
+        cur = self.db.conn.execute('''
+            SELECT product_id, SUM(stored) as stored, SUM(ledger) as ledger FROM (
+                SELECT product_id, qty as stored, 0 as ledger FROM stock_levels
+                UNION ALL
+                SELECT product_id, 0, SUM(change) FROM inventory_movements GROUP BY product_id
+            ) GROUP BY product_id HAVING SUM(stored) != SUM(ledger)
         ''')
-        return cur.fetchall()
\ No newline at end of file
+        return [(r['product_id'], r['stored'], r['ledger']) for r in cur.fetchall()]
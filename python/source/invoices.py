@@ -1,93 +1,180 @@
 # ----------------------------- invoices.py -----------------------------
 import os
+import sys
+import gzip
 from datetime import datetime
-from decimal import Decimal, ROUND_HALF_UP
-from database import Database, to_decimal
-from inventory import Inventory
+from decimal import Decimal
+from database import Database, to_decimal, keyset_page, date_range
+from pricing import price_lines, gst_lines
+from tax import TaxManager, SUPPLY_TYPES, rate_bp
+from inventory import Inventory, InsufficientStock
 from sales import SalesManager
 from customer import Customer
 
 # -------------- For CSV files ---------------------
-import csv, openpyxl
-
-# -------------- For pdf files ---------------------
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, Paragraph,
-    Spacer, Image
-)
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.fonts import addMapping
-
+import csv
+
+# PDF export lives in pdf_export.py and is imported on first use, so the
+# CLI does not pay for loading reportlab unless a PDF is requested.
+
+# Invoice number layout; {date} is the invoice datetime, {seq} the per-day counter
+INVOICE_NO_FORMAT = os.environ.get('NKE_INVOICE_NO_FORMAT', 'INV-{date:%Y%m%d}-{seq}')
+
+def check_number_format(fmt):
+    """Raise ValueError unless `fmt` gives every invoice its own number.
+
+    {seq} restarts every day, so the format needs {seq} and a {date} that
+    names the whole day (year, month and day).
+    """
+    days = [datetime(2000, 1, 1), datetime(2000, 1, 2), datetime(2000, 2, 1), datetime(2001, 1, 1)]
+    try:
+        numbers = [fmt.format(date=day, seq=1) for day in days] + [fmt.format(date=days[0], seq=2)]
+    except KeyError as e:
+        raise ValueError(f"Invoice number format {fmt!r} has an unknown field {e}; use {{date}} and {{seq}}") from e
+    except (IndexError, ValueError, AttributeError) as e:
+        raise ValueError(f"Invoice number format {fmt!r} is not valid: {e}") from e
+    if len(set(numbers)) < len(numbers):
+        raise ValueError(f"Invoice number format {fmt!r} must contain {{seq}} and the full {{date}}, "
+                         f"e.g. 'INV-{{date:%Y%m%d}}-{{seq}}'")
+    return fmt
 
 class InvoiceManager:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, number_format=None):
         self.db = db
         self.inventory = Inventory(db)
-    
-    def _generate_invoice_no(self):
-        """Generate invoice number like INV-YYYYMMDD-<count>"""
-        datepart = datetime.utcnow().strftime('%Y%m%d')
-        cur = self.db.conn.execute(
-            "SELECT COUNT(*) as c FROM invoices WHERE date LIKE ?",
-            (f"{datetime.utcnow().date()}%",)
-        )
-        count = cur.fetchone()['c']
-        return f"INV-{datepart}-{count+1}"
-        
-    def create_invoice(self, items, customer_id=None, tax_rate=0, notes=None):
-        """Creates a new invoice and deducts stock."""
-        cur = self.db.conn.cursor()
-        subtotal = Decimal('0.00')
-        computed_items = []
-
-        for it in items:
-            qty = int(it['qty'])
-            unit = to_decimal(it['unit_price'])
-            line = (unit * Decimal(qty)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            subtotal += line
-            computed_items.append({
-                'product_id': it.get('product_id'),
-                'description': it.get('description') or '',
-                'qty': qty,
-                'unit_price': str(unit),
-                'line_total': str(line)
-            })
-
-        tax = (subtotal * to_decimal(tax_rate) / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total = (subtotal + tax).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        invoice_no = self._generate_invoice_no()
-        now = datetime.utcnow().isoformat()
-
-        # Stock checks
-        for it in computed_items:
-            pid = it['product_id']
-            if pid:
-                stock = self.inventory.get_stock(pid)
-                if it['qty'] > stock:
-                    raise ValueError(f"Insufficient stock for product_id {pid}: have {stock}, need {it['qty']}")
-
-        # Insert invoice
+        self.sales = SalesManager(db)
+        self.tax = TaxManager(db)
+        self.number_format = check_number_format(number_format or INVOICE_NO_FORMAT)
+
+    def _generate_invoice_no(self, cur, when):
+        """Allocate the next invoice number for the day of `when`.
+
+        Runs inside the invoice transaction, so the per-day counter is bumped
+        under the write lock and concurrent writers never share a number.
+        """
+        day = when.date().isoformat()
         cur.execute(
-            'INSERT INTO invoices (invoice_no, customer_id, date, subtotal, tax, total, notes) VALUES (?,?,?,?,?,?,?)',
-            (invoice_no, customer_id, now, str(subtotal), str(tax), str(total), notes)
+            'INSERT INTO invoice_sequences (day, last_no) VALUES (?,1) '
+            'ON CONFLICT(day) DO UPDATE SET last_no = last_no + 1',
+            (day,)
         )
-        inv_id = cur.lastrowid
+        seq = cur.execute('SELECT last_no FROM invoice_sequences WHERE day=?', (day,)).fetchone()[0]
+        return self.number_format.format(date=when, seq=seq)
+
+    def _price_lines(self, items, tax_rate, supply=None, rates=None):
+        """Compute line totals, subtotal, tax and total for one invoice, in integer paise.
 
-        # Insert items and update stock
-        for it in computed_items:
-            cur.execute(
-                'INSERT INTO invoice_items (invoice_id, product_id, description, qty, unit_price, line_total) VALUES (?,?,?,?,?,?)',
-                (inv_id, it['product_id'], it['description'], it['qty'], it['unit_price'], it['line_total'])
+        Without a place of supply the single `tax_rate` applies to the subtotal.
+        With supply 'intra' or 'inter' each line is taxed at its own GST rate: the
+        item's 'tax_rate' if given, else the rate of the item's own 'hsn' code,
+        else its product's rate (both from `rates`, see TaxManager.rates_for),
+        else `tax_rate`.
+        """
+        qtys = [int(it['qty']) for it in items]
+        units, lines, subtotal, tax, total = price_lines(qtys, [it['unit_price'] for it in items], tax_rate)
+        hsns = [it.get('hsn') for it in items]
+        line_rates = [None] * len(items)
+        cgst = sgst = igst = [None] * len(items)   # flat rate: no per-line tax
+        if supply is not None:
+            if supply not in SUPPLY_TYPES:
+                raise ValueError(f"Unknown place of supply {supply!r}; use 'intra' or 'inter'")
+            rates = rates or {}
+            default_bp = rate_bp(tax_rate)
+            for i, it in enumerate(items):
+                hsn, bp = rates.get(it.get('product_id'), (None, None))
+                if it.get('tax_rate') is not None:
+                    bp = rate_bp(it['tax_rate'])
+                elif it.get('hsn') and ('hsn', it['hsn']) in rates:
+                    bp = rates[('hsn', it['hsn'])][1]
+                line_rates[i] = default_bp if bp is None else bp
+                hsns[i] = hsns[i] or hsn
+            cgst, sgst, igst = gst_lines(lines, line_rates, supply == 'inter')
+            tax = sum(cgst) + sum(sgst) + sum(igst)
+            total = subtotal + tax
+        computed_items = [{
+            'product_id': it.get('product_id'),
+            'description': it.get('description') or '',
+            'qty': qty,
+            'unit_price': unit,
+            'line_total': line,
+            'hsn': hsn,
+            'tax_rate_bp': bp,
+            'cgst': c,
+            'sgst': s,
+            'igst': g,
+        } for it, qty, unit, line, hsn, bp, c, s, g in zip(items, qtys, units, lines, hsns, line_rates, cgst, sgst, igst)]
+        return computed_items, subtotal, tax, total
+
+    def create_invoice(self, items, customer_id=None, tax_rate=0, notes=None, supply=None):
+        """Creates a new invoice and deducts stock.
+        `supply` ('intra'/'inter') switches to per-line GST; see _price_lines."""
+        return self.create_invoices([{
+            'items': items, 'customer_id': customer_id, 'tax_rate': tax_rate, 'notes': notes, 'supply': supply
+        }])[0]
+
+    def create_invoices(self, invoices):
+        """Create many invoices in one transaction; returns their ids.
+
+        Each entry is a dict with 'items' and optional 'customer_id', 'tax_rate',
+        'supply' and 'notes'. Either every invoice is posted or none is.
+        """
+        # GST rates for every product and HSN code in the batch, resolved in one lookup
+        lines = [it for inv in invoices if inv.get('supply') for it in inv['items']]
+        rates = self.tax.rates_for([it.get('product_id') for it in lines],
+                                   [it.get('hsn') for it in lines if it.get('tax_rate') is None])
+        priced = []
+        needed = {}
+        for inv in invoices:
+            computed_items, subtotal, tax, total = self._price_lines(
+                inv['items'], inv.get('tax_rate', 0), inv.get('supply'), rates)
+            priced.append((inv, computed_items, subtotal, tax, total))
+            for it in computed_items:
+                if it['product_id']:
+                    needed[it['product_id']] = needed.get(it['product_id'], 0) + it['qty']
+
+        inv_ids = []
+        money = self.db.money_in_paise
+        with self.db.transaction() as conn:
+            cur = conn.cursor()
+
+            # Reserve the whole batch's demand per product with conditional
+            # decrements; any shortfall rolls the lot back
+            for pid in sorted(needed):
+                if not self.inventory._reserve(cur, pid, needed[pid]):
+                    stock = self.inventory.get_stock(pid)
+                    raise InsufficientStock(pid, stock, needed[pid])
+
+            item_rows = []
+            movement_rows = []
+            sales_rows = []
+            for inv, computed_items, subtotal, tax, total in priced:
+                when = datetime.utcnow()
+                now = when.isoformat()
+                invoice_no = self._generate_invoice_no(cur, when)
+                cur.execute(
+                    'INSERT INTO invoices (invoice_no, customer_id, date, subtotal, tax, total, notes, supply) VALUES (?,?,?,?,?,?,?,?)',
+                    (invoice_no, inv.get('customer_id'), now, money(subtotal), money(tax), money(total), inv.get('notes'),
+                     inv.get('supply'))
+                )
+                inv_id = cur.lastrowid
+                inv_ids.append(inv_id)
+                sales_rows.append((now, inv.get('customer_id'), subtotal, tax, total))
+                for it in computed_items:
+                    item_rows.append((inv_id, it['product_id'], it['description'], it['qty'],
+                                      money(it['unit_price']), money(it['line_total']), it['hsn'], it['tax_rate_bp'],
+                                      money(it['cgst']), money(it['sgst']), money(it['igst'])))
+                    if it['product_id']:
+                        movement_rows.append((it['product_id'], -it['qty'], f"sale invoice {invoice_no}", now))
+
+            cur.executemany(
+                'INSERT INTO invoice_items (invoice_id, product_id, description, qty, unit_price, line_total, '
+                'hsn, tax_rate_bp, cgst, sgst, igst) VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+                item_rows
             )
-            if it['product_id']:
-                self.inventory.adjust_stock(it['product_id'], -it['qty'], reason=f"sale invoice {invoice_no}")
+            self.inventory._record_movements(cur, movement_rows, update_levels=False)
+            self.sales._record_sales(cur, sales_rows)
 
-        self.db.conn.commit()
-        return inv_id
+        return inv_ids
 
     def get_invoice(self, invoice_id):
         """Fetch invoice and its items"""
@@ -96,17 +183,48 @@ class InvoiceManager:
         if not inv:
             return None
         items = self.db.conn.execute('SELECT * FROM invoice_items WHERE invoice_id=?', (invoice_id,)).fetchall()
-        return inv, items
+        return (self.db.money_row(inv, 'subtotal', 'tax', 'total'),
+                [self.db.money_row(it, 'unit_price', 'line_total', 'cgst', 'sgst', 'igst') for it in items])
 
     def list_invoices(self, start_date=None, end_date=None):
-        """List invoices by optional date range"""
+        """List invoices by optional date range (inclusive; see database.date_range)"""
+        return list(self.iter_invoices(start_date, end_date))
+
+    def iter_invoices(self, start_date=None, end_date=None, batch_size=1000):
+        """Yield invoices by optional date range, fetching `batch_size` rows at a time"""
         sql = 'SELECT * FROM invoices'
-        params = []
-        if start_date and end_date:
-            sql += ' WHERE date BETWEEN ? AND ?'
-            params = [start_date, end_date]
+        where, params = date_range('date', start_date, end_date)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
         cur = self.db.conn.execute(sql, params)
-        return cur.fetchall()
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for r in rows:
+                yield self.db.money_row(r, 'subtotal', 'tax', 'total')
+
+    # Sort orders for page_invoices: name -> (SQL expression, row column)
+    SORTS = {
+        'id': ('id', 'id'),
+        'date': ('date', 'date'),
+        'total': ('total', 'total'),
+    }
+
+    def page_invoices(self, cursor=None, limit=50, sort='date', descending=True, start_date=None, end_date=None,
+                      customer_id=None):
+        """One page of invoices, newest first by default; `sort` is one of SORTS.
+        Date bounds mean the same as in iter_invoices. Returns (rows, next_cursor);
+        next_cursor is None on the last page."""
+        if sort not in self.SORTS:
+            raise ValueError(f"Unknown sort {sort!r}; use one of {', '.join(self.SORTS)}")
+        where, params = date_range('date', start_date, end_date)
+        if customer_id is not None:
+            where.append('customer_id = ?')
+            params.append(customer_id)
+        rows, cursor = keyset_page(self.db.conn, 'SELECT * FROM invoices', where, params,
+                                   (self.SORTS[sort], self.SORTS['id']), descending, cursor, limit)
+        return [self.db.money_row(r, 'subtotal', 'tax', 'total') for r in rows], cursor
 
     # CSV Export
     def export_single_invoice_csv(self, invoice_id, filename=None):
@@ -167,12 +285,7 @@ class InvoiceManager:
 
     def export_single_invoice_pdf(self, invoice_id, filename=None):
         """Export a single invoice (with customer details & items) to PDF"""
-
-        # ---------- FONT ----------
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        font_path = os.path.abspath(os.path.join(base_dir, "..", "Fonts", "dejavu-fonts-ttf-2.37", "ttf", "DejaVuSans.ttf"))
-        pdfmetrics.registerFont(TTFont("DejaVuSans", font_path))
-        addMapping("DejaVuSans", 0, 0, "DejaVuSans")
+        from pdf_export import render_invoice_pdf
 
         # ---------- FETCH DATA ----------
         inv, items = self.get_invoice(invoice_id)
@@ -190,98 +303,29 @@ class InvoiceManager:
         elif not filename.lower().endswith(".pdf"):
             filename += ".pdf"
 
-        # ---------- SETUP PDF ----------
-        doc = SimpleDocTemplate(filename, pagesize=A4)
-        styles = getSampleStyleSheet()
-        for s in styles.byName.values():
-            s.fontName = "DejaVuSans"
-        elements = []
-
-        # ---------- COMPANY LOGO ----------
-        logo_path = os.path.join(base_dir, "..", "Assets", "logo.png")
-        if os.path.exists(logo_path):
-            img = Image(logo_path, width=100, height=100)
-            elements.append(img)
-        else:
-            elements.append(Paragraph("<b>N K Enterprises</b>", styles["Title"]))
-        elements.append(Spacer(1, 12))
+        return render_invoice_pdf(inv, items, cust, filename)
 
-        # ---------- HEADER ----------
-        elements.append(Paragraph("<b>Tax Invoice</b>", styles["Title"]))
-        elements.append(Spacer(1, 10))
+    def export_sales_report_csv(self, filename="sales_report.csv", start_date=None, end_date=None):
+        """Export sales report (summary + all invoices) to CSV.
 
-        # ---------- CUSTOMER DETAILS ----------
-        elements.append(Paragraph("<b>Customer Details:</b>", styles["Heading3"]))
-        if cust:
-            cust_text = f"""
-            <b>Name:</b> {cust.get('name', '')}<br/>
-            <b>Email:</b> {cust.get('email', '')}<br/>
-            <b>Phone:</b> {cust.get('phone', '')}<br/>
-            <b>Address:</b> {cust.get('address', '')}
-            """
-        else:
-            cust_text = "N/A"
-        elements.append(Paragraph(cust_text, styles["Normal"]))
-        elements.append(Spacer(1, 12))
-
-        # ---------- INVOICE SUMMARY ----------
-        inv_info = f"""
-        <b>Invoice No:</b> {inv['invoice_no']}<br/>
-        <b>Date:</b> {inv['date']}<br/>
-        <b>Subtotal:</b> ₹{inv['subtotal']}<br/>
-        <b>Tax:</b> ₹{inv['tax']}<br/>
-        <b>Total:</b> ₹{inv['total']}
+        Rows are streamed and the count/total are accumulated in the same pass,
+        so memory stays flat however many invoices match. A filename ending in
+        .gz is gzip-compressed; "-" writes to stdout.
         """
-        elements.append(Paragraph("<b>Invoice Summary:</b>", styles["Heading3"]))
-        elements.append(Paragraph(inv_info, styles["Normal"]))
-        elements.append(Spacer(1, 12))
-
-        # ---------- LINE ITEMS TABLE ----------
-        data = [["Description", "Qty", "Unit Price", "Line Total"]]
-        for it in items:
-            data.append([
-                it["description"],
-                str(it["qty"]),
-                str(it["unit_price"]),
-                str(it["line_total"]),
-            ])
-        table = Table(data, colWidths=[200, 60, 80, 80])
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-            ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.black),
-            ("FONTNAME", (0, 0), (-1, 0), "DejaVuSans"),
-            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-        ]))
-        elements.append(Paragraph("<b>Invoice Items:</b>", styles["Heading3"]))
-        elements.append(table)
-        elements.append(Spacer(1, 25))
-
-        # ---------- SIGNATURE SECTION ----------
-        elements.append(Spacer(1, 30))
-        elements.append(Paragraph("<b>For N K Enterprises</b>", styles["Normal"]))
-        elements.append(Spacer(1, 30))
-        elements.append(Paragraph("__________________________", styles["Normal"]))
-        elements.append(Paragraph("<b>Authorized Signature</b>", styles["Normal"]))
-        elements.append(Spacer(1, 10))
-        elements.append(Paragraph("<b>Thank you for your business!</b>", styles["Normal"]))
-
-        # ---------- BUILD PDF ----------
-        doc.build(elements)
-        return filename
-
-    def export_sales_report_csv(self, filename="sales_report.csv", start_date=None, end_date=None):
-        """Export sales report (summary + all invoices) to CSV"""
-        sales = SalesManager(self.db)
-        rows = self.list_invoices(start_date, end_date)
-        summary = sales.sales_summary(start_date, end_date)
+        if filename == "-":
+            f = sys.stdout
+        elif filename.lower().endswith(".gz"):
+            f = gzip.open(filename, "wt", newline="", encoding="utf-8")
+        else:
+            f = open(filename, "w", newline="", encoding="utf-8")
 
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
+        count = 0
+        total_sales = Decimal('0.00')
+        try:
             writer = csv.writer(f)
             writer.writerow(["Invoice No", "Date", "Customer ID", "Subtotal", "Tax", "Total"])
 
-            for r in rows:
+            for r in self.iter_invoices(start_date, end_date):
                 writer.writerow([
                     r['invoice_no'],
                     r['date'],
@@ -290,9 +334,14 @@ class InvoiceManager:
                     r['tax'],
                     r['total']
                 ])
+                count += 1
+                total_sales += to_decimal(r['total'])
 
             writer.writerow([])
-            writer.writerow(["", "", "Total Invoices", summary['count']])
-            writer.writerow(["", "", "Total Sales", summary['total_sales']])
+            writer.writerow(["", "", "Total Invoices", count])
+            writer.writerow(["", "", "Total Sales", total_sales])
+        finally:
+            if f is not sys.stdout:
+                f.close()
 
         return filename
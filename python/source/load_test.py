@@ -0,0 +1,164 @@
+# ----------------------------- load_test.py -----------------------------
+"""
+Load test for api_server.py.
+
+Keep-alive clients send a mix of product lookups, stock lookups and invoice
+creations for a fixed time, then report throughput and p50/p95/p99 latency
+per endpoint as JSON. Point it at a running server, or let it start one on a
+scratch database with --spawn.
+
+    python load_test.py [--url http://127.0.0.1:8765] [--clients 32] [--seconds 10] [--mix 60,30,10] [--spawn]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import shutil
+import tempfile
+import subprocess
+from urllib.parse import urlsplit
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Client:
+    """One keep-alive HTTP/1.1 connection"""
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        raw = json.dumps(body).encode() if body is not None else b''
+        self.writer.write(f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                          f'Content-Type: application/json\r\nContent-Length: {len(raw)}\r\n\r\n'.encode() + raw)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        payload = await self.reader.readexactly(length)
+        return status, payload
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+async def seed(client, products, stock):
+    ids = []
+    for i in range(products):
+        status, payload = await client.request('POST', '/products', {
+            'sku': f'LT-{os.getpid()}-{i}', 'name': f'Load test item {i}', 'price': f'{random.randint(100, 99999) / 100:.2f}'})
+        if status != 201:
+            raise SystemExit(f'seeding failed: {status} {payload!r}')
+        pid = json.loads(payload)['id']
+        await client.request('POST', f'/stock/{pid}/adjust', {'change': stock, 'reason': 'load test'})
+        ids.append(pid)
+    return ids
+
+async def worker(client, ids, mix, deadline, samples, statuses):
+    weights = list(mix.values())
+    kinds = list(mix)
+    while time.perf_counter() < deadline:
+        kind = random.choices(kinds, weights)[0]
+        pid = random.choice(ids)
+        if kind == 'product':
+            method, path, body = 'GET', f'/products/{pid}', None
+        elif kind == 'stock':
+            method, path, body = 'GET', f'/stock/{pid}', None
+        else:
+            method, path, body = 'POST', '/invoices', {'items': [
+                {'product_id': p, 'description': 'load test', 'qty': random.randint(1, 3), 'unit_price': '9.99'}
+                for p in random.sample(ids, min(3, len(ids)))], 'tax_rate': '18'}
+        started = time.perf_counter()
+        status, _ = await client.request(method, path, body)
+        samples[kind].append(time.perf_counter() - started)
+        statuses[kind][status] = statuses[kind].get(status, 0) + 1
+
+async def run(url, clients, seconds, mix, products, stock):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    setup = Client(host, port)
+    ids = await seed(setup, products, stock)
+    setup.close()
+
+    samples = {kind: [] for kind in mix}
+    statuses = {kind: {} for kind in mix}
+    conns = [Client(host, port) for _ in range(clients)]
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(c, ids, mix, started + seconds, samples, statuses) for c in conns))
+    elapsed = time.perf_counter() - started
+    for c in conns:
+        c.close()
+
+    report = {'clients': clients, 'seconds': round(elapsed, 2),
+              'requests': sum(len(s) for s in samples.values()), 'endpoints': {}}
+    report['throughput_rps'] = round(report['requests'] / elapsed, 1)
+    for kind, values in samples.items():
+        values.sort()
+        report['endpoints'][kind] = {
+            'requests': len(values),
+            'rps': round(len(values) / elapsed, 1),
+            'statuses': statuses[kind],
+            **{f'p{p}_ms': round(percentile(values, p) * 1000, 2) if values else None for p in (50, 95, 99)},
+        }
+    return report
+
+def spawn_server(port, readers, tmp):
+    proc = subprocess.Popen([sys.executable, os.path.join(SOURCE_DIR, 'api_server.py'), '--port', str(port),
+                             '--readers', str(readers), '--profile', 'server', '--db', os.path.join(tmp, 'load.db')],
+                            stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith('Listening'):
+        proc.kill()
+        raise SystemExit('server did not start')
+    return proc
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the HTTP/JSON API server')
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--clients', type=int, default=32, help='Concurrent keep-alive connections')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--mix', default='60,30,10', help='Percent of product GETs, stock GETs and invoice POSTs')
+    parser.add_argument('--products', type=int, default=200, help='Products to create before the run')
+    parser.add_argument('--stock', type=int, default=1000000, help='Opening stock per product')
+    parser.add_argument('--spawn', action='store_true', help='Start a server on a scratch database for the run')
+    parser.add_argument('--readers', type=int, default=4, help='Reader pool size for --spawn')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    args = parser.parse_args()
+
+    mix = dict(zip(('product', 'stock', 'invoice'), (int(x) for x in args.mix.split(','))))
+    mix = {k: v for k, v in mix.items() if v > 0}
+    tmp = tempfile.mkdtemp(prefix='nke-load-') if args.spawn else None
+    proc = None
+    try:
+        if args.spawn:
+            proc = spawn_server(urlsplit(args.url).port or 8765, args.readers, tmp)
+        report = asyncio.run(run(args.url, args.clients, args.seconds, mix, args.products, args.stock))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,233 @@
 # ----------------------------- main_backend.py -----------------------------
+import os
+import sys
 import argparse
 from menu import interactive
-from database import Database
+from database import Database, DB_FILENAME, schema_version
+from product import Product
+from customer import Customer
+from inventory import Inventory
+from invoices import InvoiceManager
+from backup import incremental_backup, restore_chain
 
 def main():
     parser = argparse.ArgumentParser(description='NKEnterprises accounting CLI')
     parser.add_argument('--init-sample', action='store_true', help='Create sample data and exit')
-    parser.add_argument('--backup', help='Backup database to path')
+    parser.add_argument('--backup', help='Backup database to path (a directory with --backup-incremental)')
+    parser.add_argument('--backup-compress', action='store_true', help='Gzip the backup output')
+    parser.add_argument('--backup-incremental', action='store_true', help='Write only pages changed since the last backup in the chain')
+    parser.add_argument('--backup-pages', type=int, default=1024, help='Pages copied per backup step')
+    parser.add_argument('--backup-throttle', type=float, default=0.0, help='Seconds to sleep between backup steps')
+    parser.add_argument('--restore-chain', nargs=2, metavar=('CHAIN_DIR', 'OUT_DB'), help='Rebuild a database from an incremental backup chain')
+    parser.add_argument('--rebuild-stock', action='store_true', help='Re-derive stock levels from the inventory ledger')
+    parser.add_argument('--verify-stock', action='store_true', help='Check stock levels against the inventory ledger')
+    parser.add_argument('--migrate', action='store_true', help='Apply pending schema migrations and report them')
+    parser.add_argument('--export-pdfs', metavar='OUT', help='Bulk export invoice PDFs to a directory or a .zip file')
+    parser.add_argument('--start-date', help='First invoice date (YYYY-MM-DD) for exports and reports')
+    parser.add_argument('--end-date', help='Last invoice date (YYYY-MM-DD, included) for exports and reports')
+    parser.add_argument('--customer', type=int, help='Only invoices for this customer id')
+    parser.add_argument('--ids', help='Comma-separated invoice ids')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--sales-report', metavar='OUT', help='Export the sales report CSV (.gz to compress, - for stdout)')
+    parser.add_argument('--export-xlsx', nargs=2, metavar=('KIND', 'OUT'), help='Export sales, items or stock to an .xlsx file')
+    parser.add_argument('--import', dest='import_', nargs=2, metavar=('KIND', 'PATH'), help='Bulk import products or customers from CSV/XLSX')
+    parser.add_argument('--dry-run', action='store_true', help='Validate an import or preview a reprice without writing anything')
+    parser.add_argument('--rejects', help='Write rejected import rows to this CSV')
+    parser.add_argument('--reprice', action='store_true', help='Bulk reprice products (see --percent/--amount/--sku-pattern/--price-file)')
+    parser.add_argument('--percent', help='Percentage price change for --reprice, e.g. 5 or -2.5')
+    parser.add_argument('--amount', help='Absolute price change for --reprice, e.g. 10 or -1.50')
+    parser.add_argument('--sku-pattern', default='*', help='SKU GLOB pattern for --reprice, e.g. "SKU-1*"')
+    parser.add_argument('--price-file', help='CSV of sku,price for --reprice')
+    parser.add_argument('--diff', help='Write the --reprice before/after diff to this CSV')
+    parser.add_argument('--rebuild-rollups', action='store_true', help='Re-derive the daily sales rollups from invoices')
+    parser.add_argument('--money-storage', choices=['decimal', 'paise'], help='Convert stored amounts to decimal strings or integer paise')
+    parser.add_argument('--hsn-rate', nargs=2, metavar=('HSN', 'RATE'), help='Set the GST rate (percent) for an HSN code')
+    parser.add_argument('--tax-breakup', choices=['rate', 'hsn'], help='GST breakup by rate or by HSN code (see --start-date/--end-date)')
+    parser.add_argument('--reorder-report', metavar='OUT', help='Write reorder suggestions to a CSV (- for stdout)')
+    parser.add_argument('--velocity-days', type=int, default=30, help='Days of sales used for --reorder-report velocity')
+    parser.add_argument('--lead-time', type=int, default=7, help='Supplier lead time in days for --reorder-report')
+    parser.add_argument('--cover-days', type=int, default=30, help='Days of stock to order beyond the lead time')
+    parser.add_argument('--sql-stats', nargs='?', type=int, const=20, metavar='TOP', help='Report per-statement SQL timings and slow queries (collected with NKE_SQL_STATS=1)')
+    parser.add_argument('--sql-stats-reset', action='store_true', help='Delete the collected SQL stats')
     parser.add_argument('--interactive', action='store_true', help='Run interactive menu')
     args = parser.parse_args()
 
-    db = Database()
+    def report_migration(version, name, elapsed):
+        # stderr: --sales-report - and --reorder-report - stream CSV on stdout
+        print(f'Applied migration {version} ({name}) in {elapsed:.2f}s', file=sys.stderr)
+
+    if args.sql_stats is not None or args.sql_stats_reset:
+        import sqlstats
+        path = sqlstats.stats_path(DB_FILENAME)
+        if args.sql_stats_reset:
+            if os.path.exists(path):
+                os.remove(path)
+            print('Cleared SQL stats in', path)
+        else:
+            print(sqlstats.report(path, top=args.sql_stats))
+        return
+
+    db = Database(on_migration=report_migration)
     try:
+        if args.rebuild_rollups:
+            from sales import SalesManager
+            n = SalesManager(db).rebuild_daily_sales()
+            print('Rebuilt daily sales for', n, 'days')
+            return
+        if args.money_storage:
+            was = db.money_storage
+            n = db.set_money_storage(args.money_storage)
+            if was == args.money_storage:
+                print('Money is already stored as', was)
+            else:
+                print(f'Converted {n} rows from {was} to {args.money_storage} money storage')
+            return
+        if args.hsn_rate:
+            from tax import TaxManager
+            TaxManager(db).set_hsn_rate(*args.hsn_rate)
+            print('GST rate for HSN', args.hsn_rate[0], 'set to', args.hsn_rate[1], '%')
+            return
+        if args.tax_breakup:
+            from tax import TaxManager
+            rows = TaxManager(db).tax_breakup(args.start_date, args.end_date, by=args.tax_breakup)
+            print(('HSN | ' if args.tax_breakup == 'hsn' else '') + 'GST % | Lines | Taxable | CGST | SGST | IGST')
+            for r in rows:
+                print((f"{r['hsn'] or '-'} | " if args.tax_breakup == 'hsn' else '') +
+                      f"{r['rate']} | {r['lines']} | {r['taxable']} | {r['cgst']} | {r['sgst']} | {r['igst']}")
+            return
+        if args.migrate:
+            if not db.migrations_applied:
+                print('No pending migrations')
+            print('Schema version', schema_version(db.conn))
+            return
         if args.init_sample:
             # create sample product/customer
-            pid = db.add_product('SKU-001', 'Sample Widget', '99.50', '60.00', reorder_level=5)
-            db.adjust_stock(pid, 20, reason='initial stock')
-            cid = db.add_customer('Acme Corporation', 'sales@acme.example', '+123456789')
+            pid = Product(db).add_product('SKU-001', 'Sample Widget', '99.50', '60.00', reorder_level=5)
+            Inventory(db).adjust_stock(pid, 20, reason='initial stock')
+            cid = Customer(db).add_customer('Acme Corporation', 'sales@acme.example', '+123456789')
             print('Created sample product id', pid, 'and customer id', cid)
             return
         if args.backup:
-            path = db.backup_db(args.backup)
+            def progress(remaining, total):
+                print(f'\rBackup: {total - remaining}/{total} pages', end='', flush=True)
+            options = dict(pages=args.backup_pages, throttle=args.backup_throttle,
+                           progress=progress, compress=args.backup_compress)
+            if args.backup_incremental:
+                path = incremental_backup(db, args.backup, **options)
+            else:
+                path = db.backup_db(args.backup, **options)
+            print()
             print('Backed up DB to', path)
             return
-        if args.interactive or (not any(vars(args).values())):
+        if args.restore_chain:
+            path = restore_chain(*args.restore_chain)
+            print('Restored DB to', path)
+            return
+        if args.rebuild_stock:
+            n = Inventory(db).rebuild_stock_levels()
+            print('Rebuilt stock levels for', n, 'products')
+            return
+        if args.verify_stock:
+            drift = Inventory(db).verify_stock_levels()
+            for pid, stored, ledger in drift:
+                print(f"product_id {pid}: stock_levels={stored} ledger={ledger}")
+            print('Stock levels OK' if not drift else f'{len(drift)} products out of step; run --rebuild-stock')
+            return
+        if args.reorder_report:
+            import csv
+            rows = Inventory(db).iter_reorder_suggestions(args.velocity_days, args.lead_time, args.cover_days)
+            f = sys.stdout if args.reorder_report == '-' else open(args.reorder_report, 'w', newline='', encoding='utf-8')
+            try:
+                writer = csv.writer(f)
+                writer.writerow(['id', 'sku', 'name', 'stock', 'reorder_level', 'sold', 'per_day', 'days_of_cover',
+                                 'reorder_point', 'suggested_qty', 'cost'])
+                n = 0
+                for r in rows:
+                    writer.writerow([r['id'], r['sku'], r['name'], r['stock'], r['reorder_level'], r['sold'], r['per_day'],
+                                     r['days_of_cover'], r['reorder_point'], r['suggested_qty'], r['cost']])
+                    n += 1
+            finally:
+                if f is not sys.stdout:
+                    f.close()
+            if f is not sys.stdout:
+                print(n, 'products to reorder written to', args.reorder_report)
+            return
+        if args.export_pdfs:
+            from bulk_export import select_invoice_ids, bulk_export_pdfs
+            ids = [int(x) for x in args.ids.split(',')] if args.ids else None
+            invoice_ids = select_invoice_ids(db, args.start_date, args.end_date, args.customer, ids)
+            def progress(done, total):
+                print(f'\rExported {done}/{total}', end='', flush=True)
+            result = bulk_export_pdfs(db, invoice_ids, args.export_pdfs, workers=args.workers, progress=progress)
+            print()
+            print(len(result['exported']), 'invoices exported to', args.export_pdfs)
+            for invoice_id, error in result['errors']:
+                print(f'invoice {invoice_id}: {error}')
+            return
+        if args.sales_report:
+            path = InvoiceManager(db).export_sales_report_csv(args.sales_report, args.start_date, args.end_date)
+            if path != '-':
+                print('Exported sales report to', path)
+            return
+        if args.export_xlsx:
+            kind, out = args.export_xlsx
+            if kind not in ('sales', 'items', 'stock'):
+                parser.error('KIND must be one of: sales, items, stock')
+            import xlsx_export
+            if kind == 'stock':
+                path = xlsx_export.export_stock_xlsx(db, out)
+            else:
+                path = xlsx_export.EXPORTS[kind](db, out, args.start_date, args.end_date)
+            print('Exported', kind, 'to', path)
+            return
+        if args.import_:
+            kind, path = args.import_
+            if kind not in ('products', 'customers'):
+                parser.error('KIND must be one of: products, customers')
+            from importer import bulk_import
+            def progress(read, imported, rejected):
+                print(f'\rRead {read} rows, imported {imported}, rejected {rejected}', end='', flush=True)
+            result = bulk_import(db, kind, path, dry_run=args.dry_run, rejects=args.rejects, progress=progress)
+            print()
+            print(f"{'Validated' if result['dry_run'] else 'Imported'} {result['imported']} of {result['read']} {kind} "
+                  f"({result['rejected']} rejected) in {result['seconds']:.2f}s, {result['rows_per_second']:.0f} rows/s")
+            for line_no, error in result['rejected_rows'][:10]:
+                print(f'line {line_no}: {error}')
+            return
+        if args.reprice:
+            product = Product(db)
+            if args.price_file:
+                diff = product.reprice_from_file(args.price_file, dry_run=args.dry_run)
+            else:
+                if args.percent is None and args.amount is None:
+                    parser.error('--reprice needs --percent, --amount or --price-file')
+                diff = product.reprice(args.percent, args.amount, args.sku_pattern, dry_run=args.dry_run)
+            if args.diff:
+                import csv
+                with open(args.diff, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['id', 'sku', 'name', 'old_price', 'new_price', 'error'])
+                    for d in diff:
+                        writer.writerow([d['id'], d['sku'], d['name'], d['old_price'], d['new_price'], d.get('error', '')])
+            skipped = [d for d in diff if d['id'] is None]
+            diff = [d for d in diff if d['id'] is not None]
+            for d in diff[:20]:
+                print(f"{d['sku']} | {d['name']} | {d['old_price']} -> {d['new_price']}")
+            if len(diff) > 20:
+                print(f'... and {len(diff) - 20} more')
+            print(f"{'Would reprice' if args.dry_run else 'Repriced'} {len(diff)} products")
+            if skipped:
+                print(f"{len(skipped)} rows in {args.price_file} were not applied:")
+                for d in skipped[:20]:
+                    print(f"  {d['sku']}: {d['error']}")
+                if len(skipped) > 20:
+                    print(f'  ... and {len(skipped) - 20} more')
+            return
+        # no options given (defaults such as --backup-pages don't count)
+        if args.interactive or all(v == parser.get_default(k) for k, v in vars(args).items()):
             interactive()
     finally:
         db.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
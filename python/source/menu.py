@@ -5,6 +5,7 @@ from customer import Customer
 from invoices import InvoiceManager
 from sales import SalesManager
 from product import Product
+from tax import rate_percent
 
 MENU = '''
 Main Menu
@@ -19,9 +20,40 @@ Main Menu
 9) Low stock report
 10) Sales summary
 11) Export invoice PDF
+12) Search products
+13) Cache stats
+14) GST breakup
 0) Exit
 Choose: '''
 
+PAGE_SIZE = 20
+
+def _page_through(fetch, header, fmt):
+    """Print fetch(cursor) pages of PAGE_SIZE rows until the last page or 'q'"""
+    cursor, shown = None, 0
+    while True:
+        rows, cursor = fetch(cursor)
+        if shown == 0:
+            print(header)
+        for r in rows:
+            print(fmt(r))
+        shown += len(rows)
+        if cursor is None:
+            print(f'({shown} shown)')
+            return
+        if input(f'-- {shown} shown; Enter for more, q to stop: ').strip().lower() == 'q':
+            return
+
+def _sort_option(sorts, default):
+    """Ask for a sort column, '-' prefix for descending; returns (sort, descending)"""
+    sort = input(f"Sort by ({'/'.join(sorts)}, '-' prefix for descending, default {default}): ").strip().lower()
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-') or default
+    if sort not in sorts:
+        print('Unknown sort, using', default)
+        sort = default
+    return sort, descending
+
 def interactive():
     try:
         # create one database connection
@@ -49,10 +81,11 @@ def interactive():
                 print('Added product id', pid)
 
             elif choice == '2':  # List products
-                rows = product.list_products()
-                print('ID | SKU | Name | Price | Stock')
-                for r in rows:
-                    print(f"{r['id']} | {r['sku']} | {r['name']} | {r['price']} | {r['stock']}")
+                term = input('Filter by SKU/name (blank for all): ').strip() or None
+                sort, descending = _sort_option(product.SORTS, 'id')
+                _page_through(lambda c: product.page_products(c, PAGE_SIZE, sort, descending, term),
+                              'ID | SKU | Name | Price | Stock',
+                              lambda r: f"{r['id']} | {r['sku']} | {r['name']} | {r['price']} | {r['stock']}")
 
             elif choice == '3':  # Adjust stock
                 pid = int(input('Product id: '))
@@ -70,10 +103,11 @@ def interactive():
                 print('Added customer id', cid)
 
             elif choice == '5':  # List customers
-                rows = customer.list_customers()
-                print('ID | Name | Email | Phone')
-                for r in rows:
-                    print(f"{r['id']} | {r['name']} | {r['email']} | {r['phone']}")
+                term = input('Filter by name/email/phone (blank for all): ').strip() or None
+                sort, descending = _sort_option(customer.SORTS, 'id')
+                _page_through(lambda c: customer.page_customers(c, PAGE_SIZE, sort, descending, term),
+                              'ID | Name | Email | Phone',
+                              lambda r: f"{r['id']} | {r['name']} | {r['email']} | {r['phone']}")
 
             elif choice == '6':  # Create invoice
                 print('Creating invoice. Enter line items. Blank description to finish.')
@@ -97,11 +131,12 @@ def interactive():
                         unit_price = input('Unit price: ').strip()
                     qty = int(input('Qty: ').strip())
                     items.append({'product_id': product_id, 'description': description, 'qty': qty, 'unit_price': unit_price})
-                tax = input('Tax rate % (e.g., 5): ').strip() or '0'
+                supply = input('GST supply (intra/inter, blank for a flat tax rate): ').strip().lower() or None
+                tax = input('Tax rate % (e.g., 5; with GST only for items without a rate): ').strip() or '0'
                 customer_id = input('Customer id (optional): ').strip() or None
                 customer_id = int(customer_id) if customer_id else None
                 try:
-                    inv_id = invoice.create_invoice(items, customer_id=customer_id, tax_rate=to_decimal(tax))
+                    inv_id = invoice.create_invoice(items, customer_id=customer_id, tax_rate=to_decimal(tax), supply=supply)
                     print('Created invoice id', inv_id)
                 except Exception as e:
                     print('Error creating invoice:', e)
@@ -117,6 +152,9 @@ def interactive():
                     print('Subtotal:', inv['subtotal'], 'Tax:', inv['tax'], 'Total:', inv['total'])
                     for it in items:
                         print('-', it['description'], it['qty'], it['unit_price'], it['line_total'])
+                        if it['tax_rate_bp'] is not None:
+                            print(f"    HSN {it['hsn'] or '-'} GST {rate_percent(it['tax_rate_bp'])}% "
+                                  f"CGST {it['cgst']} SGST {it['sgst']} IGST {it['igst']}")
 
             elif choice == '8':  # Export invoice CSV
                 iid = int(input('Invoice id: '))
@@ -147,6 +185,25 @@ def interactive():
                 except Exception as e:
                     print('Error:', e)
 
+            elif choice == '12':  # Search products
+                term = input('SKU or name: ').strip()
+                rows = product.search_products(term)
+                print('ID | SKU | Name | Price')
+                for r in rows:
+                    print(f"{r['id']} | {r['sku']} | {r['name']} | {r['price']}")
+
+            elif choice == '13':  # Cache stats
+                for name, st in db.cache_stats().items():
+                    print(f"{name}: size={st['size']}/{st['maxsize']} ttl={st['ttl']}s "
+                          f"hits={st['hits']} misses={st['misses']} hit_rate={st['hit_rate']:.1%}")
+
+            elif choice == '14':  # GST breakup
+                s = input('Start date (YYYY-MM-DD) or blank: ').strip() or None
+                e = input('End date (YYYY-MM-DD) or blank: ').strip() or None
+                print('GST % | Lines | Taxable | CGST | SGST | IGST')
+                for r in invoice.tax.tax_breakup(s, e):
+                    print(f"{r['rate']} | {r['lines']} | {r['taxable']} | {r['cgst']} | {r['sgst']} | {r['igst']}")
+
             elif choice == '0':  # Exit
                 print("Goodbye!")
                 break
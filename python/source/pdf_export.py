@@ -0,0 +1,166 @@
+# ----------------------------- pdf_export.py -----------------------------
+# reportlab is only imported when a PDF is actually requested, through this module
+import os
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import (
+    SimpleDocTemplate, Table, TableStyle, Paragraph,
+    Spacer, Image
+)
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.fonts import addMapping
+from database import to_decimal
+from tax import rate_percent
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_PATH = os.path.abspath(os.path.join(BASE_DIR, "..", "Fonts", "dejavu-fonts-ttf-2.37", "ttf", "DejaVuSans.ttf"))
+LOGO_PATH = os.path.join(BASE_DIR, "..", "Assets", "logo.png")
+
+_fonts_registered = False
+
+def _register_fonts():
+    global _fonts_registered
+    if not _fonts_registered:
+        pdfmetrics.registerFont(TTFont("DejaVuSans", FONT_PATH))
+        addMapping("DejaVuSans", 0, 0, "DejaVuSans")
+        _fonts_registered = True
+
+class _Logo(Image):
+    """Image flowable drawn from an ImageReader that has already been decoded"""
+    def __init__(self, reader, width, height):
+        self._img = reader   # Image would otherwise open and decode the file again
+        super().__init__(reader.fileName, width=width, height=height)
+
+class PdfRenderer:
+    """Lays out invoice PDFs. Font registration, the patched stylesheet, the
+    decoded logo and the table style are prepared once and reused for every invoice."""
+    _shared = None
+
+    def __init__(self, logo_path=LOGO_PATH):
+        _register_fonts()
+        self.styles = getSampleStyleSheet()
+        for s in self.styles.byName.values():
+            s.fontName = "DejaVuSans"
+        self.logo = None
+        if os.path.exists(logo_path):
+            self.logo = ImageReader(logo_path)
+            self.logo.getRGBData()   # decode the PNG now; every render reuses the pixels
+        self.table_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+            ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.black),
+            ("FONTNAME", (0, 0), (-1, 0), "DejaVuSans"),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+        ])
+
+    @classmethod
+    def shared(cls):
+        """The per-process renderer"""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def render(self, inv, items, cust, filename):
+        """Lay out one invoice (header row, item rows, customer dict or None) as a PDF.
+        `filename` may also be a writable binary file object."""
+        styles = self.styles
+        doc = SimpleDocTemplate(filename, pagesize=A4)
+        elements = []
+
+        # ---------- COMPANY LOGO ----------
+        if self.logo:
+            elements.append(_Logo(self.logo, width=100, height=100))
+        else:
+            elements.append(Paragraph("<b>N K Enterprises</b>", styles["Title"]))
+        elements.append(Spacer(1, 12))
+
+        # ---------- HEADER ----------
+        elements.append(Paragraph("<b>Tax Invoice</b>", styles["Title"]))
+        elements.append(Spacer(1, 10))
+
+        # ---------- CUSTOMER DETAILS ----------
+        elements.append(Paragraph("<b>Customer Details:</b>", styles["Heading3"]))
+        if cust:
+            cust_text = f"""
+            <b>Name:</b> {cust.get('name', '')}<br/>
+            <b>Email:</b> {cust.get('email', '')}<br/>
+            <b>Phone:</b> {cust.get('phone', '')}<br/>
+            <b>Address:</b> {cust.get('address', '')}
+            """
+        else:
+            cust_text = "N/A"
+        elements.append(Paragraph(cust_text, styles["Normal"]))
+        elements.append(Spacer(1, 12))
+
+        # ---------- INVOICE SUMMARY ----------
+        supply = inv['supply'] if 'supply' in inv.keys() else None
+        if supply == 'inter':
+            tax_info = f"<b>IGST:</b> ₹{_sum(items, 'igst')}<br/>"
+        elif supply == 'intra':
+            tax_info = f"<b>CGST:</b> ₹{_sum(items, 'cgst')}<br/><b>SGST:</b> ₹{_sum(items, 'sgst')}<br/>"
+        else:
+            tax_info = f"<b>Tax:</b> ₹{inv['tax']}<br/>"
+        inv_info = f"""
+        <b>Invoice No:</b> {inv['invoice_no']}<br/>
+        <b>Date:</b> {inv['date']}<br/>
+        <b>Subtotal:</b> ₹{inv['subtotal']}<br/>
+        {tax_info}
+        <b>Total:</b> ₹{inv['total']}
+        """
+        elements.append(Paragraph("<b>Invoice Summary:</b>", styles["Heading3"]))
+        elements.append(Paragraph(inv_info, styles["Normal"]))
+        elements.append(Spacer(1, 12))
+
+        # ---------- LINE ITEMS TABLE ----------
+        if supply in ('intra', 'inter'):
+            tax_cols = ["igst"] if supply == 'inter' else ["cgst", "sgst"]
+            data = [["Description", "HSN", "Qty", "Unit Price", "Taxable", "GST %"] + [c.upper() for c in tax_cols]]
+            for it in items:
+                data.append([
+                    it["description"],
+                    it["hsn"] or "",
+                    str(it["qty"]),
+                    str(it["unit_price"]),
+                    str(it["line_total"]),
+                    f"{rate_percent(it['tax_rate_bp'])}%" if it["tax_rate_bp"] is not None else "",
+                ] + [str(to_decimal(it[c] or 0)) for c in tax_cols])
+            widths = [140, 50, 35, 60, 60, 40] + [60] * len(tax_cols)
+        else:
+            data = [["Description", "Qty", "Unit Price", "Line Total"]]
+            for it in items:
+                data.append([
+                    it["description"],
+                    str(it["qty"]),
+                    str(it["unit_price"]),
+                    str(it["line_total"]),
+                ])
+            widths = [200, 60, 80, 80]
+        table = Table(data, colWidths=widths)
+        table.setStyle(self.table_style)
+        elements.append(Paragraph("<b>Invoice Items:</b>", styles["Heading3"]))
+        elements.append(table)
+        elements.append(Spacer(1, 25))
+
+        # ---------- SIGNATURE SECTION ----------
+        elements.append(Spacer(1, 30))
+        elements.append(Paragraph("<b>For N K Enterprises</b>", styles["Normal"]))
+        elements.append(Spacer(1, 30))
+        elements.append(Paragraph("__________________________", styles["Normal"]))
+        elements.append(Paragraph("<b>Authorized Signature</b>", styles["Normal"]))
+        elements.append(Spacer(1, 10))
+        elements.append(Paragraph("<b>Thank you for your business!</b>", styles["Normal"]))
+
+        # ---------- BUILD PDF ----------
+        doc.build(elements)
+        return filename
+
+def _sum(items, column):
+    return sum((to_decimal(it[column] or 0) for it in items), to_decimal(0))
+
+def render_invoice_pdf(inv, items, cust, filename):
+    """Render with the per-process PdfRenderer"""
+    return PdfRenderer.shared().render(inv, items, cust, filename)
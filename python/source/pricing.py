@@ -0,0 +1,101 @@
+# ----------------------------- pricing.py -----------------------------
+"""
+Invoice arithmetic in integer paise.
+
+Line totals, subtotal, tax and total for whole lists of lines are computed
+with plain integers instead of a Decimal multiply-and-quantize per line. The
+rules are the ones InvoiceManager has always used: unit prices and tax rates
+are rounded half-up to two places, each line is unit * qty, tax is rounded
+half-up to the paisa, and total = subtotal + tax.
+
+tests/test_pricing.py checks the engine against the Decimal reference on
+random invoices.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from database import to_decimal, to_paise, paise_str
+
+def _digits(s):
+    # str.isdigit() is also true for '²' and other non-ASCII digits int() refuses
+    return s.isascii() and s.isdigit()
+
+def parse_paise(value):
+    """Amount (str, int, float or Decimal) -> integer paise, rounded half-up"""
+    if type(value) is int:
+        return value * 100
+    if isinstance(value, Decimal):
+        return to_paise(value)
+    s = str(value).strip()
+    whole, _, frac = s.partition('.')
+    if _digits(whole) and len(frac) <= 2 and (not frac or _digits(frac)):
+        # the usual shape: a plain amount with at most two places
+        return int(whole) * 100 + int(frac.ljust(2, '0'))
+    neg = s.startswith('-')
+    whole, _, frac = (s[1:] if s[:1] in ('+', '-') else s).partition('.')
+    if not (whole or frac) or (whole and not _digits(whole)) or (frac and not _digits(frac)):
+        # exponents, NaN, stray characters: let Decimal decide (and raise)
+        return to_paise(s)
+    p = int(whole or 0) * 100 + int(frac[:2].ljust(2, '0'))
+    if len(frac) > 2 and frac[2] >= '5':
+        p += 1
+    return -p if neg else p
+
+def _div_half_up(n, d):
+    q = (abs(n) * 2 + d) // (2 * d)
+    return -q if n < 0 else q
+
+def tax_paise(subtotal, rate):
+    """Tax on `subtotal` paise at `rate` percent (any amount to_decimal accepts)"""
+    # rate in hundredths of a percent: subtotal * rate_bp / 10000 paise
+    return _div_half_up(subtotal * parse_paise(rate), 10000)
+
+def price_lines(qtys, unit_prices, tax_rate=0):
+    """Price a whole invoice at once.
+
+    `qtys` and `unit_prices` are parallel sequences; unit prices may be strings,
+    numbers or Decimal. Returns (unit_paise, line_paise, subtotal, tax, total)
+    with every amount in integer paise.
+    """
+    seen = {}   # long B2B invoices repeat the same few prices
+    units = [seen[u] if u in seen else seen.setdefault(u, parse_paise(u)) for u in unit_prices]
+    lines = [u * int(q) for u, q in zip(units, qtys)]
+    subtotal = sum(lines)
+    tax = tax_paise(subtotal, tax_rate)
+    return units, lines, subtotal, tax, subtotal + tax
+
+def gst_lines(lines, rates_bp, interstate=False):
+    """Per-line GST on line totals (paise) at rates in hundredths of a percent.
+
+    Intra-state lines pay CGST and SGST at half the rate each, every half
+    rounded half-up on its own; inter-state lines pay IGST at the full rate.
+    Returns (cgst, sgst, igst) lists of paise.
+    """
+    if interstate:
+        igst = [_div_half_up(line * rate, 10000) for line, rate in zip(lines, rates_bp)]
+        zeros = [0] * len(igst)
+        return zeros, list(zeros), igst
+    cgst = [_div_half_up(line * rate, 20000) for line, rate in zip(lines, rates_bp)]
+    return cgst, list(cgst), [0] * len(cgst)
+
+def reference_price_lines(qtys, unit_prices, tax_rate=0):
+    """The original per-line Decimal computation, kept for tests/test_pricing.py"""
+    subtotal = Decimal('0.00')
+    lines = []
+    for q, u in zip(qtys, unit_prices):
+        line = (to_decimal(u) * Decimal(int(q))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        lines.append(line)
+        subtotal += line
+    tax = (subtotal * to_decimal(tax_rate) / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    total = (subtotal + tax).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return lines, subtotal, tax, total
+
+def reference_gst_lines(lines, rates_bp, interstate=False):
+    """gst_lines done per line in Decimal rupees, kept for the same tests"""
+    zero = Decimal('0.00')
+    cgst, sgst, igst = [], [], []
+    for line, rate in zip(lines, rates_bp):
+        share = Decimal(paise_str(line)) * Decimal(rate) / Decimal(10000 if interstate else 20000)
+        share = share.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        cgst.append(zero if interstate else share)
+        sgst.append(zero if interstate else share)
+        igst.append(share if interstate else zero)
+    return cgst, sgst, igst
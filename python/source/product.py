@@ -1,31 +1,36 @@
 # ----------------------------- product.py -----------------------------
-from database import Database, to_decimal
+import re
+from database import Database, to_decimal, keyset_page, like_pattern
+from tax import rate_bp
 
 class Product:
     def __init__(self, db: Database):
         self.db = db
+        self.cache = db.cache('products')
     
     # Add product
-    def add_product(self, sku, name, price, cost=None, reorder_level=0):
-        price = to_decimal(price)
-        cost = to_decimal(cost) if cost else None
+    def add_product(self, sku, name, price, cost=None, reorder_level=0, hsn=None, gst_rate=None):
         cur = self.db.conn.cursor()
         cur.execute(
-            'INSERT INTO products (sku,name,price,cost,reorder_level) VALUES (?,?,?,?,?)',
-            (sku, name, str(price), str(cost) if cost else None, reorder_level)
+            'INSERT INTO products (sku,name,price,cost,reorder_level,hsn,gst_rate_bp) VALUES (?,?,?,?,?,?,?)',
+            (sku, name, self.db.money_in(price), self.db.money_in(cost) if cost else None, reorder_level,
+             hsn or None, rate_bp(gst_rate) if gst_rate not in (None, '') else None)
         )
         self.db.conn.commit()
+        self.cache.invalidate(cur.lastrowid)
         return cur.lastrowid
     
     # Update product
     def update_product(self, product_id, **fields):
-        allowed = ['sku', 'name', 'price', 'cost', 'reorder_level']
+        allowed = ['sku', 'name', 'price', 'cost', 'reorder_level', 'hsn', 'gst_rate']
         updates = []
         params = []
         for k, v in fields.items():
             if k in allowed and v is not None:
                 if k in ('price', 'cost'):
-                    v = str(to_decimal(v))
+                    v = self.db.money_in(v)
+                elif k == 'gst_rate':
+                    k, v = 'gst_rate_bp', rate_bp(v)
                 updates.append(f"{k}=?")
                 params.append(v)
         if not updates:
@@ -34,28 +39,205 @@ class Product:
         sql = f"UPDATE products SET {', '.join(updates)} WHERE id=?"
         self.db.conn.execute(sql, params)
         self.db.conn.commit()
+        self.cache.invalidate(product_id)
+        self.db.cache('tax_rates').invalidate(product_id)
         return True
     
     # Search product by product ID
     def get_product(self, product_id):
+        return self.cache.get(product_id, self._load_product)
+
+    def _load_product(self, product_id):
         cur = self.db.conn.execute('SELECT * FROM products WHERE id=?', (product_id,))
-        return cur.fetchone()
+        return self._money(cur.fetchone())
     
-    # Search product by SKU and name
+    # Exact SKU lookup (uses the UNIQUE index on sku)
+    def get_product_by_sku(self, sku):
+        cur = self.db.conn.execute('SELECT * FROM products WHERE sku=?', (sku,))
+        return self._money(cur.fetchone())
+
+    # Search product by SKU and name: substring match anywhere in either
     def find_product_by_sku_or_name(self, term):
-        cur = self.db.conn.execute(
-            "SELECT * FROM products WHERE sku LIKE ? OR name LIKE ?",
-            (f"%{term}%", f"%{term}%")
-        )
-        return cur.fetchall()
-    
+        return self._substring_search(term)
+
+    # Ranked search: an exact SKU hit first, then full-text prefix matches on SKU/name.
+    # When the full-text query finds nothing (e.g. 'idge' for 'Widget') it falls
+    # back to the substring match of find_product_by_sku_or_name. limit=None returns every match.
+    def search_products(self, term, limit=20):
+        if limit is not None and int(limit) < 1:
+            raise ValueError("limit must be at least 1")
+        term = (term or '').strip()
+        if not term:
+            return []
+        exact = self.get_product_by_sku(term)
+        rows = [exact] if exact else []
+        tokens = re.findall(r'\w+', term)
+        if not tokens or not self._has_fts():
+            return self._merge(rows, self._substring_search(term, limit), limit)
+        # every token must match, the last one as a prefix (the user may still be typing)
+        query = ' '.join([f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*'])
+        sql = '''
+            SELECT p.* FROM products_fts f JOIN products p ON p.id = f.rowid
+            WHERE products_fts MATCH ? ORDER BY bm25(products_fts, 2.0, 1.0)
+        '''
+        params = [query]
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit + len(rows))
+        found = [self._money(r) for r in self.db.conn.execute(sql, params)]
+        if not found:
+            found = self._substring_search(term, limit)
+        return self._merge(rows, found, limit)
+
+    def _substring_search(self, term, limit=None):
+        sql = "SELECT * FROM products WHERE sku LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\'"
+        params = [like_pattern(term or '')] * 2
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit + 1)   # room for an exact SKU hit that is dropped as a duplicate
+        return [self._money(r) for r in self.db.conn.execute(sql, params)]
+
+    @staticmethod
+    def _merge(rows, more, limit):
+        seen = {r['id'] for r in rows}
+        rows = rows + [r for r in more if r['id'] not in seen]
+        return rows[:limit] if limit else rows
+
+    def _has_fts(self):
+        if not hasattr(self, '_fts'):
+            self._fts = self.db.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name='products_fts'"
+            ).fetchone() is not None
+        return self._fts
+
     # List of all products
     def list_products(self):
         cur = self.db.conn.execute('''
-            SELECT p.*, 
-                   IFNULL((SELECT SUM(change) 
-                           FROM inventory_movements im 
-                           WHERE im.product_id=p.id),0) as stock
-            FROM products p
+            SELECT p.*, IFNULL(sl.qty,0) as stock
+            FROM products p LEFT JOIN stock_levels sl ON sl.product_id=p.id
         ''')
-        return cur.fetchall()
+        return [self._money(r) for r in cur]
+
+    # Sort orders for page_products: name -> (SQL expression, row column)
+    SORTS = {
+        'id': ('p.id', 'id'),
+        'sku': ("IFNULL(p.sku, '')", 'sku', ''),   # sku is nullable
+        'name': ('p.name', 'name'),
+        'price': ('p.price', 'price'),
+        'stock': ('IFNULL(sl.qty,0)', 'stock'),
+    }
+
+    def page_products(self, cursor=None, limit=50, sort='id', descending=False, term=None, low_stock=False):
+        """One page of products with their stock, ordered by `sort` (see SORTS).
+        `term` keeps SKUs/names containing it; low_stock keeps those at or below
+        their reorder level. Pass the returned cursor back for the next page.
+        Returns (rows, next_cursor); next_cursor is None on the last page."""
+        if sort not in self.SORTS:
+            raise ValueError(f"Unknown sort {sort!r}; use one of {', '.join(self.SORTS)}")
+        where, params = [], []
+        if term:
+            where.append("p.sku LIKE ? ESCAPE '\\' OR p.name LIKE ? ESCAPE '\\'")
+            params += [like_pattern(term)] * 2
+        if low_stock:
+            where.append('IFNULL(sl.qty,0) <= p.reorder_level')
+        rows, cursor = keyset_page(
+            self.db.conn,
+            'SELECT p.*, IFNULL(sl.qty,0) as stock FROM products p LEFT JOIN stock_levels sl ON sl.product_id=p.id',
+            where, params, (self.SORTS[sort], self.SORTS['id']), descending, cursor, limit)
+        return [self._money(r) for r in rows], cursor
+
+    def iter_products(self, sort='id', descending=False, term=None, low_stock=False, batch_size=500):
+        """Yield every matching product, one keyset page of `batch_size` at a time"""
+        cursor = None
+        while True:
+            rows, cursor = self.page_products(cursor, batch_size, sort, descending, term, low_stock)
+            yield from rows
+            if cursor is None:
+                break
+
+    def _money(self, row):
+        return self.db.money_row(row, 'price', 'cost')
+
+    # Bulk repricing for SKUs matching a GLOB pattern: the percentage is applied first,
+    # then the absolute amount. Returns the before/after diff of changed products.
+    def reprice(self, percent=None, amount=None, sku_pattern='*', dry_run=False):
+        if percent is None and amount is None:
+            raise ValueError("Give a percent and/or an amount")
+        # integer paise arithmetic, rounded half-up like to_decimal()
+        bp = int(to_decimal(percent or 0) * 100)
+        delta = int(to_decimal(amount or 0) * 100)
+        new_paise = f'MAX(0, ({self.db.paise_sql("price")} * {10000 + bp} + 5000) / 10000 + {delta})'
+        new_price = new_paise if self.db.money_storage == 'paise' else f'{new_paise} / 100.0'
+        return self._apply_reprice(
+            'sku GLOB ?', [sku_pattern],
+            f'UPDATE products SET price = {new_price} WHERE sku GLOB ?', [sku_pattern],
+            dry_run
+        )
+
+    # Bulk repricing from a CSV of sku,price. Rows that cannot be applied come last
+    # in the diff, with id, name and old_price None and an 'error': SKUs that match
+    # no product, then negative prices (which are not written, as reprice() never
+    # goes below 0 either).
+    def reprice_from_file(self, path, dry_run=False):
+        import csv
+        rows = []
+        negative = []
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            for line_no, r in enumerate(reader, start=2):
+                r = {k.strip().lower(): (v or '').strip() for k, v in r.items() if k}
+                try:
+                    sku, price = r['sku'], to_decimal(r.get('price') or r.get('new_price'))
+                    if not price.is_finite():
+                        raise ValueError(f"price {price} is not a number")
+                except Exception as e:
+                    raise ValueError(f"{path} line {line_no}: need a sku and a numeric price") from e
+                if price < 0:
+                    negative.append({'id': None, 'sku': sku, 'name': None, 'old_price': None,
+                                     'new_price': price, 'error': f'line {line_no}: negative price'})
+                else:
+                    rows.append((sku, self.db.money_in(price)))
+        conn = self.db.conn
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS reprice_file (sku TEXT PRIMARY KEY, price NUMERIC)')
+        conn.execute('DELETE FROM reprice_file')
+        conn.executemany('INSERT OR REPLACE INTO reprice_file (sku, price) VALUES (?,?)', rows)
+        unmatched = [{'id': None, 'sku': r['sku'], 'name': None, 'old_price': None,
+                      'new_price': self.db.money_out(r['price']), 'error': 'no such product'} for r in conn.execute('''
+            SELECT f.sku, f.price FROM reprice_file f
+            WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.sku = f.sku) ORDER BY f.sku
+        ''')]
+        return self._apply_reprice(
+            'sku IN (SELECT sku FROM reprice_file)', [],
+            'UPDATE products SET price = (SELECT f.price FROM reprice_file f WHERE f.sku = products.sku) '
+            'WHERE sku IN (SELECT sku FROM reprice_file)', [],
+            dry_run
+        ) + unmatched + negative
+
+    # One transaction: snapshot old prices, run the set-based UPDATE, diff; roll back on dry_run
+    def _apply_reprice(self, where, where_params, update_sql, update_params, dry_run):
+        conn = self.db.conn
+        self.db.begin()
+        try:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS reprice_before (id INTEGER PRIMARY KEY, old_price NUMERIC)')
+            conn.execute('DELETE FROM reprice_before')
+            conn.execute(f'INSERT INTO reprice_before (id, old_price) SELECT id, price FROM products WHERE {where}', where_params)
+            conn.execute(update_sql, update_params)
+            diff = [dict(r) for r in conn.execute('''
+                SELECT p.id, p.sku, p.name, b.old_price, p.price as new_price
+                FROM reprice_before b JOIN products p ON p.id = b.id
+                WHERE p.price != b.old_price ORDER BY p.sku
+            ''')]
+        except BaseException:
+            conn.rollback()
+            raise
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+            self.cache.clear()
+        for d in diff:
+            d['old_price'] = self.db.money_out(d['old_price'])
+            d['new_price'] = self.db.money_out(d['new_price'])
+        return diff
@@ -1,20 +1,109 @@
 # ----------------------------- sales.py -----------------------------
-from database import Database, to_decimal
+from database import Database, from_paise, rebuild_daily_sales_sql, date_range, _DAY
 
 class SalesManager:
     def __init__(self, db: Database):
         self.db = db
-    
+
+    # Add invoices to the daily rollups; rows are (date, customer_id, subtotal, tax, total)
+    # with the amounts in integer paise.
+    # Does not commit: called inside the invoice transaction.
+    def _record_sales(self, cur, rows):
+        per_day = {}
+        per_customer = {}
+        for date, customer_id, subtotal, tax, total in rows:
+            day = date[:10]
+            amounts = (1, subtotal, tax, total)
+            for bucket, key in ((per_day, day), (per_customer, (day, customer_id or 0))):
+                prev = bucket.get(key, (0, 0, 0, 0))
+                bucket[key] = tuple(a + b for a, b in zip(prev, amounts))
+        cur.executemany('''
+            INSERT INTO daily_sales (day, invoice_count, subtotal_paise, tax_paise, total_paise) VALUES (?,?,?,?,?)
+            ON CONFLICT(day) DO UPDATE SET invoice_count = invoice_count + excluded.invoice_count,
+                subtotal_paise = subtotal_paise + excluded.subtotal_paise,
+                tax_paise = tax_paise + excluded.tax_paise,
+                total_paise = total_paise + excluded.total_paise
+        ''', [(day,) + v for day, v in per_day.items()])
+        cur.executemany('''
+            INSERT INTO daily_customer_sales (day, customer_id, invoice_count, subtotal_paise, tax_paise, total_paise)
+            VALUES (?,?,?,?,?,?)
+            ON CONFLICT(day, customer_id) DO UPDATE SET invoice_count = invoice_count + excluded.invoice_count,
+                subtotal_paise = subtotal_paise + excluded.subtotal_paise,
+                tax_paise = tax_paise + excluded.tax_paise,
+                total_paise = total_paise + excluded.total_paise
+        ''', [key + v for key, v in per_customer.items()])
+
     # sum totals and count invoices
-    def sales_summary(self, start_date=None, end_date=None):
-        sql = 'SELECT COUNT(*) as count, IFNULL(SUM(total),0) as total_sales FROM invoices'
-        params = []
-        if start_date and end_date:
-            sql += ' WHERE date BETWEEN ? AND ?'
-            params = [start_date, end_date]
+    def sales_summary(self, start_date=None, end_date=None, customer_id=None):
+        """Invoice count and total sales, optionally for a date range and/or customer.
+
+        Either bound may be left out and both are inclusive (see
+        database.date_range). Plain YYYY-MM-DD bounds are answered from the daily
+        rollups; anything finer falls back to scanning invoices. customer_id=0
+        means walk-in invoices (no customer), as in the rollups.
+        """
+        if any(d and not _DAY.match(d) for d in (start_date, end_date)):
+            return self._sales_summary_scan(start_date, end_date, customer_id)
+        table = 'daily_sales' if customer_id is None else 'daily_customer_sales'
+        where, params = date_range('day', start_date, end_date)
+        sql = (f'SELECT IFNULL(SUM(invoice_count),0) as count, IFNULL(SUM(total_paise),0) as total_paise FROM {table} '
+               'WHERE 1=1' + ''.join(f' AND {w}' for w in where))
+        if customer_id is not None:
+            sql += ' AND customer_id = ?'
+            params.append(customer_id)
+        r = self.db.conn.execute(sql, params).fetchone()
+        return {
+            'count': r['count'],
+            'total_sales': from_paise(r['total_paise'])
+        }
+
+    def _sales_summary_scan(self, start_date, end_date, customer_id=None):
+        # summed as integer paise, so the total is exact in either money storage
+        where, params = date_range('date', start_date, end_date)
+        sql = (f'SELECT COUNT(*) as count, IFNULL(SUM({self.db.paise_sql("total")}),0) as total_paise '
+               'FROM invoices WHERE 1=1' + ''.join(f' AND {w}' for w in where))
+        if customer_id == 0:
+            # the rollups file walk-in invoices under customer 0
+            sql += ' AND (customer_id IS NULL OR customer_id = 0)'
+        elif customer_id is not None:
+            sql += ' AND customer_id = ?'
+            params.append(customer_id)
         cur = self.db.conn.execute(sql, params)
         r = cur.fetchone()
         return {
             'count': r['count'],
-            'total_sales': to_decimal(r['total_sales'])
-        }
\ No newline at end of file
+            'total_sales': from_paise(r['total_paise'])
+        }
+
+    # Day-by-day sales for dashboards; first and last day are both included.
+    # customer_id=0 gives the walk-in invoices, as in sales_summary.
+    def daily_sales(self, start_day=None, end_day=None, customer_id=None):
+        table = 'daily_sales' if customer_id is None else 'daily_customer_sales'
+        sql = f'SELECT day, invoice_count, subtotal_paise, tax_paise, total_paise FROM {table} WHERE 1=1'
+        params = []
+        if start_day:
+            sql += ' AND day >= ?'
+            params.append(start_day)
+        if end_day:
+            sql += ' AND day <= ?'
+            params.append(end_day)
+        if customer_id is not None:
+            sql += ' AND customer_id = ?'
+            params.append(customer_id)
+        sql += ' ORDER BY day'
+        return [{
+            'day': r['day'],
+            'count': r['invoice_count'],
+            'subtotal': from_paise(r['subtotal_paise']),
+            'tax': from_paise(r['tax_paise']),
+            'total': from_paise(r['total_paise']),
+        } for r in self.db.conn.execute(sql, params)]
+
+    # Re-derive the rollups from the invoices table
+    def rebuild_daily_sales(self):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM daily_sales')
+            conn.execute('DELETE FROM daily_customer_sales')
+            for sql in rebuild_daily_sales_sql(self.db.money_storage):
+                conn.execute(sql)
+        return self.db.conn.execute('SELECT COUNT(*) as c FROM daily_sales').fetchone()['c']
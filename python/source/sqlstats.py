@@ -0,0 +1,381 @@
+# ----------------------------- sqlstats.py -----------------------------
+"""
+Per-statement timing for Database connections.
+
+With NKE_SQL_STATS=1 every connection a Database opens is wrapped: each
+statement's latency (execute plus fetching its rows) goes into a histogram
+keyed by its normalized SQL, and statements slower than NKE_SLOW_QUERY_MS
+(default 50) are logged with their EXPLAIN QUERY PLAN. When it is off,
+Database.conn is the plain sqlite3 connection and nothing here is imported.
+
+Slow queries are appended to NKE_SQL_STATS_FILE (default
+<database>.sqlstats.jsonl) as they happen; each process appends its
+histograms when its connections close or it exits. Several processes can
+share the file.
+
+    python main_backend.py --sql-stats [TOP]     # merged report
+    python main_backend.py --sql-stats-reset
+"""
+import os
+import re
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from collections import deque
+from bisect import bisect_left
+
+SLOW_QUERY_MS = float(os.environ.get('NKE_SLOW_QUERY_MS', '50'))
+# long-running processes (the API server) also flush this often, in seconds
+FLUSH_SECONDS = float(os.environ.get('NKE_SQL_STATS_FLUSH', '60'))
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+_BOUNDS_S = tuple(b / 1000 for b in BOUNDS_MS)
+
+_SPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES = re.compile(r'(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+', re.IGNORECASE)
+
+def normalize(sql):
+    """One key per statement shape: whitespace collapsed, IN (?,?,...) and
+    multi-row VALUES lists folded, so chunked queries share a histogram"""
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _IN_LIST.sub('(?, ...)', sql)
+    return _VALUES.sub(r'\1, ...', sql)
+
+def stats_path(filename):
+    if filename == ':memory:' or filename.startswith('file::memory:'):
+        return None
+    return os.environ.get('NKE_SQL_STATS_FILE') or f'{filename}.sqlstats.jsonl'
+
+class Recorder:
+    """Histograms for every connection to one database in this process"""
+    def __init__(self, path):
+        self.path = path
+        # reentrant: a cursor garbage-collected while this thread holds the lock records from __del__
+        self.lock = threading.RLock()
+        self.stats = {}        # raw sql -> [count, total_s, max_s, buckets]
+        self.planned = set()   # statements whose plan is already in the slow log
+        self.started = time.time()
+        self.next_flush = time.monotonic() + FLUSH_SECONDS
+        atexit.register(self.flush)
+
+    def record(self, sql, elapsed, params=None, conn=None, deferred=None):
+        """Add one timing. A slow statement is logged with its plan from `conn`;
+        with `deferred` (a deque) it is appended there instead, to be logged
+        later by the connection's owner, and nothing else is run or written."""
+        with self.lock:
+            s = self.stats.get(sql)
+            if s is None:
+                s = self.stats[sql] = [0, 0.0, 0.0, [0] * (len(BOUNDS_MS) + 1)]
+            s[0] += 1
+            s[1] += elapsed
+            if elapsed > s[2]:
+                s[2] = elapsed
+            s[3][bisect_left(_BOUNDS_S, elapsed)] += 1
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            if deferred is not None:
+                deferred.append((sql, elapsed, params, time.strftime('%Y-%m-%dT%H:%M:%S')))
+                return
+            self.slow(sql, elapsed, params, conn)
+        if deferred is None and time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def slow(self, sql, elapsed, params, conn, ts=None):
+        key = normalize(sql)
+        plan = None
+        if conn is not None and key not in self.planned:
+            self.planned.add(key)
+            try:
+                plan = [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, params or ())]
+            except (sqlite3.Error, ValueError):
+                pass   # BEGIN/COMMIT/PRAGMA and friends have no plan
+        # parameters are left out: they can hold customer details
+        self._append({'type': 'slow', 'pid': os.getpid(), 'ts': ts or time.strftime('%Y-%m-%dT%H:%M:%S'),
+                      'ms': round(elapsed * 1000, 3), 'threshold_ms': SLOW_QUERY_MS, 'sql': key, 'plan': plan})
+
+    def snapshot(self):
+        """Histograms by normalized statement: {sql: [count, total_ms, max_ms, buckets]}"""
+        merged = {}
+        with self.lock:
+            items = [(sql, s[0], s[1], s[2], list(s[3])) for sql, s in self.stats.items()]
+        for sql, count, total, peak, buckets in items:
+            m = merged.setdefault(normalize(sql), [0, 0.0, 0.0, [0] * len(buckets)])
+            m[0] += count
+            m[1] += total * 1000
+            m[2] = max(m[2], peak * 1000)
+            m[3] = [a + b for a, b in zip(m[3], buckets)]
+        return merged
+
+    def flush(self):
+        """Append this process's histograms to the stats file and start over"""
+        statements = self.snapshot()
+        with self.lock:
+            self.stats.clear()
+            since, self.started = self.started, time.time()
+            self.next_flush = time.monotonic() + FLUSH_SECONDS
+        if statements:
+            self._append({'type': 'stats', 'pid': os.getpid(), 'since': since, 'until': time.time(),
+                          'statements': statements})
+
+    def _append(self, entry):
+        if not self.path:
+            return
+        line = json.dumps(entry) + '\n'
+        # one write per line in append mode, so processes sharing the file don't interleave
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+_RECORDERS = {}
+_RECORDERS_LOCK = threading.Lock()
+
+def _after_fork():
+    # a forked worker starts empty; its parent still owns what it had collected
+    for rec in _RECORDERS.values():
+        rec.lock = threading.RLock()
+        rec.stats = {}
+        rec.started = time.time()
+        rec.next_flush = time.monotonic() + FLUSH_SECONDS
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def recorder(filename):
+    path = stats_path(filename)
+    with _RECORDERS_LOCK:
+        if path not in _RECORDERS:
+            _RECORDERS[path] = Recorder(path)
+        return _RECORDERS[path]
+
+class InstrumentedCursor:
+    """A sqlite3 cursor that times each statement until its rows are used up"""
+    __slots__ = ('_cur', '_rec', '_owner', '_sql', '_params', '_elapsed')
+
+    def __init__(self, cur, rec, owner):
+        self._cur = cur
+        self._rec = rec
+        self._owner = owner   # the InstrumentedConnection
+        self._sql = None
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            self._rec.record(sql, self._elapsed, self._params, self._owner._conn)
+
+    def execute(self, sql, params=()):
+        self._finish()
+        self._owner._log_pending()
+        started = time.perf_counter()
+        try:
+            self._cur.execute(sql, params)
+        finally:
+            self._sql, self._params, self._elapsed = sql, params, time.perf_counter() - started
+        if self._cur.description is None:
+            self._finish()   # no rows to fetch
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._finish()
+        self._owner._log_pending()
+        started = time.perf_counter()
+        try:
+            self._cur.executemany(sql, seq_of_params)
+        finally:
+            self._rec.record(sql, time.perf_counter() - started)
+        return self
+
+    def executescript(self, script):
+        self._finish()
+        self._owner._log_pending()
+        started = time.perf_counter()
+        try:
+            self._cur.executescript(script)
+        finally:
+            self._rec.record(script, time.perf_counter() - started)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cur.fetchone()
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - started
+            if row is None:
+                self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cur.fetchmany(self._cur.arraysize if size is None else size)
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - started
+            if len(rows) < (self._cur.arraysize if size is None else size):
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cur.fetchall()
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - started
+            self._finish()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = next(self._cur)
+        except StopIteration:
+            if self._sql is not None:
+                self._elapsed += time.perf_counter() - started
+                self._finish()
+            raise
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - started
+        return row
+
+    def close(self):
+        self._finish()
+        self._cur.close()
+
+    def __del__(self):
+        # A cursor dropped before its last row still counts. This can run inside
+        # another statement or on another thread, so only the timing is taken
+        # here: a slow statement's EXPLAIN waits for the owner's next execute or close.
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            self._rec.record(sql, self._elapsed, self._params, deferred=self._owner._pending)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+class InstrumentedConnection:
+    """Wraps a sqlite3 connection; everything not timed is passed straight through"""
+    __slots__ = ('_conn', '_rec', '_pending')
+
+    def __init__(self, conn, rec):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_rec', rec)
+        # slow statements from collected cursors, still to be planned and logged
+        object.__setattr__(self, '_pending', deque())
+
+    def _log_pending(self):
+        while self._pending:
+            sql, elapsed, params, ts = self._pending.popleft()
+            self._rec.slow(sql, elapsed, params, self._conn, ts)
+
+    @property
+    def raw(self):
+        """The underlying sqlite3.Connection, for APIs that need the real object"""
+        return self._conn
+
+    def cursor(self, *args):
+        return InstrumentedCursor(self._conn.cursor(*args), self._rec, self)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self._rec.record('COMMIT', time.perf_counter() - started)
+
+    def rollback(self):
+        started = time.perf_counter()
+        try:
+            self._conn.rollback()
+        finally:
+            self._rec.record('ROLLBACK', time.perf_counter() - started)
+
+    def close(self):
+        self._log_pending()
+        self._rec.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+def instrument(conn, filename):
+    return InstrumentedConnection(conn, recorder(filename))
+
+# ---------- report ----------
+def _percentile(buckets, count, q):
+    target = q * count
+    seen = 0
+    for bound, n in zip(BOUNDS_MS, buckets):
+        seen += n
+        if seen >= target:
+            return f'{bound:g}'
+    return f'>{BOUNDS_MS[-1]:g}'
+
+def load(path):
+    """Merge every process's histograms in a stats file; returns (statements, slow entries, processes)"""
+    statements, slow, pids = {}, [], set()
+    if not os.path.exists(path):
+        return statements, slow, pids
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue   # a line cut short by a crash
+            pids.add(entry.get('pid'))
+            if entry.get('type') == 'slow':
+                slow.append(entry)
+                continue
+            for sql, (count, total, peak, buckets) in entry.get('statements', {}).items():
+                m = statements.setdefault(sql, [0, 0.0, 0.0, [0] * len(buckets)])
+                m[0] += count
+                m[1] += total
+                m[2] = max(m[2], peak)
+                m[3] = [a + b for a, b in zip(m[3], buckets)]
+    return statements, slow, pids
+
+def report(path, top=20, slow_limit=20, width=110):
+    """Text report: the statements with the most total time, then the latest slow queries"""
+    statements, slow, pids = load(path)
+    if not statements and not slow:
+        return f'No SQL stats in {path} (run with NKE_SQL_STATS=1 to collect them)'
+    lines = [f'SQL stats from {path} ({len(pids)} processes)', '',
+             f"{'calls':>9} {'total ms':>11} {'mean ms':>9} {'p50':>6} {'p95':>6} {'p99':>6} {'max ms':>9}  statement"]
+    ranked = sorted(statements.items(), key=lambda kv: kv[1][1], reverse=True)
+    for sql, (count, total, peak, buckets) in ranked[:top]:
+        lines.append(f'{count:9d} {total:11.1f} {total / count:9.3f} {_percentile(buckets, count, 0.5):>6} '
+                     f'{_percentile(buckets, count, 0.95):>6} {_percentile(buckets, count, 0.99):>6} '
+                     f'{peak:9.2f}  {sql[:width]}')
+    if len(ranked) > top:
+        lines.append(f'... and {len(ranked) - top} more statements')
+    lines.append('(p50/p95/p99 are histogram bucket upper bounds in ms)')
+    if slow:
+        plans = {}
+        for entry in slow:
+            if entry.get('plan') is not None:
+                plans.setdefault(entry['sql'], entry['plan'])
+        lines += ['', f'Slow queries, latest {min(slow_limit, len(slow))} of {len(slow)}:']
+        for entry in slow[-slow_limit:]:
+            lines.append(f"{entry['ts']}  {entry['ms']:9.1f} ms  pid {entry['pid']}  {entry['sql'][:width]}")
+            for step in plans.get(entry['sql']) or []:
+                lines.append(f'    {step}')
+    return '\n'.join(lines)
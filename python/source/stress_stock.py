@@ -0,0 +1,106 @@
+# ----------------------------- stress_stock.py -----------------------------
+"""
+Oversell stress test for stock reservation.
+
+Several processes hammer one product with small invoices against a scratch
+database until its stock runs out. Afterwards units sold plus stock left must
+equal the opening stock, the level must not be negative, and it must agree
+with the inventory ledger. Exits with status 1 on any oversell or mismatch.
+
+    python stress_stock.py [--processes 8] [--attempts 200] [--stock 2500] [--profile server]
+"""
+import os
+import sys
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r'''
+import sys, json, sqlite3
+sys.path.insert(0, %(src)r)
+from database import Database
+from invoices import InvoiceManager
+db = Database(%(db)r, profile=%(profile)r)
+invoices = InvoiceManager(db)
+sold = short = busy = 0
+for i in range(%(attempts)d):
+    qty = 1 + (i %% 3)
+    try:
+        invoices.create_invoice([{'product_id': %(pid)d, 'description': 'stress', 'qty': qty, 'unit_price': '1.00'}])
+        sold += qty
+    except ValueError:
+        short += 1
+    except sqlite3.OperationalError:
+        busy += 1
+db.close()
+print(json.dumps({'sold': sold, 'short': short, 'busy': busy}))
+'''
+
+def setup(path, stock, profile):
+    sys.path.insert(0, SOURCE_DIR)
+    from database import Database
+    from product import Product
+    from inventory import Inventory
+    db = Database(path, profile=profile)
+    pid = Product(db).add_product('STRESS-1', 'Stress test item', '1.00')
+    Inventory(db).adjust_stock(pid, stock, 'opening stock')
+    db.close()
+    return pid
+
+def check(path, profile, pid):
+    from database import Database
+    from inventory import Inventory
+    db = Database(path, profile=profile)
+    inventory = Inventory(db)
+    result = {'stock_left': inventory.get_stock(pid), 'ledger_mismatches': len(inventory.verify_stock_levels())}
+    db.close()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-process oversell stress test for stock reservation')
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--attempts', type=int, default=200, help='Invoices each process tries to create')
+    parser.add_argument('--stock', type=int, default=2500, help='Opening stock (keep it below the total demand)')
+    parser.add_argument('--profile', default='server', help='Database profile for every connection')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stress.db')
+        pid = setup(path, args.stock, args.profile)
+        code = CHILD % {'src': SOURCE_DIR, 'db': path, 'profile': args.profile,
+                        'attempts': args.attempts, 'pid': pid}
+        started = time.perf_counter()
+        procs = [subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, text=True)
+                 for _ in range(args.processes)]
+        results = []
+        for p in procs:
+            out, _ = p.communicate()
+            if p.returncode != 0:
+                print('worker failed with status', p.returncode)
+                raise SystemExit(1)
+            results.append(json.loads(out.strip().splitlines()[-1]))
+        elapsed = time.perf_counter() - started
+        final = check(path, args.profile, pid)
+
+    sold = sum(r['sold'] for r in results)
+    summary = {
+        'processes': args.processes,
+        'opening_stock': args.stock,
+        'units_sold': sold,
+        'short_rejections': sum(r['short'] for r in results),
+        'busy_errors': sum(r['busy'] for r in results),
+        'seconds': round(elapsed, 2),
+        **final,
+    }
+    print(json.dumps(summary, indent=2))
+    ok = (final['stock_left'] >= 0 and sold + final['stock_left'] == args.stock
+          and final['ledger_mismatches'] == 0)
+    print('OK: no oversell' if ok else 'FAIL')
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# ----------------------------- tax.py -----------------------------
+from decimal import Decimal
+from database import Database, from_paise, date_range
+from pricing import parse_paise
+
+# Place of supply: 'intra' (state) pays CGST + SGST, 'inter' pays IGST
+SUPPLY_TYPES = ('intra', 'inter')
+
+def rate_bp(rate):
+    """GST rate in percent (e.g. '18' or 2.5) -> hundredths of a percent"""
+    return parse_paise(rate)
+
+def rate_percent(bp):
+    """Hundredths of a percent -> Decimal percent, e.g. 250 -> Decimal('2.5')"""
+    return Decimal(bp) / 100 if bp is not None else None
+
+class TaxManager:
+    def __init__(self, db: Database):
+        self.db = db
+        # product_id -> (hsn, rate_bp); cleared when products or rates change
+        self.cache = db.cache('tax_rates')
+
+    # Add or change the GST rate for an HSN/SAC code
+    def set_hsn_rate(self, hsn, rate, description=None):
+        self.db.conn.execute('''
+            INSERT INTO tax_rates (hsn, rate_bp, description) VALUES (?,?,?)
+            ON CONFLICT(hsn) DO UPDATE SET rate_bp=excluded.rate_bp,
+                description=IFNULL(excluded.description, description)
+        ''', (hsn, rate_bp(rate), description))
+        self.db.conn.commit()
+        self.cache.clear()
+
+    def list_rates(self):
+        return [{
+            'hsn': r['hsn'],
+            'rate': rate_percent(r['rate_bp']),
+            'description': r['description'],
+        } for r in self.db.conn.execute('SELECT * FROM tax_rates ORDER BY hsn')]
+
+    # (hsn, rate_bp) per product: the product's own rate wins over its HSN code's.
+    # Codes in `hsns` (lines without a product) come back under ('hsn', code) keys.
+    # One query per 500 uncached products or codes, so a whole invoice batch costs one lookup.
+    def rates_for(self, product_ids, hsns=()):
+        keys = [pid for pid in set(product_ids) if pid] + [('hsn', h) for h in set(hsns) if h]
+        return self.cache.get_many(keys, self._load_rates)
+
+    def _load_rates(self, keys):
+        rates = {}
+        product_ids = [k for k in keys if not isinstance(k, tuple)]
+        for i in range(0, len(product_ids), 500):
+            chunk = product_ids[i:i + 500]
+            for r in self.db.conn.execute(f'''
+                SELECT p.id, p.hsn, IFNULL(p.gst_rate_bp, t.rate_bp) as rate_bp
+                FROM products p LEFT JOIN tax_rates t ON t.hsn = p.hsn
+                WHERE p.id IN ({','.join('?' * len(chunk))})
+            ''', chunk):
+                rates[r['id']] = (r['hsn'], r['rate_bp'])
+        hsns = [k[1] for k in keys if isinstance(k, tuple)]
+        for i in range(0, len(hsns), 500):
+            chunk = hsns[i:i + 500]
+            for r in self.db.conn.execute(
+                    f"SELECT hsn, rate_bp FROM tax_rates WHERE hsn IN ({','.join('?' * len(chunk))})", chunk):
+                rates[('hsn', r['hsn'])] = (r['hsn'], r['rate_bp'])
+        return rates
+
+    def tax_breakup(self, start_date=None, end_date=None, by='rate'):
+        """Taxable value and CGST/SGST/IGST per GST rate (by='rate') or per HSN
+        code and rate (by='hsn'), summed from the per-line tax columns.
+        Flat-rate invoices (no place of supply) have no per-line tax and are left out."""
+        if by not in ('rate', 'hsn'):
+            raise ValueError("by must be 'rate' or 'hsn'")
+        paise = self.db.paise_sql
+        keys = 'it.tax_rate_bp' if by == 'rate' else 'it.hsn, it.tax_rate_bp'
+        sql = f'''
+            SELECT {keys}, COUNT(*) as lines, SUM({paise('it.line_total')}) as taxable,
+                   SUM({paise('IFNULL(it.cgst,0)')}) as cgst, SUM({paise('IFNULL(it.sgst,0)')}) as sgst,
+                   SUM({paise('IFNULL(it.igst,0)')}) as igst
+            FROM invoice_items it JOIN invoices i ON i.id = it.invoice_id
+            WHERE it.tax_rate_bp IS NOT NULL
+        '''
+        where, params = date_range('i.date', start_date, end_date)
+        for w in where:
+            sql += f' AND {w}'
+        sql += f' GROUP BY {keys} ORDER BY {keys}'
+        rows = []
+        for r in self.db.conn.execute(sql, params):
+            row = {'hsn': r['hsn']} if by == 'hsn' else {}
+            row.update({
+                'rate': rate_percent(r['tax_rate_bp']),
+                'lines': r['lines'],
+                'taxable': from_paise(r['taxable']),
+                'cgst': from_paise(r['cgst']),
+                'sgst': from_paise(r['sgst']),
+                'igst': from_paise(r['igst']),
+                'tax': from_paise(r['cgst'] + r['sgst'] + r['igst']),
+            })
+            rows.append(row)
+        return rows
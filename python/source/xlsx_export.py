@@ -0,0 +1,97 @@
+# ----------------------------- xlsx_export.py -----------------------------
+# Excel exports built on openpyxl's write-only workbook: rows are streamed to
+# the file as they are appended, so memory stays flat for very large sheets.
+# Import this module only when an XLSX export is requested (openpyxl is heavy).
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from database import Database, to_decimal, date_range
+from tax import rate_percent
+
+def _xlsx_name(filename, default):
+    if not filename:
+        return default
+    if not filename.lower().endswith(".xlsx"):
+        filename += ".xlsx"
+    return filename
+
+def _header(ws, titles):
+    row = []
+    for t in titles:
+        cell = WriteOnlyCell(ws, value=t)
+        cell.font = Font(bold=True)
+        row.append(cell)
+    ws.append(row)
+
+def _money(v):
+    # Decimal is written as a real number cell, not text
+    return to_decimal(v) if v is not None else None
+
+def export_sales_report_xlsx(db: Database, filename=None, start_date=None, end_date=None):
+    """Sales report (one row per invoice plus totals) as XLSX"""
+    from invoices import InvoiceManager
+    filename = _xlsx_name(filename, "sales_report.xlsx")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sales")
+    _header(ws, ["Invoice No", "Date", "Customer ID", "Subtotal", "Tax", "Total"])
+    count = 0
+    total_sales = to_decimal(0)
+    # iter_invoices has already converted amounts from paise storage
+    for r in InvoiceManager(db).iter_invoices(start_date, end_date):
+        ws.append([r['invoice_no'], r['date'], r['customer_id'],
+                   _money(r['subtotal']), _money(r['tax']), _money(r['total'])])
+        count += 1
+        total_sales += to_decimal(r['total'])
+    ws.append([])
+    ws.append([None, None, "Total Invoices", count])
+    ws.append([None, None, "Total Sales", total_sales])
+    wb.save(filename)
+    return filename
+
+def export_invoice_items_xlsx(db: Database, filename=None, start_date=None, end_date=None):
+    """Every invoice line item (with its invoice number and date) as XLSX"""
+    filename = _xlsx_name(filename, "invoice_items.xlsx")
+    sql = '''
+        SELECT i.invoice_no, i.date, i.customer_id, it.product_id, it.description,
+               it.qty, it.unit_price, it.line_total, it.hsn, it.tax_rate_bp, it.cgst, it.sgst, it.igst
+        FROM invoice_items it JOIN invoices i ON i.id = it.invoice_id
+    '''
+    where, params = date_range('i.date', start_date, end_date)
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY it.invoice_id, it.id'
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Line Items")
+    _header(ws, ["Invoice No", "Date", "Customer ID", "Product ID", "Description", "Qty", "Unit Price", "Line Total",
+                 "HSN", "GST %", "CGST", "SGST", "IGST"])
+    money = db.money_out   # raw rows: stored value -> Decimal
+    for r in db.conn.execute(sql, params):
+        ws.append([r['invoice_no'], r['date'], r['customer_id'], r['product_id'], r['description'],
+                   int(r['qty']), money(r['unit_price']), money(r['line_total']),
+                   r['hsn'], rate_percent(r['tax_rate_bp']), money(r['cgst']), money(r['sgst']), money(r['igst'])])
+    wb.save(filename)
+    return filename
+
+def export_stock_xlsx(db: Database, filename=None):
+    """Product list with current stock as XLSX"""
+    filename = _xlsx_name(filename, "stock.xlsx")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Stock")
+    _header(ws, ["ID", "SKU", "Name", "Price", "Cost", "Reorder Level", "Stock"])
+    cur = db.conn.execute('''
+        SELECT p.id, p.sku, p.name, p.price, p.cost, p.reorder_level, IFNULL(sl.qty,0) as stock
+        FROM products p LEFT JOIN stock_levels sl ON sl.product_id=p.id
+        ORDER BY p.id
+    ''')
+    money = db.money_out   # raw rows: stored value -> Decimal
+    for r in cur:
+        ws.append([r['id'], r['sku'], r['name'], money(r['price']), money(r['cost']),
+                   int(r['reorder_level'] or 0), int(r['stock'])])
+    wb.save(filename)
+    return filename
+
+EXPORTS = {
+    'sales': export_sales_report_xlsx,
+    'items': export_invoice_items_xlsx,
+    'stock': export_stock_xlsx,
+}
@@ -0,0 +1,72 @@
+import pytest
+
+from api_server import HttpError, _add_customer, _add_product, _create_invoice, _products
+from database import Database
+from product import Product
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'api.db'))
+    products = Product(db)
+    for i in range(30):
+        products.add_product(f'A-{i}', f'Apple {i}', '1.00')
+    yield db
+    db.close()
+
+@pytest.mark.parametrize('query', [
+    {'q': 'a', 'limit': '-1'},
+    {'q': 'a', 'limit': '0'},
+    {'q': 'a', 'limit': '10000000'},
+    {'q': 'a', 'limit': 'many'},
+    {'limit': '-1'},
+    {'limit': '1001'},
+])
+def test_products_limit_is_bounded(db, query):
+    with pytest.raises(HttpError) as e:
+        _products(db, query)
+    assert e.value.status == 400
+
+def test_products_search_honours_limit(db):
+    assert len(_products(db, {'q': 'apple', 'limit': '5'})['items']) == 5
+    assert len(_products(db, {'q': 'apple'})['items']) == 20
+
+def test_search_products_rejects_limit_below_one(db):
+    with pytest.raises(ValueError):
+        Product(db).search_products('apple', limit=0)
+    with pytest.raises(ValueError):
+        Product(db).search_products('apple', limit=-1)
+
+@pytest.mark.parametrize('body', [
+    {'name': ['x']},
+    {'name': 'Asha', 'email': 5},
+    {'name': 'Asha', 'phone': 9876543210},
+    {'name': 'Asha', 'address': {'city': 'Pune'}},
+])
+def test_add_customer_rejects_non_string_fields(db, body):
+    with pytest.raises(HttpError) as e:
+        _add_customer(db, body)
+    assert e.value.status == 400
+
+@pytest.mark.parametrize('extra', [
+    {'notes': {}},
+    {'supply': ['intra']},
+    {'items': [{'description': 7, 'qty': 1, 'unit_price': '1.00'}]},
+    {'items': [{'hsn': 8471, 'qty': 1, 'unit_price': '1.00'}]},
+])
+def test_create_invoice_rejects_non_string_fields(db, extra):
+    body = dict({'items': [{'description': 'x', 'qty': 1, 'unit_price': '1.00'}]}, **extra)
+    with pytest.raises(HttpError) as e:
+        _create_invoice(db, body)
+    assert e.value.status == 400
+
+@pytest.mark.parametrize('extra', [{'hsn': 8471}, {'sku': 12}, {'name': ['x']}])
+def test_add_product_rejects_non_string_fields(db, extra):
+    with pytest.raises(HttpError) as e:
+        _add_product(db, dict({'sku': 'B-1', 'name': 'Banana', 'price': '2.00'}, **extra))
+    assert e.value.status == 400
+
+def test_string_fields_still_accepted(db):
+    assert _add_customer(db, {'name': 'Asha', 'email': 'a@example.com'})['id']
+    assert _add_product(db, {'sku': 'B-1', 'name': 'Banana', 'price': '2.00', 'hsn': '0803'})['id']
+    assert _create_invoice(db, {'items': [{'description': 'x', 'qty': 1, 'unit_price': '1.00'}],
+                                'notes': 'cash', 'supply': 'intra'})['id']
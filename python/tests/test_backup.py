@@ -0,0 +1,107 @@
+import os
+import sqlite3
+
+import pytest
+
+import backup
+from backup import online_backup, incremental_backup, restore_chain
+from database import Database
+from product import Product
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT id, sku, name FROM products ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+def crash_before_manifest(monkeypatch):
+    """Make the next incremental_backup die just before it replaces manifest.json"""
+    write = backup._write_replace
+    def write_replace(path, data):
+        if path.endswith(backup.MANIFEST):
+            raise OSError('simulated crash')
+        write(path, data)
+    monkeypatch.setattr(backup, '_write_replace', write_replace)
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'live.db'))
+    products = Product(db)
+    for i in range(300):
+        products.add_product(f'SKU-{i}', 'x' * 400, '1.00')
+    yield db
+    db.close()
+
+def test_throttled_backup_finishes_while_another_connection_writes(db, tmp_path):
+    writer = sqlite3.connect(db.filename)
+    seen = []
+
+    def progress(remaining, total):
+        seen.append(remaining)
+        # every step of the first tries writes, so each of them restarts the copy
+        if len(seen) < 40:
+            writer.execute("INSERT INTO products (sku, name, price) VALUES (?, 'w', '1.00')", (f'W-{len(seen)}',))
+            writer.commit()
+
+    dest = str(tmp_path / 'copy.db')
+    online_backup(db, dest, pages=5, throttle=0.001, progress=progress)
+    writer.close()
+    assert any(b > a for a, b in zip(seen, seen[1:]))   # at least one restart happened
+    assert seen[-1] == 0
+    assert rows(dest) == rows(db.filename)
+
+def test_incremental_chain_restores_the_latest_state(db, tmp_path):
+    chain = str(tmp_path / 'chain')
+    incremental_backup(db, chain)
+    Product(db).add_product('SKU-NEW', 'new', '2.00')
+    incremental_backup(db, chain, compress=True)
+    out = restore_chain(chain, str(tmp_path / 'restored.db'))
+    assert rows(out) == rows(db.filename)
+    assert not [n for n in os.listdir(chain) if n.endswith('.tmp')]
+
+def test_crash_between_index_and_manifest_is_detected(db, tmp_path, monkeypatch):
+    chain = str(tmp_path / 'chain')
+    incremental_backup(db, chain)
+    Product(db).add_product('SKU-NEW', 'new', '2.00')
+
+    crash_before_manifest(monkeypatch)
+    with pytest.raises(OSError):
+        incremental_backup(db, chain)
+    monkeypatch.undo()
+
+    Product(db).add_product('SKU-NEWER', 'newer', '3.00')
+    with pytest.raises(ValueError, match='inconsistent'):
+        incremental_backup(db, chain)
+
+def test_restore_refuses_a_chain_whose_last_backup_was_interrupted(db, tmp_path, monkeypatch):
+    chain = str(tmp_path / 'chain')
+    incremental_backup(db, chain)
+    Product(db).add_product('SKU-NEW', 'new', '2.00')
+    crash_before_manifest(monkeypatch)
+    with pytest.raises(OSError):
+        incremental_backup(db, chain)
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match='inconsistent'):
+        restore_chain(chain, str(tmp_path / 'restored.db'))
+
+def test_new_page_size_starts_a_new_base_without_touching_the_old_chain(db, tmp_path, monkeypatch):
+    chain = str(tmp_path / 'chain')
+    incremental_backup(db, chain)
+    Product(db).add_product('SKU-NEW', 'new', '2.00')
+    incremental_backup(db, chain)
+    old_files = sorted(n for n in os.listdir(chain) if n.startswith(('base', 'delta')))
+    db.conn.execute('PRAGMA page_size=8192')
+    db.conn.execute('VACUUM')
+
+    crash_before_manifest(monkeypatch)
+    with pytest.raises(OSError):
+        incremental_backup(db, chain)
+    monkeypatch.undo()
+    # the old chain's files are untouched; the new base is written beside them
+    assert set(old_files) <= set(os.listdir(chain))
+
+    incremental_backup(db, chain)
+    out = restore_chain(chain, str(tmp_path / 'restored.db'))
+    assert rows(out) == rows(db.filename)
+    assert not set(old_files) & set(os.listdir(chain))
@@ -0,0 +1,82 @@
+import csv
+import random
+
+import pytest
+
+import importer
+from customer import Customer
+from database import Database
+from importer import bulk_import
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+def customers(db):
+    return [tuple(r) for r in db.conn.execute('SELECT id, name, email, phone, address FROM customers ORDER BY id')]
+
+def apply_one_by_one(db, rows):
+    """The customer upsert rules, applied a row at a time"""
+    conn = db.conn
+    for name, email, phone, address in rows:
+        cid = None
+        for column, value in (('email', email), ('phone', phone)):
+            found = value and conn.execute(
+                f'SELECT id FROM customers WHERE {column}=? ORDER BY id LIMIT 1', (value,)).fetchone()
+            if found:
+                cid = found[0]
+                break
+        if cid is None:
+            conn.execute('INSERT INTO customers (name, email, phone, address) VALUES (?,?,?,?)',
+                         (name, email, phone, address))
+        else:
+            conn.execute('UPDATE customers SET name=?, email=COALESCE(?, email), phone=COALESCE(?, phone), '
+                         'address=COALESCE(?, address) WHERE id=?', (name, email, phone, address, cid))
+    conn.commit()
+
+def test_customers_without_ids_match_like_row_by_row(tmp_path):
+    rng = random.Random(7)
+    pick = lambda values: rng.choice(values + [None, None])
+    emails = [f'c{i}@example.com' for i in range(40)]
+    phones = [f'98{i:08d}' for i in range(40)]
+    existing = [(f'old {i}', pick(emails), pick(phones), None) for i in range(60)]
+    rows = [(f'new {i}', pick(emails), pick(phones), pick(['Pune', 'Delhi'])) for i in range(400)]
+
+    expected = Database(str(tmp_path / 'expected.db'))
+    apply_one_by_one(expected, existing)
+    apply_one_by_one(expected, rows)
+
+    db = Database(str(tmp_path / 'live.db'))
+    apply_one_by_one(db, existing)
+    path = write_csv(tmp_path / 'customers.csv', ['name', 'email', 'phone', 'address'],
+                     [[v or '' for v in r] for r in rows])
+    summary = bulk_import(db, 'customers', path, batch_size=64)
+    assert summary['imported'] == len(rows)
+    assert customers(db) == customers(expected)
+    db.close()
+    expected.close()
+
+def test_caches_are_cleared_when_a_later_batch_fails(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'live.db'))
+    cid = Customer(db).add_customer('Old name', email='a@example.com')
+    assert Customer(db).get_customer(cid)['name'] == 'Old name'
+
+    write = importer._write_customers
+    calls = []
+    def fail_second_batch(db, batch):
+        calls.append(batch)
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        write(db, batch)
+    monkeypatch.setitem(importer.IMPORTS, 'customers',
+                        (importer.CUSTOMER_COLUMNS, importer._validate_customer, fail_second_batch))
+
+    path = write_csv(tmp_path / 'customers.csv', ['name', 'email'],
+                     [['New name', 'a@example.com'], ['Someone', 'b@example.com']])
+    with pytest.raises(RuntimeError):
+        bulk_import(db, 'customers', path, batch_size=1)
+    assert Customer(db).get_customer(cid)['name'] == 'New name'
+    db.close()
@@ -0,0 +1,92 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from database import paise_str, to_paise
+from pricing import parse_paise, price_lines, gst_lines, reference_price_lines, reference_gst_lines
+
+RATES = [0, 5, 12, 18, 28, '2.5', '0.25', '7.125', 0.1]
+
+def random_amount(rng):
+    kind = rng.random()
+    if kind < 0.3:
+        return f'{rng.randint(0, 99999)}.{rng.randint(0, 99):02d}'
+    if kind < 0.45:
+        # more than two places, so half-up rounding of the unit price is exercised
+        return f'{rng.randint(0, 9999)}.{rng.randint(0, 99999):05d}'
+    if kind < 0.6:
+        # an exact half paisa: x.xx5
+        return f'{rng.randint(0, 9999)}.{rng.randint(0, 99):02d}5'
+    if kind < 0.75:
+        return rng.randint(0, 5000)
+    if kind < 0.9:
+        return round(rng.uniform(0, 5000), rng.randint(0, 4))
+    return Decimal(f'{rng.randint(0, 99999)}.{rng.randint(0, 999):03d}')
+
+def random_qty(rng):
+    # returns and credit notes carry negative quantities
+    return rng.randint(-50, -1) if rng.random() < 0.2 else rng.randint(1, 1000)
+
+def same(paise, ref):
+    # -0.00 from the Decimal path is the same amount as 0.00
+    return paise_str(paise) == str(ref + 0)
+
+def check_prices(qtys, units, rate):
+    _, lines, subtotal, tax, total = price_lines(qtys, units, rate)
+    ref_lines, ref_subtotal, ref_tax, ref_total = reference_price_lines(qtys, units, rate)
+    assert all(same(p, r) for p, r in zip(lines, ref_lines)), (qtys, units, rate)
+    assert same(subtotal, ref_subtotal), (qtys, units, rate)
+    assert same(tax, ref_tax), (qtys, units, rate)
+    assert same(total, ref_total), (qtys, units, rate)
+    return lines
+
+def check_gst(lines, rates_bp):
+    for interstate in (False, True):
+        got = gst_lines(lines, rates_bp, interstate)
+        ref = reference_gst_lines(lines, rates_bp, interstate)
+        for got_col, ref_col in zip(got, ref):
+            assert all(same(p, r) for p, r in zip(got_col, ref_col)), (lines, rates_bp, interstate)
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_invoices_match_decimal_path(seed):
+    rng = random.Random(seed)
+    for _ in range(1500):
+        n = rng.choice([1, 1, 2, 5, 20, 200])
+        qtys = [random_qty(rng) for _ in range(n)]
+        units = [random_amount(rng) for _ in range(n)]
+        lines = check_prices(qtys, units, rng.choice(RATES))
+        check_gst(lines, [rng.choice([0, 25, 250, 300, 500, 1200, 1800, 2800]) for _ in lines])
+
+@pytest.mark.parametrize('qtys, units, rate', [
+    ([1], ['1.005'], 0),            # unit price rounds up from half a paisa
+    ([1], ['1.004'], 0),
+    ([-1], ['1.005'], 0),           # a return rounds away from zero too
+    ([1], ['0.10'], 5),             # tax of exactly half a paisa
+    ([-1], ['0.10'], 5),
+    ([3], ['0.03'], '2.5'),         # 0.09 * 2.5% = 0.00225
+    ([1, -1], ['10.00', '10.00'], 18),
+    ([2, -3], ['0.015', '0.025'], 12),
+])
+def test_half_up_ties(qtys, units, rate):
+    check_prices(qtys, units, rate)
+
+@pytest.mark.parametrize('lines, rates_bp', [
+    ([1], [5000]),      # CGST/SGST of a quarter paisa each, IGST of half
+    ([-1], [5000]),
+    ([10], [500]),      # 2.5 paise at 5% split into 0.25 + 0.25
+    ([100, -100], [250, 250]),
+    ([333, -333], [1800, 2800]),
+])
+def test_gst_half_up_ties(lines, rates_bp):
+    check_gst(lines, rates_bp)
+
+@pytest.mark.parametrize('value', ['²', '1²', '1.²', '-²', '1.0²'])
+def test_non_ascii_digits_fail_like_the_decimal_path(value):
+    with pytest.raises(ArithmeticError):
+        parse_paise(value)
+    with pytest.raises(ArithmeticError):
+        to_paise(value)
+
+def test_digits_decimal_accepts_are_still_accepted():
+    assert parse_paise('٣.5') == to_paise('٣.5') == 350
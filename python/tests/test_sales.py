@@ -0,0 +1,30 @@
+import pytest
+
+from customer import Customer
+from database import Database
+from invoices import InvoiceManager
+from sales import SalesManager
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'sales.db'))
+    cid = Customer(db).add_customer('Asha')
+    invoices = InvoiceManager(db)
+    for customer_id, price in ((None, '10.00'), (None, '2.50'), (cid, '7.00')):
+        invoices.create_invoice([{'description': 'x', 'qty': 1, 'unit_price': price}], customer_id=customer_id)
+    yield db, cid
+    db.close()
+
+@pytest.mark.parametrize('who', ['all', 'walk-in', 'customer'])
+def test_rollup_and_scan_agree_on_customer(db, who):
+    db, cid = db
+    customer_id = {'all': None, 'walk-in': 0, 'customer': cid}[who]
+    day = db.conn.execute('SELECT MIN(substr(date,1,10)) FROM invoices').fetchone()[0]
+    sales = SalesManager(db)
+    rollup = sales.sales_summary(day, day, customer_id)
+    scan = sales.sales_summary(day + 'T00:00:00', day + 'T23:59:59.999999', customer_id)
+    assert rollup == scan
+    expected = {'all': (3, '19.50'), 'walk-in': (2, '12.50'), 'customer': (1, '7.00')}[who]
+    assert (rollup['count'], str(rollup['total_sales'])) == expected
+    daily = sales.daily_sales(day, day, customer_id)
+    assert [(d['count'], str(d['total'])) for d in daily] == [expected]
@@ -0,0 +1,56 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import sqlstats
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlstats, 'SLOW_QUERY_MS', 0.0)   # every statement is slow
+    path = str(tmp_path / 'stats.db')
+    raw = sqlite3.connect(path)
+    raw.execute('CREATE TABLE t (x INTEGER)')
+    raw.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(100)])
+    raw.commit()
+    return sqlstats.InstrumentedConnection(raw, sqlstats.Recorder(str(tmp_path / 'stats.jsonl'))), \
+        tmp_path / 'stats.jsonl'
+
+def slow_entries(path):
+    if not path.exists():
+        return []
+    return [e for e in map(json.loads, path.read_text().splitlines()) if e['type'] == 'slow']
+
+def test_collected_cursor_defers_its_plan_to_the_next_execute(conn):
+    conn, stats = conn
+    cur = conn.execute('SELECT x FROM t WHERE x > ?', (5,))
+    cur.fetchone()
+    del cur
+    assert slow_entries(stats) == []
+    assert len(conn._pending) == 1
+
+    conn.execute('SELECT 1').fetchall()
+    assert not conn._pending
+    entry = [e for e in slow_entries(stats) if e['sql'].startswith('SELECT x FROM t')]
+    assert entry and entry[0]['plan']
+
+def test_cursor_collected_on_another_thread_does_not_touch_the_connection(conn):
+    conn, stats = conn
+    box = [conn.execute('SELECT x FROM t')]
+    box[0].fetchone()
+    errors = []
+
+    def drop():
+        try:
+            box.clear()   # the cursor's __del__ runs here, off the connection's thread
+        except Exception as e:
+            errors.append(e)
+
+    t = threading.Thread(target=drop)
+    t.start()
+    t.join()
+    assert errors == []
+    assert len(conn._pending) == 1
+    conn.close()
+    assert [e for e in slow_entries(stats) if e['sql'] == 'SELECT x FROM t'][0]['plan']
@@ -0,0 +1,77 @@
+import multiprocessing
+import sqlite3
+
+import pytest
+
+from database import Database, _is_busy
+from inventory import Inventory, InsufficientStock
+from invoices import InvoiceManager
+from product import Product
+
+PROCESSES = 6
+ATTEMPTS = 40
+STOCK = 90      # well below the 6 * 40 * 1.5 units asked for
+
+def sell(path, pid, mode, results):
+    """Worker: try ATTEMPTS sales of 1-2 units, retrying only on a busy lock"""
+    db = Database(path, profile='server')
+    invoices, inventory = InvoiceManager(db), Inventory(db)
+    sold = sales = short = 0
+    for i in range(ATTEMPTS):
+        qty = 1 + (i % 2)
+        while True:
+            try:
+                if mode == 'invoice':
+                    invoices.create_invoices([{'items': [
+                        {'product_id': pid, 'description': 'stress', 'qty': qty, 'unit_price': '1.00'}]}])
+                    ok = True
+                else:
+                    ok = inventory.reserve_stock(pid, qty, 'stress')
+            except InsufficientStock:
+                ok = False
+            except sqlite3.OperationalError as e:
+                if _is_busy(e):
+                    continue
+                raise
+            break
+        if ok:
+            sold += qty
+            sales += 1
+        else:
+            short += 1
+    db.close()
+    results.put((sold, sales, short))
+
+@pytest.mark.parametrize('mode', ['invoice', 'reserve'])
+def test_concurrent_sellers_never_oversell(tmp_path, mode):
+    path = str(tmp_path / 'stress.db')
+    db = Database(path, profile='server')
+    pid = Product(db).add_product('STRESS-1', 'Stress test item', '1.00')
+    Inventory(db).adjust_stock(pid, STOCK, 'opening stock')
+    db.close()
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=sell, args=(path, pid, mode, results)) for _ in range(PROCESSES)]
+    for p in procs:
+        p.start()
+    counts = [results.get(timeout=120) for _ in procs]
+    for p in procs:
+        p.join(timeout=30)
+        assert p.exitcode == 0
+
+    sold = sum(c[0] for c in counts)
+    sales = sum(c[1] for c in counts)
+    short = sum(c[2] for c in counts)
+    db = Database(path, profile='server')
+    inventory = Inventory(db)
+    left = inventory.get_stock(pid)
+    assert left >= 0
+    assert sales + short == PROCESSES * ATTEMPTS
+    assert short > 0
+    assert sold + left == STOCK
+    assert inventory.verify_stock_levels() == []
+    if mode == 'invoice':
+        row = db.conn.execute('SELECT COUNT(DISTINCT invoice_id) as n, SUM(qty) as units FROM invoice_items').fetchone()
+        assert (row['n'], row['units']) == (sales, sold)
+    db.close()